@@ -43,6 +43,8 @@ parser.add_option("-x", "--executable", dest="execpath", help="path to the simul
 
 parser.add_option("-H", "--harness", dest="harness", help="path to the simulation program harness, e.g.: /home/boris/freshs/harnesses/espresso_plain", metavar="harnesspath", type="string", default='auto')
 
+parser.add_option("-n", "--slots", dest="slots", help="number of jobs to run in parallel over one connection", metavar="slots", type="string", default='auto')
+
 parser.add_option("-S", "--server-host", dest="server", help="network address(:port) of the server, e.g.: localhost:1000 or www.google.com", metavar="server_address(:port)", type="string", default='auto')
 
 
@@ -57,7 +59,7 @@ else:   # if filename is not given
                        '\tLook at examples in the test directory.')
     exit(8)
 
-ci = client(options.config, options.execprefix, options.execpath, options.harness, options.startconf, options.server)
+ci = client(options.config, options.execprefix, options.execpath, options.harness, options.startconf, options.server, options.slots)
 
-asyncore.loop()
+ci.loop()
 
@@ -47,12 +47,20 @@ import time
 import ast
 import re
 
+# worker pool for multiple slots
+import threading
+import Queue
+
 # import wrappers for simulation programs
 from  client_ffs   import client_ffs
 from  client_spres import client_spres
 
+# framing and receive buffer are shared with the server
+sys.path.append(reldir + '/../../server/modules')
+import wire_protocol
+
 class client(asyncore.dispatcher):
-    def __init__(self, configfile, execprefix, execpath, harness, startconfig, server_address):
+    def __init__(self, configfile, execprefix, execpath, harness, startconfig, server_address, slots='auto'):
 
         if configfile == 'auto':
             configfile = 'client-sample.conf'
@@ -76,12 +84,18 @@ class client(asyncore.dispatcher):
            self.host = server_address.split(':')[0]
            if len(server_address.split(':')) > 1:
                 self.port = int(server_address.split(':')[1])
+        if slots != 'auto':
+           self.slots = int(slots)
 
 
 
         self.received_data = []
-        self.save_bytes=""
+        self.recv_buffer = wire_protocol.ReceiveBuffer()
         self.send_bytes=""
+        # outgoing data which could not be sent yet, drained in handle_write
+        self.out_buffer = bytearray()
+        self.out_offset = 0
+        self.close_when_sent = False
         asyncore.dispatcher.__init__(self)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -90,8 +104,18 @@ class client(asyncore.dispatcher):
 
         self.connect((self.host, self.port))
 
-        self.msg=["ffs client v1"+'PKT_SEP']
+        # the hello is always sent in version 1 format
+        hello = "ffs client v" + str(self.protocol)
+        if self.slots > 1:
+            hello += " slots=" + str(self.slots)
+        if len(self.compression) > 0:
+            hello += " compress=" + ','.join(self.compression)
+        self.msg=[hello + 'PKT_SEP']
         self.abort = False
+        # the first packet from the server (our name) is always version 1
+        self.name_received = False
+        # the codec is set when the server accepts compression
+        self.compressor = wire_protocol.Compressor(None, self.compression_threshold)
 
 
         # setup timeout stuff
@@ -105,6 +129,19 @@ class client(asyncore.dispatcher):
         # so there is little overhead for this.
         self.ffs       = client_ffs(self)
         self.spres     = client_spres(self)
+
+        # every slot runs its jobs in an own thread, results are sent from the main loop
+        self.retired_slots  = []
+        self.exit_requested = False
+        if self.slots > 1:
+            self.job_queues   = []
+            self.result_queue = Queue.Queue()
+            for slot in range(self.slots):
+                self.job_queues.append(Queue.Queue())
+                worker = threading.Thread(target=self.slot_worker, args=(slot,))
+                worker.daemon = True
+                worker.start()
+            print('client runs ' + str(self.slots) + ' jobs in parallel.')
         
         print('client initted to run scripts in: ' +  self.harness_path +\
               ' using executable: ' + self.exec_name    )
@@ -145,6 +182,31 @@ class client(asyncore.dispatcher):
         else:
             self.nice_job = 0
 
+        # wire protocol version, 2 needs a server which supports it
+        if self.configfile.has_option('general', 'protocol'):
+            self.protocol = self.configfile.getint('general', 'protocol')
+        else:
+            self.protocol = 1
+
+        # number of jobs run in parallel, each slot is a separate worker for the server
+        if self.configfile.has_option('general', 'slots'):
+            self.slots = self.configfile.getint('general', 'slots')
+        else:
+            self.slots = 1
+
+        # codecs offered to the server for compressing large messages, e.g. over ssh tunnels
+        if self.configfile.has_option('general', 'compression'):
+            self.compression = [ c.strip() for c in self.configfile.get('general', 'compression').split(',') \
+                                 if c.strip() in wire_protocol.codecs_available() ]
+        else:
+            self.compression = []
+
+        # messages smaller than this are sent uncompressed
+        if self.configfile.has_option('general', 'compression_threshold'):
+            self.compression_threshold = self.configfile.getint('general', 'compression_threshold')
+        else:
+            self.compression_threshold = 4096
+
 
 
         ##########these option moved from server.cfg
@@ -206,11 +268,19 @@ class client(asyncore.dispatcher):
         return
     
     def handle_write(self):
-        data=self.msg.pop()
-        self.send(data)
+        if self.msg:
+            data=self.msg.pop()
+            self.long_send(data)
+        else:
+            self.flush_out()
+
+        if self.close_when_sent and self.pending_out() == 0:
+            print("CLIENT CLOSING ON TIMEOUT")
+            self.close()
+            exit('TIMEOUT')
 
     def writable(self):
-        return bool(self.msg)
+        return bool(self.msg) or self.pending_out() > 0
 
     def process_packet(self, data):
 
@@ -223,81 +293,210 @@ class client(asyncore.dispatcher):
                 print('Client: Warning! Dropping packet.') 
                 return
 
-            ##handle jobs sent in order.
-            if parameterset["jobtype"] == 1:
-                        print('Starting job1: Escape flux.')
-                        result = self.ffs.job1_escape_flux(parameterset)
-            elif parameterset["jobtype"] == 2:
-                        if "only_escape" in parameterset:
-                            print("Exiting because only escape run was desired!")
-                            raise SystemExit
-                        print('Starting job2: Probabilities.')
-                        result = self.ffs.job2_probabilities(parameterset)
-            elif parameterset["jobtype"] == 3:
-                        print('Starting job3: Fixed tau.')
-                        result = self.spres.job3_fixed_tau(parameterset)
-            elif parameterset["jobtype"] >  3:
-                        print('Job type not recognised: ' + str(parameterset["jobtype"]))
-                        print('Ignoring.')
-                        result = ""
+            self.process_parameterset(parameterset)
+
+        elif data.startswith('compression: '):
+            self.compressor.codec = data[len('compression: '):].strip()
+            print('Client: server accepted ' + self.compressor.codec + ' compression.')
+
+        else:
+            print("received additional data: " + data)
+
+    def process_parameterset(self, parameterset):
+
+        if self.slots > 1:
+            # pass the job to the worker of its slot
+            slot = parameterset.pop('slot', 0)
+            if slot < 0 or slot >= self.slots:
+                print('Client: Warning! Job for unknown slot ' + str(slot) + ', ignoring.')
+            elif slot in self.retired_slots:
+                print('Client: slot ' + str(slot) + ' has timed out, ignoring job.')
             elif parameterset["jobtype"] <= 0:
-                        print('Waiting for new job.')
-                        self.abort = True   
-                        return
+                print('Slot ' + str(slot) + ': Waiting for new job.')
+            else:
+                self.job_queues[slot].put(parameterset)
+            return
+
+        result = self.run_job(parameterset)
+        if result is not None:
+            self.send_result(result)
+
+    # main loop, with slots the results of the workers are collected in between
+    def loop(self):
+        if self.slots > 1:
+            while asyncore.socket_map and not self.exit_requested:
+                asyncore.loop(timeout=0.05, count=1)
+                self.send_results()
+            if self.exit_requested:
+                raise SystemExit
+        else:
+            asyncore.loop()
+
+    def slot_worker(self, slot):
+        while True:
+            parameterset = self.job_queues[slot].get()
+            try:
+                result = self.run_job(parameterset)
+            except SystemExit:
+                self.exit_requested = True
+                return
+            if result is not None:
+                self.result_queue.put((slot, result))
+
+    def send_results(self):
+        while True:
+            try:
+                slot, result = self.result_queue.get_nowait()
+            except Queue.Empty:
+                return
+            self.send_result(result, slot)
+
+    # run a job, returns the result string or None if nothing has to be sent
+    def run_job(self, parameterset):
+
+        ##handle jobs sent in order.
+        if parameterset["jobtype"] == 1:
+                    print('Starting job1: Escape flux.')
+                    result = self.ffs.job1_escape_flux(parameterset)
+        elif parameterset["jobtype"] == 2:
+                    if "only_escape" in parameterset:
+                        print("Exiting because only escape run was desired!")
+                        raise SystemExit
+                    print('Starting job2: Probabilities.')
+                    result = self.ffs.job2_probabilities(parameterset)
+        elif parameterset["jobtype"] == 3:
+                    print('Starting job3: Fixed tau.')
+                    result = self.spres.job3_fixed_tau(parameterset)
+        elif parameterset["jobtype"] >  3:
+                    print('Job type not recognised: ' + str(parameterset["jobtype"]))
+                    print('Ignoring.')
+                    result = ""
+        elif parameterset["jobtype"] <= 0:
+                    print('Waiting for new job.')
+                    self.abort = True   
+                    return None
+
+        return result
+
+    # send the result of a job, slot is -1 without slots
+    def send_result(self, result, slot=-1):
+
+        # the server has taken back the jobs of a retired slot
+        if slot in self.retired_slots:
+            print('Client: slot ' + str(slot) + ' has timed out, dropping result.')
+            return
+
+        # tag the result with the slot it comes from
+        if slot >= 0 and result.startswith('{'):
+            result = '{"slot": ' + str(slot) + ', ' + result[1:]
   
-            # test if we should timeout at this point
-            last_job = False
-            if self.timeout != 0:
-                t = time.time()
-                if self.stop_after <= t:
-                    print("TIMEOUT: client attempting to exit gracefully.")
-                    result = result + 'WARN_TIMEOUT'
-                    last_job = True
-                else:
-                    print("Future uptime at least " + str(self.stop_after - t) + " seconds.")
+        # test if we should timeout at this point
+        last_job = False
+        if self.timeout != 0:
+            t = time.time()
+            if self.stop_after <= t:
+                print("TIMEOUT: client attempting to exit gracefully.")
+                last_job = True
+            else:
+                print("Future uptime at least " + str(self.stop_after - t) + " seconds.")
 
 
+        if self.protocol > 1:
+            result = self.frame_result(result, last_job)
+        else:
+            # the timeout warning stays outside of compressed data
+            result = self.compressor.text_packet(result)
+            if last_job:
+                result = result + 'WARN_TIMEOUT'
             result = result + 'PKT_SEP\n'
-            packet_len = len(result)
-            count      = 0
-            while count < packet_len:
-                count += self.send( result[count:packet_len] )
-                
-            print("sent data, size:" + str(len(result)))
-            if len(result) > 256:
-                print("data:" + result[0:64] + "...")
-                print("..." + result[len(result)-64:len(result)])
+        self.long_send(result)
             
-            if last_job == True:
-                print("CLIENT CLOSING ON TIMEOUT: " + data)
-                self.close()
-                exit('TIMEOUT')
-                
+        print("sent data, size:" + str(len(result)))
+        if len(result) > 256:
+            print("data:" + repr(result[0:64]) + "...")
+            print("..." + repr(result[len(result)-64:len(result)]))
+        
+        if last_job == True and self.slots > 1:
+            # close only after every slot has sent its last result. The jobs queued
+            # for this slot are dropped, the server hands them to other clients.
+            self.retired_slots.append(slot)
+            while True:
+                try:
+                    self.job_queues[slot].get_nowait()
+                except Queue.Empty:
+                    break
+            if len(self.retired_slots) < self.slots:
+                return
+
+        if last_job == True:
+            if self.pending_out() > 0:
+                # close after the result went out, see handle_write
+                self.close_when_sent = True
+                return
+            print("CLIENT CLOSING ON TIMEOUT")
+            self.close()
+            exit('TIMEOUT')
+
+    # build a version 2 frame from the result string of a job
+    def frame_result(self, result, last_job):
+        flags = 0
+        if last_job:
+            flags = wire_protocol.FLAG_TIMEOUT
+        try:
+            return self.compressor.frame_typed(ast.literal_eval(result), flags)
+        except Exception:
+            # let the server parse it
+            return self.compressor.frame_text(result, flags)
+
+    # queue data and send as much as the socket takes, the rest is sent in handle_write
+    def long_send(self, data):
+        self.out_buffer.extend(data)
+        self.flush_out()
+
+    def flush_out(self):
+        while self.out_offset < len(self.out_buffer):
+            # send returns 0 if the socket would block
+            count = self.send( memoryview(self.out_buffer)[self.out_offset:] )
+            if count <= 0:
+                break
+            self.out_offset += count
+
+        if self.out_offset >= len(self.out_buffer):
+            del self.out_buffer[:]
+            self.out_offset = 0
+
+    # number of bytes waiting to be sent
+    def pending_out(self):
+        return len(self.out_buffer) - self.out_offset
 
-        else:
-            print("received additional data: " + data)
-            
 
     def handle_read(self):
 
         data            = self.recv(262144)
         self.abort      = False
         
-        self.save_bytes = self.save_bytes + data
+        self.recv_buffer.feed(data)
         
-        while len(self.save_bytes) != 0 :
-
-            # left-over bytes after the seperator are saved to save_bytes.
-            [data, sep, self.save_bytes] = self.save_bytes.partition('PKT_SEP')
- 
-            # if there was a seperator, then process the line 
-            if len(sep) != 0:
-                self.process_packet(data.lstrip('\n')) ##the separator card may also include a newline.
-            else:
-                # otherwise, the packet fragment stays in self.save_bytes
-                # for next time
-                self.save_bytes = data 
+        while len(self.recv_buffer) != 0 :
+
+            if self.protocol > 1 and self.name_received:
+                [kind, flags, payload] = self.recv_buffer.next_frame()
+                if kind is None:
+                    return
+                payload = self.compressor.read_frame(flags, payload)
+                if kind == wire_protocol.FRAME_TYPED:
+                    self.process_parameterset(wire_protocol.decode_typed(payload))
+                else:
+                    self.process_packet(wire_protocol.to_bytes(payload).lstrip('\n'))
+                continue
+
+            # an incomplete packet stays in the buffer for next time
+            packet = self.recv_buffer.next_packet()
+            if packet is None:
                 return
+
+            self.name_received = True
+            self.process_packet(self.compressor.read_text(packet.tobytes().lstrip('\n'))) ##the separator card may also include a newline.
        
        
        
@@ -29,7 +29,8 @@ class scriptThread( threading.Thread ):
         threading.Thread.__init__(self)
 
     def run(self):
-        outstatus = subprocess.call(self.argList)
+        # no descriptors of the fifos of other slots are inherited
+        outstatus = subprocess.call(self.argList, close_fds=True)
         
 
 class feedThread( threading.Thread ):
@@ -73,6 +73,10 @@ class harness:
         
         self.save_bytes=''
 
+        ##feeder and listener threads of this harness. Other harnesses
+        ##can run at the same time in other slots of the client.
+        self.threads = []
+
     def build_argList(self,parameterset):
         argList = []
         if self.client.cli.execprefix != 'none':
@@ -89,16 +93,11 @@ class harness:
    
     def fork_run_script(self, parameterset):
         
-        ##start a child process
-        self.childproc = os.fork()        
-        if  self.childproc == 0: ##in child process
-            argList = self.build_argList(parameterset)
-            print("Client: Calling the following: " + ' '.join(argList))
-            outstatus=subprocess.call(argList)
-            print("Client: Simulation program returned, status: " + str(outstatus) + " . Closing fork.")
-            exit(0)
-        else:
-            return
+        ##start a child process. No os.fork, the jobs of several slots run in threads.
+        argList = self.build_argList(parameterset)
+        print("Client: Calling the following: " + ' '.join(argList))
+        self.childproc = subprocess.Popen(argList, close_fds=True)
+        return
             
     def subthread_run_script(self, parameterset):
         
@@ -131,14 +130,17 @@ class harness:
             if send_coords == True :
                 print("Client: Starting coords writer subthread")
                 self.ocFeeder = feeder(self.crds_in_fifoname, act_point, self.client)
+                self.threads.append(self.ocFeeder.fT)
 
             if get_coords == True :
                 print("Client: Starting coords listener subthread")
                 self.ocListener = listener(self.crds_back_fifoname, self.pp)
+                self.threads.append(self.ocListener.lT)
 
             if get_meta == True :
                 print("Client: Starting metadata listener subthread")
                 self.omListener = listener(self.metadata_fifoname, self.mp)
+                self.threads.append(self.omListener.lT)
                
             
     def collect( self, points, rcvals ):
@@ -178,8 +180,8 @@ class harness:
 
         ##try and kill any threads that are waiting
         try:
-            for t in threading.enumerate():
-                    if t.daemon:
+            for t in self.threads:
+                    if t.is_alive():
                         print("Client: Stopping thread: _"+str(t))
                         t.stop_event.set() 
         except e:
@@ -189,8 +191,8 @@ class harness:
         ##wait with a timeout of 1 second for each thread to 
         ##act on its "stop_event".
         try:
-            for t in threading.enumerate():
-                    if t.daemon:
+            for t in self.threads:
+                    if t.is_alive():
                         print("Client: Cleaning thread: _"+str(t))
                         t.join(1.0)
         except e:
@@ -199,9 +201,11 @@ class harness:
         ##make sure that the childproc exits cleanly
         ##os.kill(self.childproc, os.SIGKILL)
         if self.childproc != 0 :
-            print("Client: Cleaning process "+str(self.childproc))
-            #os.kill(self.childproc, os.SIGKILL)
-            os.waitpid(0, 0) ##this call has the effect to clear up any "defunct" processes.
+            print("Client: Cleaning process "+str(self.childproc.pid))
+            #self.childproc.kill()
+            ##only this harness' child, the other slots have their own
+            outstatus = self.childproc.wait()
+            print("Client: Simulation program returned, status: " + str(outstatus))
    
         ##clean up the filesystem
         try:
@@ -0,0 +1,30 @@
+#!/usr/bin/python
+
+# Convert the segments of a run with storage_backend = segments into a
+# sqlite database in the configpoints layout, for the other scripts.
+
+# os-related
+import sys
+import os
+sys.path.append('../server/modules')
+sys.path.append('../server/modules/ffs')
+
+# custom
+import segment_points
+
+
+if len(sys.argv) < 3:
+    print("Usage:", sys.argv[0], "<../server/DB/segments-directory> <new-sqlite-file>")
+    exit(1)
+
+if not os.path.isdir(sys.argv[1]):
+    print("No segments directory:", sys.argv[1])
+    exit(1)
+
+if os.path.exists(sys.argv[2]):
+    print("Not overwriting", sys.argv[2])
+    exit(1)
+
+segh = segment_points.segment_points('none', sys.argv[1])
+segh.export_sqlite(sys.argv[2])
+segh.close()
@@ -88,7 +88,7 @@ else:   # if filename is not given
     print("Server: reading server config file: "+options.config)
 #try:
 a = ss.server( timestamp = options.timestamp, configfile_name = options.config, debugmode = options.debug  )
-asyncore.loop()
+a.loop()
 
 #
 #except Exception as e:
@@ -0,0 +1,120 @@
+# Network
+# the server runs on python 2, where the trollius backport provides the asyncio API
+try:
+    import trollius as asyncio
+except ImportError:
+    raise ImportError('network_backend asyncio needs the trollius package (pip install trollius)')
+
+# Formatting
+import concolors as cc
+
+# Client handling
+import clienthandler
+
+
+#### ASYNCIO VERSION OF THE CLIENT HANDLER ####
+# Everything above the socket level is shared with the asyncore handler,
+# only sending and closing go through the asyncio transport.
+class AioClientHandler(clienthandler.ClientBase):
+
+## Init ##
+    def __init__(self, server, transport, name, received_count=0):
+        self.transport = transport
+        self.addr      = transport.get_extra_info('peername')
+        self.closed    = False
+
+        self.setup(server, name, received_count)
+
+        # send name to client, always in version 1 format
+        self.long_send(name + 'PKT_SEP\n')
+
+        return
+
+## Transport handling ##
+    def long_send(self, data):
+        # the transport buffers what can not be written at once
+        self.transport.write(data)
+
+    def pending_out(self):
+        return self.transport.get_write_buffer_size()
+
+    def close(self):
+        self.closed = True
+        self.transport.close()
+
+    def handle_close(self):
+        if self.closed:
+            return
+        self.server.logger_freshs.info(cc.c_magenta + 'CLIENT CLOSED: ' +\
+                                       self.name + cc.reset)
+
+        self.close_slots()
+        if self in self.server.clients:
+            self.server.deregisterClient(self)
+        self.close()
+
+
+#### PROTOCOL, ONE INSTANCE PER CONNECTION ####
+class ClientProtocol(asyncio.Protocol):
+
+    def __init__(self, server):
+        self.server  = server
+        self.handler = None
+
+    def connection_made(self, transport):
+        ss = self.server
+        name = ss.new_client_name()
+
+        # pause_writing() is called above this buffer size
+        transport.set_write_buffer_limits(high=ss.send_highwater)
+
+        self.handler = AioClientHandler(ss, transport, name, ss.return_received_count(name))
+        ss.logger_freshs.info(cc.c_blue + name + ' connected.' + cc.reset)
+
+    # backpressure: do not read more results while the client does not take our data
+    # no handler before the connection is made
+    def pause_writing(self):
+        if self.handler is not None:
+            self.handler.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.handler is not None:
+            self.handler.transport.resume_reading()
+
+    def data_received(self, data):
+        if self.handler is not None:
+            self.handler.process_bytes(data)
+
+    def connection_lost(self, exc):
+        if self.handler is not None:
+            self.handler.handle_close()
+
+
+#### LISTENER AND EVENT LOOP ####
+class aio_server():
+    def __init__(self, server):
+        self.server   = server
+        self.loop     = asyncio.get_event_loop()
+        self.listener = None
+
+    # open listening socket on all interfaces
+    def listen(self, port):
+        ss = self.server
+        coro = self.loop.create_server(lambda: ClientProtocol(ss), '', port, backlog=ss.listen_backlog)
+        self.listener = self.loop.run_until_complete(coro)
+
+    # returns a handle which can be cancelled like a threading.Timer
+    def call_later(self, delay, callback):
+        return self.loop.call_later(delay, callback)
+
+    # run callback in the next iteration of the event loop
+    def call_soon(self, callback):
+        return self.loop.call_soon(callback)
+
+    def run(self):
+        self.loop.run_forever()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
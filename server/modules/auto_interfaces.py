@@ -353,6 +353,7 @@ class auto_interfaces():
                 ss.logger_freshs.debug(cc.c_magenta + 'Using lambda=' + str(ghostlam) + ' for explorer2ghost runs.' + \
                                        cc.reset)
                 ss.ghostpoints.add_point( ghostlam, gp[1], gp[2], gp[3], gp[4], gp[5], gp[6], gp[7], gp[8], gp[9], ss.lambdas[ghostlam], 0, 0, gp[10] )
+                ss.storepoints.count_ghost_run(gp[2])
                 snum += 1
 
         ss.logger_freshs.info(cc.c_magenta + 'Saved ' + str(snum) + ' exploring runs (index ' + str(self.ex_placed_index) + \
@@ -377,7 +378,7 @@ class auto_interfaces():
                     self.ex_deactivated.append(i)
 
         # check if clients calculate on deactivated lambda
-        for client in ss.explorer_clients:
+        for client in list(ss.explorer_clients):
             if self.cemlti(ss.explorer_clients[client]) in self.ex_deactivated:
                 ss.check_for_job(client)
 
@@ -882,11 +883,11 @@ class auto_interfaces():
     def parse_message(self, data, ddata, client, runid):
         ss = self.server
 
-        if "\"omit\": True" in data:
+        if ddata.get('omit') == True:
             ss.logger_freshs.info(cc.c_magenta + client.name + ' requested to omit data.' + cc.reset)
             return
 
-        ss.explorer_clients.pop(client)
+        client.remove_from_explorer()
 
         if not self.exmode:
             ss.logger_freshs.info(cc.c_green + 'Exploremode is over, starting new job on '+ client.name + cc.reset)
@@ -903,10 +904,10 @@ class auto_interfaces():
                 except Exception as e:
                     ss.logger_freshs.warn(cc.c_red + str(e) + cc.reset)
 
-        if "\"success\": True" in data:
+        if ddata.get('success') == True:
             self.analyze_job_success(client, ddata, runid)
 
-        elif "\"success\": False" in data:
+        elif ddata.get('success') == False:
             self.analyze_job_nosuccess(client, ddata, runid)
 
         else:
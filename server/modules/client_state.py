@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+####Helper class, roughly speaking an enumerator of the states a registered client can be in ####
+
+ACTIVE     = 0  ## running a real job, run_count must be observed
+IDLE       = 1  ## waiting for a job
+GHOST      = 2  ## running a ghost job
+EXPLORER   = 3  ## running an exploring job
+NUM_STATES = 4
+
+
+#### REGISTERED CLIENTS, INDEXED BY STATE ####
+# Every client is in exactly one state. Lookups, state changes and counts are O(1).
+# A state can carry data per client (ghost point id, explorer lambda), which is
+# indexed as well, so the clients working on the same data are found directly.
+class ClientRegistry():
+
+    def __init__(self):
+        # client -> state, in order of registration
+        self.states  = OrderedDict()
+        # per state: client -> data, in order of entering the state
+        self.members = [ OrderedDict() for state in range(NUM_STATES) ]
+        # per state: data -> clients with this data
+        self.holders = [ {} for state in range(NUM_STATES) ]
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, client):
+        return client in self.states
+
+    # iterate over a copy, clients can be removed meanwhile
+    def __iter__(self):
+        return iter(list(self.states))
+
+    def add(self, client, state=ACTIVE, data=None):
+        if client in self.states:
+            return
+        self.states[client] = state
+        self._enter(client, state, data)
+
+    def remove(self, client):
+        if client not in self.states:
+            return
+        self._leave(client)
+        del self.states[client]
+
+    # None if the client is not registered
+    def state_of(self, client):
+        return self.states.get(client)
+
+    # change state, unregistered clients are ignored
+    def set_state(self, client, state, data=None):
+        if client not in self.states:
+            return
+        self._leave(client)
+        self.states[client] = state
+        self._enter(client, state, data)
+
+    def count(self, state):
+        return len(self.members[state])
+
+    # client -> data of all clients in a state, do not modify
+    def in_state(self, state):
+        return self.members[state]
+
+    # clients in a state with the given data, in order of entering the state
+    def with_data(self, state, data):
+        return list(self.holders[state].get(data, ()))
+
+    def has_data(self, state, data):
+        return data in self.holders[state]
+
+    def _enter(self, client, state, data):
+        self.members[state][client] = data
+        if data is not None:
+            self.holders[state].setdefault(data, OrderedDict())[client] = None
+
+    def _leave(self, client):
+        state = self.states[client]
+        data  = self.members[state].pop(client)
+        if data is not None:
+            clients = self.holders[state][data]
+            del clients[client]
+            if len(clients) == 0:
+                del self.holders[state][data]
@@ -33,121 +33,185 @@ import random
 # UUID
 import uuid
 
+# slot tags in results
+import re
+
+# jobs sent in advance, in order
+from collections import OrderedDict
+
+# framing of protocol version 2
+import wire_protocol
+
+# states of registered clients
+import client_state
+
+# storage format of the points
+import point_codec
+
 ##list of implemented algorithms
 import sampling_algorithm_enum as sampling_algorithm
 
-#### CLASS FOR HANDLING THE CLIENTS ####
-class ClientHandler(asyncore.dispatcher):
+#### PART OF THE CLIENT HANDLERS WHICH DOES NOT DEPEND ON THE TRANSPORT ####
+# ClientHandler (asyncore), SlotHandler and aio_server.AioClientHandler add
+# sending and closing. The handlers are keys of dicts in the client registry,
+# so this part does not derive from asyncore.dispatcher: its __getattr__
+# forwards to a socket, which only ClientHandler has.
+class ClientBase():
 
 ## Init ##
-    def __init__(self, server, sock, addr, name, received_count=0):
-        asyncore.dispatcher.__init__(self, sock=sock)
+    # transport independent part of the initialisation
+    def setup(self, server, name, received_count=0):
         self.name = name
-        self.sock = sock
-        self.addr = addr
         self.ghostcount = 0
 
-        # send name to client
-        self.long_send(name + 'PKT_SEP\n')
+        # protocol version, changes to 2 on "ffs client v2" hello
+        self.protocol = 1
+
         self.server = server
 
+        # compression, a codec is set if the client asks for it in the hello
+        self.compressor = wire_protocol.Compressor(None, server.compression_threshold)
+
+        # further slots of a client which runs several jobs in parallel
+        self.slots = []
+
         #self.server.registerClient(self)
         self.msg            = []
-        self.save_bytes     = ""
+        self.recv_buffer    = wire_protocol.ReceiveBuffer()
         self.received_count = received_count
 
         #
         self.timeout_warned = False
 
-        return
-
-## Socket handling ##
-    def handle_write(self):
-        data=self.msg.pop()
-
-        self.long_send(data)
-
-    def handle_read(self):
-
-        ##get some data from the socket
-        self.save_bytes = self.save_bytes + self.recv(262144)
-
-        while len(self.save_bytes) != 0 :
-
-            ##left-over bytes after the seperator are saved to save_bytes.
-            [line, sep, self.save_bytes] = self.save_bytes.partition('PKT_SEP')
-
-            ##if there was a seperator, then process the line
-            if len(sep) != 0:
-                [line, sep, self.save_bytes] = line.partition('WARN_TIMEOUT')
-                if len(sep) != 0:
-                    self.timeout_warned = True
+        # real FFS jobs sent but not answered yet, uuid -> [lambda, send time]
+        self.pending_jobs     = OrderedDict()
+        self.last_result_time = time.time()
+
+## Packet handling ##
+    # split the incoming byte stream into packets and pass them to the server
+    def process_bytes(self, data):
+
+        self.recv_buffer.feed(data)
+
+        while len(self.recv_buffer) != 0 :
+
+            # the protocol can change after each packet (hello)
+            if self.protocol > 1:
+                [kind, flags, payload] = self.recv_buffer.next_frame()
+                if kind is None:
+                    return
+                timeout = (flags & wire_protocol.FLAG_TIMEOUT) != 0
+                try:
+                    payload = self.compressor.read_frame(flags, payload)
+                    if kind == wire_protocol.FRAME_TYPED:
+                        ddata = wire_protocol.decode_typed(payload)
+                except Exception as e:
+                    self.server.logger_freshs.warn(cc.c_red + 'Server: Warning! Failed to decode frame from ' + \
+                                                   self.name + ': ' + str(e) + '. Dropping packet.' + cc.reset)
+                    continue
+                if kind == wire_protocol.FRAME_TYPED:
+                    self.packet_received('', ddata, timeout)
+                else:
+                    self.packet_received(wire_protocol.to_bytes(payload).strip(), None, timeout)
+                continue
 
-                self.received_count = self.received_count + 1
-                runid               = self.name + "_" + str(self.received_count)
+            ##an incomplete packet stays in the buffer for next time
+            packet = self.recv_buffer.next_packet()
+            if packet is None:
+                return
 
-                self.server.logger_freshs.debug(cc.c_green + 'Incoming data packet: ' +\
-                                                          str(runid) +\
-                                                          cc.reset)
+            [line, sep, rest] = packet.tobytes().partition('WARN_TIMEOUT')
 
-                self.server.analyze_recv( line.strip(), self, runid )
+            try:
+                line = self.compressor.read_text(line.strip())
+            except Exception as e:
+                self.server.logger_freshs.warn(cc.c_red + 'Server: Warning! Failed to decompress packet from ' + \
+                                               self.name + ': ' + str(e) + '. Dropping packet.' + cc.reset)
+                continue
+
+            self.packet_received(line.strip(), None, len(sep) != 0)
+
+    # count the packet and pass it to the server, ddata is set for typed frames
+    def packet_received(self, line, ddata=None, timeout=False):
+        handler = self.slot_handler(line, ddata)
+        if timeout:
+            handler.timeout_warned = True
+
+        handler.received_count = handler.received_count + 1
+        runid                  = handler.name + "_" + str(handler.received_count)
+
+        self.server.logger_freshs.debug(cc.c_green + 'Incoming data packet: ' +\
+                                                  str(runid) +\
+                                                  cc.reset)
+
+        self.server.analyze_recv( line, handler, runid, ddata )
+
+    # the handler of the slot a packet comes from, results are tagged with the slot number
+    def slot_handler(self, line, ddata):
+        if len(self.slots) == 0:
+            return self
+        if ddata is not None:
+            slot = ddata.pop('slot', 0)
+        else:
+            match = re.match(r'\{\s*"slot":\s*(\d+)', line)
+            if match:
+                slot = int(match.group(1))
             else:
-                ##otherwise, the packet fragment stays in self.save_bytes
-                ##for next time
-                self.save_bytes = line
-                return
+                slot = 0
+        if slot < 1 or slot > len(self.slots):
+            return self
+        return self.slots[slot - 1]
 
+    # deregister all further slots of this connection
+    def close_slots(self):
+        for slot in self.slots:
+            slot.handle_close()
 
     def handle_close(self):
         self.server.logger_freshs.info(cc.c_magenta + 'CLIENT CLOSED: ' +\
  	                                  self.name + cc.reset)
 
-        self.server.deregisterClient(self)
+        self.close_slots()
+        # a retired slot is deregistered already
+        if self in self.server.clients:
+            self.server.deregisterClient(self)
         self.close()
 
 
-    def writable(self):
-        response = bool(self.msg)
-        return response
-
 ## Client functions ##
 
     def add_as_idle(self):
         ss = self.server
         #ss.logger_freshs.debug(cc.c_magenta + __name__ + ': add_as_idle' + cc.reset)
-        if self not in ss.idle_clients:
-            ss.idle_clients.append(self)
-            ss.idlenames.append(self.name)
-        self.remove_from_ghost()
+        if ss.clients.state_of(self) != client_state.IDLE:
+            ss.clients.set_state(self, client_state.IDLE)
 
     def add_as_ghost(self, ghostpoint):
         ss = self.server
-        if self not in ss.ghost_clients:
-            ss.ghost_clients[self] = ghostpoint
-            if self.name not in ss.ghostnames:
-                ss.ghostnames.append(self.name)
-        self.remove_from_idle()
+        if ss.clients.state_of(self) != client_state.GHOST:
+            ss.clients.set_state(self, client_state.GHOST, ghostpoint)
+
+    def add_as_explorer(self, lam):
+        self.server.clients.set_state(self, client_state.EXPLORER, lam)
 
     def add_as_escape(self, escapepoint):
         ss = self.server
         ss.ffs_control.escape_clients[self] = escapepoint
 
+    # leaving a state makes the client active
     def remove_from_idle(self):
-        ss = self.server
-        if self in ss.idle_clients:
-            ss.idle_clients.remove(self)
-            ss.idlenames.remove(self.name)
+        self.leave_state(client_state.IDLE)
 
     def remove_from_ghost(self):
-        ss = self.server
-        if self in ss.ghost_clients:
-            ss.ghost_clients.pop(self)
-            ss.ghostnames.remove(self.name)
+        self.leave_state(client_state.GHOST)
 
     def remove_from_explorer(self):
+        self.leave_state(client_state.EXPLORER)
+
+    def leave_state(self, state):
         ss = self.server
-        if self in ss.explorer_clients:
-            ss.explorer_clients.pop(self)
+        if ss.clients.state_of(self) == state:
+            ss.clients.set_state(self, client_state.ACTIVE)
 
     def remove_from_escape(self):
         ss = self.server
@@ -179,6 +243,40 @@ class ClientHandler(asyncore.dispatcher):
         ss.logger_freshs.debug(cc.c_magenta + 'Runcount: ' + str(ss.run_count) + cc.reset)
 
 
+    # interfaces of the real jobs which were not answered, one entry per job. A running
+    # job which is not kept in pending_jobs counts at the current interface.
+    def unfinished_job_lambdas(self):
+        lams = [ job[0] for job in self.pending_jobs.values() ]
+        if len(lams) == 0:
+            lams = [ self.server.act_lambda ]
+        return lams
+
+    # remember a real job, so that its result can be found with prefetching
+    def add_pending_job(self, job_uuid, lam):
+        if len(self.pending_jobs) > 0:
+            self.server.prefetched_jobs += 1
+        self.pending_jobs[job_uuid] = [lam, time.time()]
+
+    # Remove the job belonging to this result from the pending jobs, job_uuid is None if the
+    # result has no uuid. Returns False if the result does not belong to a pending job (ghosts, explorers).
+    def finish_pending_job(self, job_uuid):
+        ss = self.server
+        if job_uuid in self.pending_jobs:
+            lam, t_sent = self.pending_jobs.pop(job_uuid)
+        elif job_uuid is None and len(self.pending_jobs) > 0:
+            # client did not echo the uuid, results come in order
+            lam, t_sent = self.pending_jobs.popitem(last=False)[1]
+        else:
+            return False
+        if len(self.pending_jobs) > 0:
+            ss.prefetched_jobs -= 1
+
+        # a prefetched job started on the client when the previous one was finished
+        ss.client_runtime[str(self)] = max(t_sent, self.last_result_time)
+        self.last_result_time = time.time()
+
+        return True
+
     # Return the composed message string consisting of system and user messages
     def compose_message(self, sysmsg):
         ss = self.server
@@ -194,7 +292,7 @@ class ClientHandler(asyncore.dispatcher):
                 sysmsg += ", " + ss.user_msg
 
         # if key is not in string, add the message
-        return "{" + sysmsg + "}PKT_SEP\n"
+        return "{" + sysmsg + "}"
 
     # return uuid
     def get_uuid(self):
@@ -228,6 +326,8 @@ class ClientHandler(asyncore.dispatcher):
         # choose a seed for the client RNG, using the server RNG
         client_seed = random.randint(0, self.server.myRandMax)
 
+        job_uuid = self.get_uuid()
+
         if ex_ind == -1:
             # Normal case.
             next_interface = ss.lambdas[ss.act_lambda]
@@ -283,53 +383,55 @@ class ClientHandler(asyncore.dispatcher):
             ai = self.server.ai
             next_interface = ai.ex_lambdas[ex_ind]
             current_lambda = ai.citeml(ex_ind)
-            ss.explorer_clients[self] = current_lambda
+            self.add_as_explorer(current_lambda)
             if ai.auto_max_steps != 0:
                 max_steps = ai.auto_max_steps
             # increment M_0 counter
             ss.logger_freshs.info(cc.c_cyan + 'Starting explorer job1 on ' + str(self.name) + \
                                   cc.reset)
 
-        job_string = "\"jobtype\": 1" + \
-                    ", \"A\": " + str(self.server.A) + \
-                    ", \"B\": " + str(self.server.B) + \
-                    ", \"seed\": "           + str(client_seed) + \
-                    ", \"rp_id\": \""        + str(rp_id) + "\"" + \
-                    ", \"next_interface\": " + str(next_interface) + \
-                    ", \"act_lambda\": " + str(current_lambda) + \
-                    ", \"max_steps\": " + str(max_steps) + \
-                    ", \"clientname\": \"" + self.name + "\"" + \
-                    ", \"timestamp\": \"" + ss.timestamp + "\"" + \
-                    ", \"uuid\": \"" + self.get_uuid() + "\""
+        job = OrderedDict([
+            ('jobtype',        1),
+            ('A',              self.server.A),
+            ('B',              self.server.B),
+            ('seed',           client_seed),
+            ('rp_id',          str(rp_id)),
+            ('next_interface', next_interface),
+            ('act_lambda',     current_lambda),
+            ('max_steps',      max_steps),
+            ('clientname',     self.name),
+            ('timestamp',      ss.timestamp),
+            ('uuid',           job_uuid)])
+
+        # random_points of the job, see send_job
+        job_point = None
 
         # backward simulation. Need point in B from forward run
         if ss.ffs_control.reverse_direction > 0 and last_escape_point == 'None':
             # get configpoint from forward database
-            equi_B_point = ss.ffs_control.fwd_db.random_point_B_fwd(ss.ffs_control.reverse_lambda_offset)[0]
-            job_string += ", \"random_points\": " + str(equi_B_point) + ", \"equilibrate_point\": 1"
+            job_point = ss.ffs_control.fwd_db.random_point_B_fwd(ss.ffs_control.reverse_lambda_offset)[0]
+            job['equilibrate_point'] = 1
         # simulation continue from previous one with existing DB. Get configpoints from last state in this DB.
         elif ss.ffs_control.continue_simulation > 0 and last_escape_point == 'None':
-            random_A_point = ss.ffs_control.cnti_db.random_point_existing_DB_B()[0]
-            job_string += ", \"random_points\": " + str(random_A_point) + ", \"equilibrate_point\": 1"
-            job_string += ", \"other_timestamp\": \"" + ss.ffs_control.cnti_timestamp + "\""
+            job_point = ss.ffs_control.cnti_db.random_point_existing_DB_B()[0]
+            job['equilibrate_point'] = 1
+            job['other_timestamp']   = ss.ffs_control.cnti_timestamp
         # resume previous run
         elif last_escape_point != 'None':
-            job_string += ", \"random_points\": " + str(last_escape_point)
+            job_point = last_escape_point
 
         if ss.ffs_control.reverse_direction > 0:
-            job_string += ", \"reverse_direction\": 1" + ", \"forward_timestamp\": \"" + ss.ffs_control.fwd_timestamp + "\""
+            job['reverse_direction'] = 1
+            job['forward_timestamp'] = ss.ffs_control.fwd_timestamp
 
         if not newtrace:
-            job_string += ", \"last_rc\": " + str(rcval)
-
-        job_string_complete = self.compose_message(job_string)
-
-        #ss.logger_freshs.debug(cc.c_magenta + 'Sending job_string ' + job_string_complete + \
-        #                          cc.reset)
+            job['last_rc'] = rcval
 
         # Send job string
         ss.client_runtime[str(self)] = time.time()
-        self.long_send( job_string_complete )
+        if ex_ind == -1:
+            self.add_pending_job(job_uuid, current_lambda)
+        self.send_job( job, job_point )
 
 # --------------------------------------------------------------------------
 # FFS Probabilities, monster task
@@ -344,6 +446,8 @@ class ClientHandler(asyncore.dispatcher):
         # choose a seed for the client RNG, using the server RNG
         client_seed = random.randint(0, ss.myRandMax)
 
+        job_uuid = self.get_uuid()
+
         # only use the following if not in exploration mode
         if ex_ind == -1:
 
@@ -380,7 +484,7 @@ class ClientHandler(asyncore.dispatcher):
             indatabase = False
             next_interface = ai.ex_lambdas[ex_ind]
             current_lambda = ai.citeml(ex_ind)
-            ss.explorer_clients[self] = current_lambda
+            self.add_as_explorer(current_lambda)
             if ai.auto_max_steps != 0 and ai.auto_histo:
                 max_steps = ai.auto_max_steps
             # Get calculation point
@@ -405,15 +509,19 @@ class ClientHandler(asyncore.dispatcher):
 
         ss.logger_freshs.debug(cc.c_magenta + 'Indatabase: ' + str(indatabase) + ', ghostcount = ' + str(self.ghostcount) + cc.reset)
 
+        ghostline = ()
         if indatabase and self.ghostcount < ss.ffs_control.max_ghosts_between:
             # Ghost run is available! Get it.
             ghostline = ss.ghostpoints.get_line_origin_point(rp_id)
+            if len(ghostline) == 0:
+                ss.logger_freshs.warn(cc.c_red + 'Ghost line of ' + str(rp_id) + ' not found, calculating the point.' + cc.reset)
 
+        if len(ghostline) > 0:
             self.ghostcount += 1
 
             # Check if ghostrun was successful
             if int(ghostline[6]) == 1:
-                data = "\"jobtype\": 2, \"success\": True, \"points\": " + str(ghostline[1])
+                data = "\"jobtype\": 2, \"success\": True, \"points\": " + str(point_codec.stored(ghostline[1]))
                 ss.logger_freshs.info(cc.c_magenta + 'Wohooo! This was a ghost (' + str(self.name) + ', success=1).' + cc.reset)
             else:
                 data = "\"jobtype\": 2, \"success\": False"
@@ -458,27 +566,15 @@ class ClientHandler(asyncore.dispatcher):
             self.ghostcount = 0
 
             # check if ghost client is calculating this point at the moment
-            if rp_id in ss.ghost_clients.values():
-                done = 0
-                # point is at the moment calculated, find key (client) for value
-                for key in ss.ghost_clients.keys()[::-1]:
-                    if not done:
-                        if ss.ghost_clients[key] == rp_id:
-                            # entry found. Convert ghost to real client
-                            ss.logger_freshs.info(cc.c_magenta + 'Converted ' + str(self.name) + \
-                                                           ' from ghost to real.' + cc.reset)
-                            # started run on random point, remove from lists
-                            random_point = []
-                            ss.ghost_clients.pop(key)
-                            #try:
-                            #ss.ghostnames.remove(self.find_client_by_key(key).name)
-                            ss.ghostnames.remove(key.name)
-                            #except:
-                            #    ss.logger_freshs.warn(cc.c_red + \
-                            #                                   'Could not remove ghost from name array.' + \
-                            #                                   cc.reset)
-                            # set done because we use only one client which calculates on this point
-                            done = 1
+            if ss.clients.has_data(client_state.GHOST, rp_id):
+                # point is at the moment calculated, use only the client which started last
+                key = ss.clients.with_data(client_state.GHOST, rp_id)[-1]
+                # Convert ghost to real client
+                ss.logger_freshs.info(cc.c_magenta + 'Converted ' + str(self.name) + \
+                                               ' from ghost to real.' + cc.reset)
+                # started run on random point, remove from lists
+                random_point = []
+                key.remove_from_ghost()
 
             # Is there a random point left?
             if len(random_point) > 0:
@@ -496,33 +592,31 @@ class ClientHandler(asyncore.dispatcher):
                     ss.logger_freshs.debug(cc.c_magenta + 'Explorer index is ' + str(current_lambda) + ', max_steps = ' + str(max_steps) + \
                                           cc.reset)
 
-                job_string = "\"jobtype\": 2 , \"A\": "     + str(self.server.A)    + \
-                                   ", \"B\": "              + str(self.server.B) + \
-                                   ", \"random_points\": "  + str(random_point)  + \
-                                   ", \"rp_id\": \""        + str(rp_id) + "\""     + \
-                                   ", \"seed\": "           + str(client_seed)      + \
-                                   ", \"next_interface\": " + str(next_interface) + \
-                                   ", \"act_lambda\": "     + str(current_lambda) + \
-                                   ", \"max_steps\": "      + str(max_steps) + \
-                                   ", \"clientname\": \""   + self.name + "\"" + \
-                                   ", \"timestamp\": \""    + ss.timestamp +"\"" + \
-                                   ", \"uuid\": \""         + self.get_uuid() + "\""
+                job = OrderedDict([
+                    ('jobtype',        2),
+                    ('A',              self.server.A),
+                    ('B',              self.server.B),
+                    ('rp_id',          str(rp_id)),
+                    ('seed',           client_seed),
+                    ('next_interface', next_interface),
+                    ('act_lambda',     current_lambda),
+                    ('max_steps',      max_steps),
+                    ('clientname',     self.name),
+                    ('timestamp',      ss.timestamp),
+                    ('uuid',           job_uuid)])
 
                 if ss.ffs_control.reverse_direction > 0:
-                    job_string += ", \"reverse_direction\": 1"
+                    job['reverse_direction'] = 1
 
                 if ss.ffs_control.send_mean_steps > 0:
-                    job_string += ", \"mean_steps\": " + str(ss.storepoints.return_mean_steps(current_lambda))
-
-                job_string_complete = self.compose_message(job_string)
-
-                #ss.logger_freshs.debug(cc.c_magenta + 'Sending job_string ' + job_string_complete + \
-                #                  cc.reset)
+                    job['mean_steps'] = ss.storepoints.return_mean_steps(current_lambda)
 
                 ss.client_runtime[str(self)] = time.time()
 
                 # Send job string
-                self.long_send( job_string_complete )
+                if ex_ind == -1:
+                    self.add_pending_job(job_uuid, current_lambda)
+                self.send_job( job, random_point )
 
             else:
                 # No random point is left. Check if another run is necessary, if yes, recall this routine recursively
@@ -565,27 +659,23 @@ class ClientHandler(asyncore.dispatcher):
 
         ss.client_runtime[str(self)] = time.time()
 
-        job_string = "\"jobtype\": 2 , \"A\": " + str(ss.A) + \
-                    ", \"B\": "              + str(self.server.B) + \
-                    ", \"random_points\": "  + str(selected_point)   + \
-                    ", \"rp_id\": \""        + str(rp_id) + "\""     + \
-                    ", \"seed\": "           + str(client_seed)      + \
-                    ", \"max_steps\": 0" + \
-                    ", \"next_interface\": " + str(next_interface) + \
-                    ", \"clientname\": \"" + self.name + "\"" + \
-                    ", \"timestamp\": \"" + ss.timestamp + "\"" + \
-                    ", \"act_lambda\":"      + str(next_lambda) + \
-                    ", \"uuid\": \"" + self.get_uuid() + "\""
+        job = OrderedDict([
+            ('jobtype',        2),
+            ('A',              ss.A),
+            ('B',              self.server.B),
+            ('rp_id',          str(rp_id)),
+            ('seed',           client_seed),
+            ('max_steps',      0),
+            ('next_interface', next_interface),
+            ('clientname',     self.name),
+            ('timestamp',      ss.timestamp),
+            ('act_lambda',     next_lambda),
+            ('uuid',           self.get_uuid())])
 
         if ss.ffs_control.reverse_direction > 0:
-            job_string += ", \"reverse_direction\": 1"
-
-        job_string_complete = self.compose_message(job_string)
-
-        #ss.logger_freshs.debug(cc.c_magenta + 'Sending job_string ' + job_string_complete + \
-        #                       cc.reset)
+            job['reverse_direction'] = 1
 
-        self.long_send( job_string_complete )
+        self.send_job( job, selected_point )
 
 
 # --------------------------------------------------------------------------
@@ -650,7 +740,7 @@ class ClientHandler(asyncore.dispatcher):
                                    job_string_complete[0:256] + " [...]" + \
                                    cc.reset)
 
-            self.long_send( job_string_complete )
+            self.send_packet( job_string_complete )
             ss.run_count[row] += 1
 
             self.remove_from_idle()
@@ -708,7 +798,7 @@ class ClientHandler(asyncore.dispatcher):
         ss.logger_freshs.debug(cc.c_magenta + 'Sending job_string ' + job_string_complete + \
                                cc.reset)
 
-        self.long_send( job_string_complete )
+        self.send_packet( job_string_complete )
 
         self.remove_from_idle()
 
@@ -726,33 +816,179 @@ class ClientHandler(asyncore.dispatcher):
         self.server.logger_freshs.info(cc.c_green + 'Setting ' + str(self.name) + \
                                        ' into wait mode.' + cc.reset)
 
-        waits=[]
-        for cli in self.server.idle_clients:
-            waits.append(str(cli.name))
-        waits.sort()
-        self.server.logger_freshs.debug(cc.c_blue + 'Clients: ' + str(waits) + ' waiting.' + cc.reset)
+        self.server.logger_freshs.debug(cc.c_blue + str(len(self.server.idle_clients)) + ' clients waiting.' + cc.reset)
 
 
 
-        self.long_send("{\"jobtype\": 0 }PKT_SEP\n")
+        self.send_packet("{\"jobtype\": 0 }")
 
 
     # Send exit job to client
     def send_quit(self):
         self.server.logger_freshs.info(cc.c_blue + 'Sending quit to ' + str(self.name) + cc.reset)
-        self.long_send("{\"jobtype\": -1 }PKT_SEP\n")
+        self.send_packet("{\"jobtype\": -1 }")
 
     # answer, that we are alive
     def answer_alive(self):
-        self.long_send("server_is_alivePKT_SEP\n")
+        self.send_packet("server_is_alive")
 
     # request alive signal from client
     def request_alive(self):
-        self.long_send("alive_requestPKT_SEP\n")
+        self.send_packet("alive_request")
+
+    # send a message in the format of the negotiated protocol version
+    def send_packet(self, text):
+        if self.protocol > 1:
+            self.long_send(self.compressor.frame_text(text))
+        else:
+            self.long_send(self.compressor.text_packet(text) + 'PKT_SEP\n')
+
+    # send a message as typed frame, version 2 only
+    def send_typed(self, ddata):
+        self.long_send(self.compressor.frame_typed(ddata))
+
+    # binary points go to version 2 clients as raw array, without conversion to text
+    def sends_raw(self, point):
+        return self.protocol > 1 and isinstance(point, point_codec.packed_point)
+
+    # Send the fields of a job and its point as random_points (if any). The job
+    # goes out as job string, or as typed frame with the point as raw array if
+    # the point is stored binary and the client takes it.
+    def send_job(self, job, point=None):
+        ss = self.server
+        if not self.sends_raw(point):
+            # strings quoted, everything else as python literal
+            fields = [ '"' + key + '": ' + ('"' + job[key] + '"' if isinstance(job[key], basestring) else str(job[key])) \
+                       for key in job ]
+            if point is not None:
+                fields.append('"random_points": ' + str(point))
+            self.send_packet(self.compose_message(', '.join(fields)))
+            return
+
+        ddata = dict(job)
+        # as in compose_message
+        if ss.user_msg != '':
+            if len([ tk for tk in ss.user_msg_dict if str(tk) in ddata ]) > 0:
+                ss.logger_freshs.warn(cc.c_red + 'A key of usr_msg is already in the system message! Not appending.' + cc.reset)
+            else:
+                ddata.update(ss.user_msg_dict)
+        ddata['random_points'] = wire_protocol.RawArray(point.shape, point.float64())
+        self.send_typed(ddata)
+
+
+#### CLASS FOR HANDLING THE CLIENTS ####
+class ClientHandler(ClientBase, asyncore.dispatcher):
+
+## Init ##
+    def __init__(self, server, sock, addr, name, received_count=0):
+        asyncore.dispatcher.__init__(self, sock=sock)
+        self.sock = sock
+        self.addr = addr
+
+        # outgoing data which could not be sent yet, drained in handle_write
+        self.out_buffer = bytearray()
+        self.out_offset = 0
+
+        self.setup(server, name, received_count)
+
+        # send name to client, always in version 1 format
+        self.long_send(name + 'PKT_SEP\n')
+
+        return
+
+## Socket handling ##
+    def handle_write(self):
+        if self.msg:
+            data=self.msg.pop()
+            self.long_send(data)
+        else:
+            self.flush_out()
+
+    # do not read more results while the client does not take our data
+    def readable(self):
+        return self.pending_out() < self.server.send_highwater
+
+    def handle_read(self):
+
+        ##get some data from the socket
+        self.process_bytes(self.recv(262144))
+
+    def writable(self):
+        response = bool(self.msg) or self.pending_out() > 0
+        return response
+
+    # queue data and send as much as the socket takes, the rest is sent in handle_write
+    def long_send(self, data):
+        self.out_buffer.extend(data)
+        self.flush_out()
+
+    def flush_out(self):
+        while self.out_offset < len(self.out_buffer):
+            # send returns 0 if the socket would block or was closed
+            count = self.send( memoryview(self.out_buffer)[self.out_offset:] )
+            if count <= 0:
+                break
+            self.out_offset += count
+
+        if self.out_offset >= len(self.out_buffer):
+            del self.out_buffer[:]
+            self.out_offset = 0
+        elif self.out_offset > 1048576 and self.out_offset * 2 > len(self.out_buffer):
+            # drop what was sent already
+            del self.out_buffer[:self.out_offset]
+            self.out_offset = 0
+
+    # number of bytes waiting to be sent
+    def pending_out(self):
+        return len(self.out_buffer) - self.out_offset
+
+
+#### ONE SLOT OF A CLIENT WHICH RUNS SEVERAL JOBS IN PARALLEL ####
+# Slot 0 is the ClientHandler of the connection itself, the further slots
+# share its connection and tag their messages with the slot number. For the
+# server, every slot is a separate client.
+class SlotHandler(ClientBase):
+
+## Init ##
+    def __init__(self, connection, slot, name, received_count=0):
+        self.connection = connection
+        self.slot       = slot
+        self.addr       = connection.addr
+        self.closed     = False
+
+        self.setup(connection.server, name, received_count)
+
+        return
+
+## Connection handling ##
+    def send_packet(self, text):
+        if text.startswith('{'):
+            text = '{"slot": ' + str(self.slot) + ', ' + text[1:]
+        self.connection.send_packet(text)
+
+    def send_typed(self, ddata):
+        ddata['slot'] = self.slot
+        self.connection.send_typed(ddata)
+
+    def sends_raw(self, point):
+        return self.connection.sends_raw(point)
 
-    # helper function for handling large packets
     def long_send(self, data):
-        packet_len = len(data)
-        count      = 0
-        while count < packet_len:
-            count += self.send( data[count:packet_len] )
+        self.connection.long_send(data)
+
+    def pending_out(self):
+        return self.connection.pending_out()
+
+    # the connection stays open for the other slots
+    def close(self):
+        self.closed = True
+
+    def handle_close(self):
+        if self.closed:
+            return
+        self.server.logger_freshs.info(cc.c_magenta + 'CLIENT CLOSED: ' +\
+                                       self.name + cc.reset)
+
+        if self in self.server.clients:
+            self.server.deregisterClient(self)
+        self.close()
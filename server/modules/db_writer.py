@@ -0,0 +1,111 @@
+# Writer thread for sqlite databases in WAL mode (db_mode = writer).
+#
+# Statements which change the database are queued and run in order by a
+# single thread on its own connection, so the event loop does not wait for
+# the disk. The server keeps reading on its own connection. In WAL mode,
+# reading does not block writing and sees everything committed so far,
+# sync() waits until all queued statements are committed. unsynced tells
+# whether statements were queued since the last sync. The first failure
+# of the writer is raised in the server thread by the next commit, sync or
+# close.
+
+import sqlite3
+import threading
+import Queue
+
+# first words of statements which change the database
+WRITE_STATEMENTS = ['insert', 'update', 'delete', 'replace', 'create', 'drop', 'alter']
+
+def is_write(sql):
+    words = sql.split(None, 1)
+    return len(words) > 0 and words[0].lower() in WRITE_STATEMENTS
+
+# switch a database to WAL mode, the mode is stored in the database file
+def enable_wal(con):
+    cur = con.cursor()
+    cur.execute('PRAGMA journal_mode = WAL')
+    return str(cur.fetchone()[0]).lower() == 'wal'
+
+
+class db_writer(threading.Thread):
+
+    def __init__(self, dbfile, logger=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.dbfile = dbfile
+        self.logger = logger
+        self.queue  = Queue.Queue()
+        self.error  = None
+        self.unsynced = False
+
+        self.start()
+
+## Interface for the server thread ##
+    def is_write(self, sql):
+        return is_write(sql)
+
+    def execute(self, sql, params=()):
+        self.unsynced = True
+        self.queue.put(('execute', sql, params))
+
+    def executemany(self, sql, seq):
+        self.unsynced = True
+        self.queue.put(('executemany', sql, list(seq)))
+
+    def commit(self):
+        self.check()
+        self.queue.put(('commit', None, None))
+
+    # wait until everything queued so far is committed
+    def sync(self):
+        done = threading.Event()
+        self.queue.put(('sync', done, None))
+        done.wait()
+        self.unsynced = False
+        self.check()
+
+    def close(self):
+        self.queue.put(('close', None, None))
+        self.join()
+        self.check()
+
+    # raise the first failure of the writer thread, once
+    def check(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+## Writer thread ##
+    def run(self):
+        con = sqlite3.connect(self.dbfile, timeout=60)
+        cur = con.cursor()
+
+        while True:
+            kind, arg1, arg2 = self.queue.get()
+            try:
+                if kind == 'execute':
+                    cur.execute(arg1, arg2)
+                elif kind == 'executemany':
+                    cur.executemany(arg1, arg2)
+                elif kind == 'commit' or kind == 'sync':
+                    con.commit()
+                elif kind == 'close':
+                    con.commit()
+            except Exception as e:
+                self.warn('Writer of ' + self.dbfile + ' failed: ' + str(e))
+                if self.error is None:
+                    self.error = e
+            finally:
+                if kind == 'sync':
+                    arg1.set()
+            if kind == 'close':
+                con.close()
+                return
+
+    def warn(self, msg):
+        if self.logger is not None:
+            self.logger.warn(msg)
+        else:
+            print(msg)
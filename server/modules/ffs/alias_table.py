@@ -0,0 +1,50 @@
+# Alias table (Walker, Vose) for drawing indexes with given weights in O(1).
+#
+# Every index i gets a bucket of probability 1/n, which is split between i
+# itself (prob[i]) and one other index (alias[i]). A draw picks a bucket
+# uniformly and then one of its two indexes. Building the table is O(n).
+# Draws use the python RNG, which is seeded by the server.
+
+import random
+
+import numpy as np
+
+
+class alias_table():
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        self.n  = len(weights)
+        total   = np.sum(weights)
+        assert self.n > 0 and total > 0., "Problem in PERM weights."
+
+        scaled = weights * (self.n / total)
+        prob   = np.ones(self.n)
+        alias  = np.arange(self.n)
+
+        small = list(np.nonzero(scaled < 1.)[0])
+        large = list(np.nonzero(scaled >= 1.)[0])
+        scaled = scaled.tolist()
+        while len(small) > 0 and len(large) > 0:
+            s = small.pop()
+            l = large.pop()
+            prob[s]  = scaled[s]
+            alias[s] = l
+            # the large index gives the rest of the bucket of s
+            scaled[l] = (scaled[l] + scaled[s]) - 1.
+            if scaled[l] < 1.:
+                small.append(l)
+            else:
+                large.append(l)
+        # what is left has probability 1 up to rounding, prob stays 1
+
+        self.prob  = prob
+        self.alias = alias
+
+    def __len__(self):
+        return self.n
+
+    def draw(self):
+        i = random.randrange(self.n)
+        if random.random() < self.prob[i]:
+            return i
+        return int(self.alias[i])
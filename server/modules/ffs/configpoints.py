@@ -21,10 +21,14 @@
 
 # database
 import sqlite3
+import time
 
 # point selection: SQlite RNG is not high quality; and cannot be seeded.
 import random
 
+# unused ghost lines
+from collections import deque
+
 # math
 import numpy as np
 
@@ -41,6 +45,92 @@ except:
 import ast
 import re
 
+# Indexes and schema migration
+import configpoints_schema
+
+# Weighted choice of PERM points
+import alias_table
+
+# Interface points cache
+import point_cache
+
+# Storage format of the points
+import point_codec
+
+# Storage interface, implemented by this class
+import point_storage
+
+# name of the entry in received_counts holding the rowid up to which configpoints were scanned
+RECEIVED_ROWID = '#rowid'
+
+#### CURSOR WHICH WRITES BUFFERED POINTS BEFORE EVERY STATEMENT ####
+# New points are kept in memory by add_point and written with executemany as soon
+# as any other statement is run on the database, so queries always see them.
+# Only the commit, which syncs to disk, is deferred, see configpoints.add_point.
+# After other writes, the commit follows once db_commit_interval has passed.
+# With a writer thread (db_mode = writer), statements which change the database
+# are handed to the writer. Before the next query, the cursor waits until the
+# writer has committed them, so queries see them as well.
+class buffered_cursor:
+    def __init__(self, db, cur):
+        self.db  = db
+        self.raw = cur
+
+    # wait for the writes queued since the last query
+    def sync_writer(self):
+        if self.db.writer is not None and self.db.writer.unsynced:
+            self.db.writer.sync()
+
+    def execute(self, sql, params=()):
+        self.db.write_pending()
+        if self.db.writer is not None and self.db.writer.is_write(sql):
+            self.db.writer.execute(sql, params)
+            self.db.commit_if_due()
+            return None
+        self.sync_writer()
+        result = self.raw.execute(sql, params)
+        if not is_query(sql):
+            self.db.commit_if_due()
+        return result
+
+    def executemany(self, sql, seq):
+        self.db.write_pending()
+        if self.db.writer is not None and self.db.writer.is_write(sql):
+            self.db.writer.executemany(sql, seq)
+            self.db.commit_if_due()
+            return None
+        self.sync_writer()
+        result = self.raw.executemany(sql, seq)
+        self.db.commit_if_due()
+        return result
+
+    def fetchone(self):
+        return self.raw.fetchone()
+
+    def fetchall(self):
+        return self.raw.fetchall()
+
+    def __iter__(self):
+        return iter(self.raw)
+
+
+# statements which only read
+def is_query(sql):
+    return sql.lstrip()[:6].lower() == 'select'
+
+
+##add the queued usecounts (myid -> count) in one joined update. The counts
+##go to a temporary table first, so the work grows linearly with the queue.
+def flush_usecounts(cur, queue):
+    cur.execute('create temp table if not exists usecount_queue (myid text primary key, count int)')
+    cur.execute('delete from usecount_queue')
+    cur.executemany('insert into usecount_queue values (?,?)', [ (str(key), count) for key, count in queue.iteritems() ])
+    cur.execute('update configpoints set usecount = usecount + ' +\
+                '(select count from usecount_queue where usecount_queue.myid = configpoints.myid) ' +\
+                'where myid in (select myid from usecount_queue)')
+    cur.execute('delete from usecount_queue')
+
+
 ##helper function to pick from points with different weights
 def weighted_choice(weightVec):
    total   = np.sum(weightVec)
@@ -54,28 +144,72 @@ def weighted_choice(weightVec):
 
 
 #### CLASS FOR HANDLING CONFIG POINTS ON HYPERSURFACES ####
-class configpoints:
-    def __init__(self, server, dbfile):
+class configpoints(point_storage.point_storage):
+    # migrate: bring the database to the current schema version, for the databases of the server itself
+    def __init__(self, server, dbfile, migrate=False):
 
         self.server = server
 
+        # points not written yet, and number of points written since the last commit
+        self.pending_points   = []
+        self.pending_payloads = []
+        self.uncommitted    = 0
+        self.last_commit    = time.time()
+
+        # group commit: commit after this many points or seconds, see server config
+        try:
+            self.commit_every    = server.db_commit_every
+            self.commit_interval = server.db_commit_interval
+        except AttributeError:
+            # postprocessing scripts
+            self.commit_every    = 1
+            self.commit_interval = 0.0
+
+        # storage format of new points, see point_codec
+        try:
+            self.point_format = server.point_format
+        except AttributeError:
+            self.point_format = 'text'
+
+        # keep points and customdata of new databases in a separate table
+        try:
+            self.payload_table = server.payload_table
+        except AttributeError:
+            self.payload_table = False
+
+        # default: write on the server connection, writer: WAL mode and a writer thread
+        try:
+            self.db_mode = server.db_mode
+        except AttributeError:
+            self.db_mode = 'default'
+        self.writer = None
+
         # create sqlite table
         self.dbfile = dbfile
         self.con, self.cur = self.connect()
-        self.init_table()
+        self.cur = buffered_cursor(self, self.cur)
+        self.init_table(migrate)
+
+        if self.db_mode == 'writer':
+            self.start_writer()
         self.have_pair_ij = 0
         # if you have problems with the database which cannot be written to disk, error: "database or disk is full"
         #self.cur.execute('PRAGMA temp_store = 2')
 
         # ghost point cache
-        self.ghostcache = []
-        self.ghostlastcount = 0
-        self.ghostlastlam = -1
-        self.noghostonpoint = []
+        self.ghostheap = None
+        # unused ghost lines, see ghost_index
+        self.ghostlines = None
 
-        # interface points cache
-        self.realcache = {}
-        self.realcachelambda = -1
+        # interface points cache, points are loaded through a LRU cache of this size
+        try:
+            point_cache_size = server.point_cache_size
+        except AttributeError:
+            point_cache_size = 1000
+        self.pointcache = point_cache.interface_cache(-1)
+        self.pointlru   = point_cache.lru_cache(point_cache_size)
+        # cache of the next interface, grows while it is sampled
+        self.growingcache = None
 
         # number of successful points cache.
         self.nop_cache = {}
@@ -90,7 +224,7 @@ class configpoints:
         self.haveLog = False
         try:
             self.server.logger_freshs.info(cc.c_green + 'Connecting to DB: ' + self.dbfile + cc.reset)
-            haveLog = True
+            self.haveLog = True
         except:
             print('Connecting to DB: ' + self.dbfile)
             pass
@@ -98,7 +232,7 @@ class configpoints:
             con = sqlite3.connect(self.dbfile)
             cur = con.cursor()
         except sqlite3.Error as e:
-            if not haveLog:
+            if not self.haveLog:
                 print("Error connecting to DB")
             else:
                 self.server.logger_freshs.error(cc.c_red + "Error connecting to database." + cc.reset)
@@ -107,11 +241,39 @@ class configpoints:
 
     # Close database connection
     def close(self):
+        self.commit_points()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
         self.con.close()
 
+    # switch to WAL mode and hand all writes to a writer thread
+    def start_writer(self):
+        # only needed in this mode, scripts do not have it in their path
+        import db_writer
+        self.con.commit()
+        if not db_writer.enable_wal(self.con):
+            if self.haveLog:
+                self.server.logger_freshs.warn(cc.c_red + self.dbfile + ': WAL mode not available, not using a writer thread.' + cc.reset)
+            return
+        logger = None
+        if self.haveLog:
+            logger = self.server.logger_freshs
+        self.writer = db_writer.db_writer(self.dbfile, logger)
+        if self.haveLog:
+            self.server.logger_freshs.info(cc.c_blue + self.dbfile + ': WAL mode, writing in a separate thread.' + cc.reset)
+
+    # wait until all writes are committed and visible to queries, only needed with a writer thread
+    def sync(self):
+        self.write_pending()
+        if self.writer is not None:
+            self.writer.sync()
+
 
     def commit(self, renorm_weights = False, lambda_current = None):
 
+        if renorm_weights == True:
+            self.sync()
 
         ##initialise the weights at A.
         if renorm_weights == True and lambda_current == 0:
@@ -122,67 +284,34 @@ class configpoints:
 
         try:
             if len(self.usecountqueue) > 0:
-                print("Updating usecounts in DB, "+str(len(self.usecountqueue))+" entries. Please wait.")
-                # construct queries with case statements for better performance
-                count  = 0
-                tquery = "UPDATE configpoints SET usecount=usecount+ CASE myid "
-                processed_keys = []
-
-                for key in self.usecountqueue.keys():
-                    processed_keys.append(key)
-                    tquery += "WHEN '" + str(key) + "' THEN " + str(self.usecountqueue[key]) + " "
-                    count += 1
-                    if count % 10000 == 0:
-                        print(count)
-                        tquery += "END WHERE myid IN " + str(tuple(processed_keys))
-                        self.cur.execute(tquery)
-                        processed_keys = []
-                        tquery = "UPDATE configpoints SET usecount=usecount+ CASE myid "
-
-                if len(processed_keys) > 1:
-                    # add a where clause that only lines with the candidate myids are considered
-                    tquery += "END WHERE myid IN " + str(tuple(processed_keys))
-                    print(count)
-                    self.cur.execute(tquery)
-
-                elif len(processed_keys) == 1:
-                    tquery += "END WHERE myid = '" + str(processed_keys[0]) + "'"
-                    self.cur.execute(tquery)
-                
-                print("Ready.")
+                flush_usecounts(self.cur, self.usecountqueue)
                 self.usecountqueue = {}
 
-
         except Exception as e:
             print("Exception updating db:"+str(e))
         
         ##renorm weights once and once only per IF, when interface is definitely done.
         if renorm_weights == True and lambda_current >= 1:
+            self.sync()
             self.update_childpoint_weights(lambda_current)
-            self.renorm_childpoint_weights(lambda_current) 
             
 
-        self.con.commit()
+        self.commit_points()
 
-    ##(PERM) enrich and renormalise childpoints weights s.t. total weight is P(lambda | lambda_prev)
-    ##       call only after update update_childpoint_weights()
-    def renorm_childpoint_weights(self, lambda_current):
-        
-        E = 1.0
-        if lambda_current >= 1:
-            self.cur.execute('select sum(weight) from configpoints where lambda = ? and usecount != 0', [lambda_current-1])
-            used_weight_prev = float(self.cur.fetchone()[0])
-            self.cur.execute('select sum(weight) from configpoints where lambda = ? and success = 1', [lambda_current-1])
-            total_weight_prev = float(self.cur.fetchone()[0])
-
-            E = total_weight_prev / used_weight_prev
-            self.cur.execute('update configpoints set weight=weight*? where lambda=?', [E/total_weight_prev,lambda_current] )
-
-        self.cur.execute('select sum(weight) from configpoints where lambda = ?', [lambda_current])
-        total_weight = float(self.cur.fetchone()[0])
-        print("enriched and renormed weights, E was: %f total P(lambda = %i| lambda = %i) = %e" %\
-                       (E, lambda_current, lambda_current-1, total_weight))
+    # Write buffered points and commit, without the usecount and weight updates of commit()
+    def commit_points(self):
+        self.write_pending()
+        if self.writer is not None:
+            self.writer.commit()
+        else:
+            self.con.commit()
+        self.uncommitted = 0
+        self.last_commit = time.time()
 
+    # commit writes other than points when db_commit_interval has passed
+    def commit_if_due(self):
+        if time.time() - self.last_commit >= self.commit_interval:
+            self.commit_points()
 
     ##(PERM) enrich childpoints weights s.t. total weight is P(lambda)
     ##       call only after update update_childpoint_weights()
@@ -203,34 +332,54 @@ class configpoints:
             E = total_weight_prev / used_weight_prev
             print("Enrichment factor: %.12e / %.12e = %.12e" % (total_weight_prev, used_weight_prev, E))
             self.cur.execute('update configpoints set weight=weight*? where lambda=?', [E,lambda_current] )
+            self.sync()
 
             self.cur.execute('select sum(weight) from configpoints where lambda = ?', [lambda_current])
             total_weight = float(self.cur.fetchone()[0])
             print("enriched weights prev used=%f prev total=%f, total P(lambda = %i) = %.12e" %\
                        (used_weight_prev, total_weight_prev, lambda_current, total_weight))
 
-    ##(PERM) : update weights, but not doing enrichment step
+    ##(PERM) update the weights of the childpoints on lambda_current from their parents,
+    ##       enrich and renormalise them s.t. total weight is P(lambda | lambda_prev).
+    ##       Both interfaces are read once, the new weights are written with one executemany.
     def update_childpoint_weights(self, lambda_current):
-        
+
         if lambda_current < 1:
             return
-        
-        self.cur.execute('select myid,weight,usecount from configpoints where lambda = ? and usecount != 0', [lambda_current-1])
-        parent_states = []
-        for row in self.cur:
-            parent_states.append(row[:])
 
-        sum_w = 0.
-        for pstate, w, c in parent_states:
-            new_weight = float(w)/float(c)
-            self.cur.execute('update configpoints set weight=? where origin_point=? and lambda=?',\
-                             [new_weight, pstate, lambda_current])
-            sum_w += new_weight
-        return sum_w
+        self.cur.execute('select myid,weight,usecount,success from configpoints where lambda = ?', [lambda_current-1])
+        parents = self.cur.fetchall()
+        self.cur.execute('select rowid,origin_point,weight from configpoints where lambda = ?', [lambda_current])
+        children = self.cur.fetchall()
+        if len(parents) == 0 or len(children) == 0:
+            return
+
+        weight   = np.array([ float(row[1] or 0.) for row in parents ])
+        usecount = np.array([ int(row[2] or 0) for row in parents ])
+        success  = np.array([ row[3] == 1 for row in parents ])
+        used     = usecount != 0
+
+        used_weight_prev  = weight[used].sum()
+        total_weight_prev = weight[success].sum()
+        if used_weight_prev <= 0.:
+            print("No weight on used points at lambda = %i, weights not updated." % (lambda_current-1))
+            return
+        E = total_weight_prev / used_weight_prev
+
+        ##weight of a parent is shared by its children, children of unused parents keep their weight
+        parent_weight = dict(zip([ row[0] for row in parents if row[2] ], weight[used] / usecount[used]))
+        child_weight  = np.array([ parent_weight.get(row[1], row[2] or 0.) for row in children ], dtype=float)
+        child_weight *= E / total_weight_prev
+
+        self.cur.executemany('update configpoints set weight=? where rowid=?',\
+                             zip(child_weight.tolist(), [ row[0] for row in children ]))
+
+        print("enriched and renormed weights, E was: %f total P(lambda = %i| lambda = %i) = %e" %\
+                       (E, lambda_current, lambda_current-1, child_weight.sum()))
 
 
     # Create table layout
-    def init_table(self):
+    def init_table(self, migrate=False):
         try:
             self.cur.execute('''create table configpoints (lambda int, configpoint text, origin_point text, calcsteps int, ctime real, runtime real, success int, runcount int, myid text, seed int, lambda_old int, weight real, rcval real, lpos real, usecount int, deactivated int, uuid text, customdata text)''')
             self.con.commit()
@@ -252,6 +401,36 @@ class configpoints:
                     print("Error accessing database %s." % self.dbfile )
                 raise SystemExit(str(exc))
 
+        # the databases of the server get the indexes and tables of the current schema version
+        if migrate:
+            try:
+                version = configpoints_schema.migrate(self.con)
+            except Exception as exc:
+                if self.haveLog:
+                    self.server.logger_freshs.error(cc.c_red + "Error migrating database %s: %s" % (self.dbfile, str(exc)) + cc.reset)
+                else:
+                    print("Error migrating database %s: %s" % (self.dbfile, str(exc)))
+                raise SystemExit(str(exc))
+
+            if version < configpoints_schema.SCHEMA_VERSION:
+                if self.haveLog:
+                    self.server.logger_freshs.info(cc.c_green + "%s: migrated from schema version %d to %d." % \
+                                                   (self.dbfile, version, configpoints_schema.SCHEMA_VERSION) + cc.reset)
+                else:
+                    print("%s: migrated from schema version %d to %d." % (self.dbfile, version, configpoints_schema.SCHEMA_VERSION))
+
+        if self.payload_table and not configpoints_schema.has_payloads(self.con):
+            configpoints_schema.create_payloads(self.con)
+            if self.haveLog:
+                self.server.logger_freshs.info(cc.c_green + "%s: points are stored in the payloads table." % self.dbfile + cc.reset)
+
+        # databases in the split layout are read and written in it, also by scripts
+        self.split_payloads = configpoints_schema.has_payloads(self.con)
+        if self.split_payloads:
+            self.full_table = 'configpoints_full'
+        else:
+            self.full_table = 'configpoints'
+
 
 
     # Add config point to database
@@ -266,24 +445,77 @@ class configpoints:
             if self.nop_cache.has_key(interface):
                 self.nop_cache[interface] += 1
 
-        entries.append((interface, str(newpoint), str(originpoint), calcsteps, ctime, runtime, success, runcount, pointid, seed, 0, 0., rcval, lpos, usecount, deactivated, uuid, customdata))
-
-        for t in entries:
-            maxretry = 3
-            attempt = 0
-            writeok = 0
-            while (not writeok) and (attempt < maxretry):
-                try:
-                    self.cur.execute('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', t)
-                    self.con.commit()
-                    writeok = 1
-                except:
-                    attempt += 1
-                    try:
-                        self.server.logger_freshs.warn(cc.c_red + 'Could not write data to DB, retrying ' + str(maxretry) + ' times: ' + str(attempt) + '/' + str(maxretry) + cc.reset)
-                    except:
-                        pass
-                    #quit client and throw error (?)
+        point = point_codec.encode(newpoint, self.point_format)
+
+        # new unused ghost line
+        if usecount == 0 and deactivated == 0 and self.ghostlines is not None:
+            self.ghostlines.setdefault(str(originpoint), deque()).append(str(pointid))
+
+        # ghost jobs start from the interface being sampled
+        if success == 1 and deactivated == 0 and self.ghostheap is not None and \
+           self.ghostheap.the_lambda == interface:
+            self.ghostheap.add(str(pointid))
+
+        # points of the interface being sampled, the rowid is not known yet
+        if success == 1 and deactivated == 0 and self.growingcache is not None and \
+           self.growingcache.the_lambda == interface:
+            self.growingcache.append(str(pointid), -1)
+
+        # split layout: the line only gets the metadata
+        if self.split_payloads:
+            if len(point) > 0 or len(customdata) > 0:
+                self.pending_payloads.append((pointid, point, customdata))
+            point      = ''
+            customdata = ''
+
+        entries.append((interface, point, str(originpoint), calcsteps, ctime, runtime, success, runcount, pointid, seed, 0, 0., rcval, lpos, usecount, deactivated, uuid, customdata))
+
+        # the nop_cache already counts the buffered point
+        self.pending_points.extend(entries)
+        self.uncommitted += len(entries)
+
+        # group commit, a crash loses at most the uncommitted points
+        if self.uncommitted >= self.commit_every or time.time() - self.last_commit >= self.commit_interval:
+            self.commit_points()
+
+    # Write buffered points in one statement, not committed yet
+    def write_pending(self):
+        if len(self.pending_points) == 0 and len(self.pending_payloads) == 0:
+            return
+
+        if self.writer is not None:
+            if len(self.pending_payloads) > 0:
+                self.writer.executemany('insert or replace into payloads values (?,?,?)', self.pending_payloads)
+            self.writer.executemany('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', self.pending_points)
+            self.pending_payloads = []
+            self.pending_points = []
+            return
+
+        # The rows of a failed attempt, in configpoints and payloads, are removed before
+        # the next one, as a savepoint would (the sqlite3 module commits before a savepoint
+        # statement). After the last attempt the points stay pending, without any rows.
+        maxretry = 3
+        for attempt in range(1, maxretry + 1):
+            self.cur.raw.execute('select max(rowid) from configpoints')
+            last_rowid = self.cur.raw.fetchone()[0]
+            if last_rowid is None:
+                last_rowid = 0
+            try:
+                if len(self.pending_payloads) > 0:
+                    self.cur.raw.executemany('insert or replace into payloads values (?,?,?)', self.pending_payloads)
+                self.cur.raw.executemany('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', self.pending_points)
+                break
+            except sqlite3.Error as e:
+                self.cur.raw.execute('delete from configpoints where rowid > ?', [last_rowid])
+                if len(self.pending_payloads) > 0:
+                    self.cur.raw.executemany('delete from payloads where myid = ?', [ (p[0],) for p in self.pending_payloads ])
+                if self.haveLog:
+                    self.server.logger_freshs.warn(cc.c_red + 'Could not write data to DB (' + str(e) + '), attempt ' + \
+                                                   str(attempt) + '/' + str(maxretry) + cc.reset)
+                if attempt == maxretry:
+                    raise
+        self.pending_payloads = []
+        self.pending_points = []
 
 
     # Return number of active points (nop) on interface
@@ -292,6 +524,7 @@ class configpoints:
         if self.nop_cache.has_key(interface):
             return self.nop_cache[interface]
         else:
+            self.sync()
             self.cur.execute('select count(*) from configpoints where lambda = ? and success = 1 and deactivated = 0', [interface])
             r = int(self.cur.fetchone()[0])
             self.nop_cache[interface] = r
@@ -321,6 +554,38 @@ class configpoints:
             retval.append(int(re.sub(str(clname) + '_','',str(row[0]))))
         return int(max(retval))
 
+    # Return the highest received count of all client names. The counts are kept in the table
+    # received_counts, only points added since the last call are scanned.
+    def return_received_counts(self):
+        self.cur.execute('create table if not exists received_counts (name text primary key, received_count int)')
+        counts = {}
+        self.cur.execute('select name, received_count from received_counts')
+        for row in self.cur:
+            counts[str(row[0])] = int(row[1])
+        last_rowid = counts.pop(RECEIVED_ROWID, 0)
+
+        self.cur.execute('select rowid, myid from configpoints where rowid > ?', [last_rowid])
+        for row in self.cur:
+            last_rowid = max(last_rowid, int(row[0]))
+            [clname, sep, count] = str(row[1]).rpartition('_')
+            try:
+                count = int(count)
+            except ValueError:
+                continue
+            if len(sep) > 0 and count > counts.get(clname, 0):
+                counts[clname] = count
+
+        self.store_received_counts(counts)
+        self.cur.execute('insert or replace into received_counts values (?,?)', [RECEIVED_ROWID, last_rowid])
+        self.commit_points()
+
+        return counts
+
+    # Store received counts of client names, written with the next commit
+    def store_received_counts(self, counts):
+        self.cur.execute('create table if not exists received_counts (name text primary key, received_count int)')
+        self.cur.executemany('insert or replace into received_counts values (?,?)', counts.items())
+
     # Return overall calculation time on escape interface
     def return_ctime(self):
         self.cur.execute('select sum(ctime) from configpoints where lambda = 0 and success = 1 and deactivated = 0')
@@ -372,7 +637,7 @@ class configpoints:
 
         ##save the info
         r = self.cur.fetchone()
-        retpoints = ast.literal_eval(str(r[0]))
+        retpoints = point_codec.decode(self.load_point(r[1], point_codec.stored(r[0])))
         retpoint_ids = str(r[1])
         rcval = float(r[2])
 
@@ -417,40 +682,31 @@ class configpoints:
             i         = 0
             for row in self.cur:
                 ret_idList.append(str(row[0]))
-                cfpList.append(str(row[1]))
+                cfpList.append(point_codec.stored(row[1]))
                 weights.append(float(row[2]))
                 i += 1
             i       = weighted_choice( np.asarray(weights) )
 
-            return cfpList[i], ret_idList[i]
+            return self.load_point(ret_idList[i], cfpList[i]), ret_idList[i]
         # last interface is complete but no cache has been built yet
-        elif mode == 'last_interface_complete' and self.realcachelambda != the_lambda:
+        elif mode == 'last_interface_complete' and self.pointcache.the_lambda != the_lambda:
             #print("refresh cache")
-            self.realcache   = []
-            self.idcache     = []
-            self.weightcache = []
-            self.cur.execute('select myid,configpoint,weight from configpoints where deactivated = 0 and success = 1 and lambda = ?',[the_lambda])
+            weights = []
+            self.cur.execute('select myid,rowid,weight from configpoints where deactivated = 0 and success = 1 and lambda = ?',[the_lambda])
+            self.pointcache = self.read_pointcache(the_lambda, weights)
+            self.pointlru.clear()
 
-            i = 0
-            for row in self.cur:
-                self.idcache.append(str(row[0]))
-                self.realcache.append(str(row[1]))
-                self.weightcache.append(float(row[2]))
-                i += 1
-            self.realcachelambda = the_lambda
-            self.weightcache     = np.asarray(self.weightcache)
+            # O(1) draws from the cache
+            self.aliascache = alias_table.alias_table(weights)
 
-            i       = weighted_choice( self.weightcache )
-            cfp     = str(self.realcache[i])
-            ret_id  = str(self.idcache[i])
+            i = self.aliascache.draw()
+            return self.cached_point(i), self.pointcache.ids[i]
 
-            return cfp, ret_id
-
-        # fastest: use point from cache dict
-        elif mode == 'last_interface_complete' and self.realcachelambda == the_lambda:
+        # fastest: use point from cache
+        elif mode == 'last_interface_complete' and self.pointcache.the_lambda == the_lambda:
             #print("using cache")
-            i = weighted_choice(self.weightcache )
-            return self.realcache[i],  self.idcache[i]
+            i = self.aliascache.draw()
+            return self.cached_point(i), self.pointcache.ids[i]
         else:
             print("Something went wrong while choosing point.")
             return "",""
@@ -463,28 +719,64 @@ class configpoints:
             retpoints_ids = {}
             self.cur.execute('select myid,configpoint from configpoints where deactivated = 0 and success = 1 and lambda = ?',[the_lambda])
             for row in self.cur:
-                retpoints_ids[row[0]]=str(row[1])
+                retpoints_ids[row[0]]=point_codec.stored(row[1])
             selptid = random.choice(retpoints_ids.keys())
-            return retpoints_ids[selptid], selptid
+            return self.load_point(selptid, retpoints_ids[selptid]), selptid
         # last interface is complete but no cache has been built yet
-        elif mode == 'last_interface_complete' and self.realcachelambda != the_lambda:
+        elif mode == 'last_interface_complete' and self.pointcache.the_lambda != the_lambda:
             #print("refresh cache")
-            self.realcache = {}
-            self.cur.execute('select myid,configpoint from configpoints where deactivated = 0 and success = 1 and lambda = ?',[the_lambda])
-            for row in self.cur:
-                self.realcache[row[0]]=str(row[1])
-            self.realcachelambda = the_lambda
-            selptid = random.choice(self.realcache.keys())
-            return self.realcache[selptid], selptid
-        # fastest: use point from cache dict
-        elif mode == 'last_interface_complete' and self.realcachelambda == the_lambda:
+            self.switch_pointcache(the_lambda)
+            i = random.randrange(len(self.pointcache))
+            return self.cached_point(i), self.pointcache.ids[i]
+        # fastest: use point from cache
+        elif mode == 'last_interface_complete' and self.pointcache.the_lambda == the_lambda:
             #print("using cache")
-            selptid = random.choice(self.realcache.keys())
-            return self.realcache[selptid], selptid
+            i = random.randrange(len(self.pointcache))
+            return self.cached_point(i), self.pointcache.ids[i]
         else:
             print("Something went wrong while choosing point.")
             return "",""
 
+    # interface cache from a query of myid, rowid (and weight, appended to weights)
+    def read_pointcache(self, the_lambda, weights=None):
+        cache = point_cache.interface_cache(the_lambda)
+        for row in self.cur:
+            cache.append(str(row[0]), int(row[1]))
+            if weights is not None:
+                weights.append(float(row[2]))
+        return cache
+
+    # use the_lambda for new jobs. If its cache was grown while it was sampled,
+    # this is a swap. The next interface gets a growing cache.
+    def switch_pointcache(self, the_lambda):
+        if self.growingcache is not None and self.growingcache.the_lambda == the_lambda:
+            self.pointcache = self.growingcache
+        else:
+            self.cur.execute('select myid,rowid from configpoints where deactivated = 0 and success = 1 and lambda = ?',[the_lambda])
+            self.pointcache = self.read_pointcache(the_lambda)
+        self.pointlru.clear()
+
+        # few points are on the next interface yet, later ones are added by add_point
+        self.sync()
+        self.cur.execute('select myid,rowid from configpoints where deactivated = 0 and success = 1 and lambda = ?',[the_lambda + 1])
+        self.growingcache = self.read_pointcache(the_lambda + 1)
+
+    # point i of the interface cache, loaded through the LRU cache
+    def cached_point(self, i):
+        myid  = self.pointcache.ids[i]
+        point = self.pointlru.get(myid)
+        if point is None:
+            rowid = self.pointcache.rowids[i]
+            if rowid >= 0:
+                self.cur.execute('select configpoint from configpoints where rowid = ?', [rowid])
+            else:
+                # added by add_point, with a writer thread it may not be visible yet
+                self.sync()
+                self.cur.execute('select configpoint from configpoints where myid = ?', [myid])
+            point = self.load_point(myid, point_codec.stored(self.cur.fetchone()[0]))
+            self.pointlru.put(myid, point)
+        return point
+
     # Return a config point based on its unique id.
     def return_point_by_id(self, rp_id):
         #print rp_id
@@ -501,7 +793,16 @@ class configpoints:
             print(e)
             print("rp_id was", rp_id)
 
-        return str(r[0])
+        return self.load_point(rp_id, point_codec.stored(r[0]))
+
+    # point of a line, in split layout it is loaded from the payloads table
+    def load_point(self, myid, point):
+        if self.split_payloads and len(point) == 0:
+            self.cur.execute('select configpoint from payloads where myid = ?', [myid])
+            r = self.cur.fetchone()
+            if r is not None:
+                return point_codec.stored(r[0])
+        return point
 
     def return_escape_point_by_id(self, pt_id):
         # Return all collected configpoints and ids and rcval from interface
@@ -510,7 +811,7 @@ class configpoints:
         retid = ''
         retrc = 0.0
         for row in self.cur:
-            retconfig = ast.literal_eval(str(row[0]))
+            retconfig = point_codec.decode(self.load_point(pt_id, point_codec.stored(row[0])))
             retid = str(row[1])
             retrc = float(row[2])
         if retid == '':
@@ -531,40 +832,28 @@ class configpoints:
         else:
             return 0
 
+    # Unused ghost lines (usecount 0, active) by origin point, as queues of myids.
+    # Read from the database on first use, kept up to date by add_point and
+    # update_usecount_by_myid, so looking up ghost results needs no query.
+    def ghost_index(self):
+        if self.ghostlines is None:
+            self.sync()
+            self.ghostlines = {}
+            self.cur.execute('select myid, origin_point from configpoints where deactivated = 0 and usecount = 0 order by rowid')
+            for row in self.cur:
+                self.ghostlines.setdefault(str(row[1]), deque()).append(str(row[0]))
+        return self.ghostlines
+
+    def drop_ghost_line(self, origin, myid):
+        queue = self.ghostlines.get(origin)
+        if queue and myid in queue:
+            queue.remove(myid)
+            if len(queue) == 0:
+                del self.ghostlines[origin]
+
     # Check if origin point is in database
     def origin_point_in_database_and_active(self, the_point, no_ghosts_running = False):
-        if the_point in self.noghostonpoint:
-            return False
-        if len(self.usecountqueue) > 0:
-            self.commit()
-        #print("ghost database lookup")
-        self.cur.execute('select count(origin_point) from configpoints where deactivated = 0 and usecount = 0 and origin_point = ?', [str(the_point)])
-        for row in self.cur:
-            occurrence = int(row[0])
-        if occurrence >= 1:
-            # "Origin point is in database"
-            return True
-        else:
-            # "No active origin point in database"
-            # append the point only, if no ghosts are running and collecting ghost points!
-            if no_ghosts_running and (the_point not in self.noghostonpoint):
-                #print("no ghost on point", the_point, "adding to cache. Cache entries:", len(self.noghostonpoint))
-                self.noghostonpoint.append(the_point)
-            return False
-
-    def build_ghost_exclude_cache(self,lam,pts):
-        if len(self.usecountqueue) > 0:
-            self.commit()
-        #print("Building ghost exclude cache.")
-        # get all points where unused ghosts exist
-        self.cur.execute('select origin_point from configpoints where deactivated = 0 and usecount = 0 and lambda = ?', [lam])
-        # remove them from list of all points
-        for row in self.cur:
-            pt = str(row[0])
-            if pt in pts:
-                pts.remove(pt)
-        self.noghostonpoint = pts[:]
-        #print("'No ghost' - cache entries:", len(self.noghostonpoint))
+        return len(self.ghost_index().get(str(the_point), ())) > 0
 
     def return_usecount(self, the_point):
         # Commit all changes because usecount can be in queue
@@ -636,6 +925,23 @@ class configpoints:
             retval = int(row[0])
         return retval
 
+    # Return number of runs performed on each origin point, for the runs stored on interface ilambda
+    def return_runs_on_points(self, ilambda):
+        self.sync()
+        self.cur.execute("select origin_point, count(*) from configpoints where lambda = ? group by origin_point", [ilambda])
+        retval = {}
+        for row in self.cur:
+            retval[str(row[0])] = int(row[1])
+        return retval
+
+    # Return the rowid of the last line, 0 for an empty database
+    def return_last_rowid(self):
+        self.cur.execute('select max(rowid) from configpoints')
+        lastrow = self.cur.fetchone()[0]
+        if lastrow is None:
+            return 0
+        return int(lastrow)
+
     # Return the biggest lambda in database
     def biggest_lambda(self):
         #self.cur.execute('select lambda from configpoints order by lambda desc limit 1')
@@ -658,19 +964,31 @@ class configpoints:
         return float(lam)
 
     # Return complete database line where origin_point matches (for copying the ghost-line to real world)
+    # The line stays in the ghost index until the caller has used it (update_usecount_by_myid)
     def get_line_origin_point(self, point):
-        if len(self.usecountqueue) > 0:
-            self.commit()
 #        retval = (interface, str(newpoint), str(originpoint), calcsteps, ctime, runtime, success, runcount, pointid, seed, 0, 0.0)
         retval = ()
-        self.cur.execute("select * from configpoints where origin_point = ? and usecount = 0 and deactivated = 0 limit 1", [str(point)])
+        queue = self.ghost_index().get(str(point))
+        if not queue:
+            return retval
+        myid = queue[0]
+        self.cur.execute("select * from " + self.full_table + " where myid = ?", [myid])
         for row in self.cur:
             retval = row
+        if len(retval) == 0 and self.writer is not None:
+            # not written by the writer thread yet
+            self.sync()
+            self.cur.execute("select * from " + self.full_table + " where myid = ?", [myid])
+            for row in self.cur:
+                retval = row
+        if len(retval) == 0:
+            # the line is gone, do not offer it again
+            self.drop_ghost_line(str(point), myid)
         return retval
 
 
     def get_line_via_myid(self,myid):
-        self.cur.execute('select * from configpoints where myid = ?', [myid])
+        self.cur.execute('select * from ' + self.full_table + ' where myid = ?', [myid])
         retval = ''
         for row in self.cur:
             retval = row[:]
@@ -678,10 +996,10 @@ class configpoints:
 
     # Return all collected configpoints from interface
     def return_configpoints(self, interface):
-        self.cur.execute('select configpoint from configpoints where lambda = ? and deactivated = 0 and success = 1', [interface])
+        self.cur.execute('select configpoint from ' + self.full_table + ' where lambda = ? and deactivated = 0 and success = 1', [interface])
         retval = []
         for row in self.cur:
-            retval.append(ast.literal_eval(str(row[0])))
+            retval.append(point_codec.decode(row[0]))
         return retval
 
     # Return all collected configpoints ids from interface
@@ -694,22 +1012,22 @@ class configpoints:
 
     # Return all collected configpoints and ids from interface
     def return_configpoints_and_ids(self, interface):
-        self.cur.execute('select configpoint, myid from configpoints where lambda = ? and deactivated = 0 and success = 1', [interface])
+        self.cur.execute('select configpoint, myid from ' + self.full_table + ' where lambda = ? and deactivated = 0 and success = 1', [interface])
         retconfigs = []
         retids = []
         for row in self.cur:
-            retconfigs.append(ast.literal_eval(str(row[0])))
+            retconfigs.append(point_codec.decode(row[0]))
             retids.append(str(row[1]))
         return retconfigs, retids
 
     # Return all collected configpoints and ids and rcval from interface
     def return_configpoints_and_ids_and_rcval(self, interface):
-        self.cur.execute('select configpoint, myid, rcval from configpoints where lambda = ? and deactivated = 0 and success = 1', [interface])
+        self.cur.execute('select configpoint, myid, rcval from ' + self.full_table + ' where lambda = ? and deactivated = 0 and success = 1', [interface])
         retconfigs = []
         retids = []
         retrcs = []
         for row in self.cur:
-            retconfigs.append(ast.literal_eval(str(row[0])))
+            retconfigs.append(point_codec.decode(row[0]))
             retids.append(str(row[1]))
             retrcs.append(float(row[2]))
         return retconfigs, retids, retrcs
@@ -719,6 +1037,58 @@ class configpoints:
         self.cur.execute("update configpoints set ctime=ctime+? where myid = ?", [str(ctime), str(point_id)])
         self.cur.execute("update configpoints set calcsteps=calcsteps+? where myid = ?", [str(calcsteps), str(point_id)])
 
+    # Open traces of the parallel escape run: the successful points at lambda 0
+    # which are not the origin of another point. Returns a dict myid -> calcsteps
+    # summed up along the origins, built in one pass over the table.
+    def return_escape_traces(self):
+        self.cur.execute('select myid, origin_point, calcsteps, lambda, deactivated, success from configpoints order by rowid')
+        origin_of = {}
+        steps_of  = {}
+        is_origin = set()
+        ends      = []
+        for row in self.cur:
+            myid = str(row[0])
+            origin_of[myid] = str(row[1])
+            steps_of[myid]  = int(row[2] or 0)
+            is_origin.add(str(row[1]))
+            if row[3] == 0 and row[4] == 0 and row[5] == 1:
+                ends.append(myid)
+
+        # steps up to and including a point, shared by traces with common origins
+        total  = {}
+        traces = {}
+        for pt in ends:
+            if pt in is_origin:
+                continue
+            chain = []
+            pt_id = pt
+            while pt_id in origin_of and pt_id not in total and pt_id not in chain:
+                chain.append(pt_id)
+                pt_id = origin_of[pt_id]
+            steps = total.get(pt_id, 0)
+            for pt_id in reversed(chain):
+                steps += steps_of[pt_id]
+                total[pt_id] = steps
+            traces[pt] = total[pt]
+        return traces
+
+    # persisted escape traces, written in the same transactions as the points
+    def save_escape_trace(self, trace):
+        self.cur.execute('delete from escape_trace')
+        self.cur.executemany('insert into escape_trace values (?,?)', [ (str(pt), int(steps)) for pt, steps in trace.iteritems() ])
+
+    # None if the saved traces do not match the points in the database
+    def load_escape_trace(self):
+        self.sync()
+        self.cur.execute('select count(*) from escape_trace where myid in (select origin_point from configpoints) or myid not in (select myid from configpoints)')
+        if int(self.cur.fetchone()[0]) > 0:
+            return None
+        self.cur.execute('select myid, calcsteps from escape_trace')
+        trace = {}
+        for row in self.cur:
+            trace[str(row[0])] = int(row[1])
+        return trace
+
     # check, if id is somewhere in origin_point, meaning that point is part of a trace
     def id_in_origin(self, pt):
         occurrence = 0
@@ -774,7 +1144,12 @@ class configpoints:
 
 
     def update_usecount(self,origin_point):
-        self.cur.execute("update configpoints set usecount=usecount+1 where configpoint = ?", [str(origin_point)])
+        point = point_codec.encode(origin_point, self.point_format)
+        if self.split_payloads:
+            self.cur.execute("update configpoints set usecount=usecount+1 where configpoint = ? or myid in (select myid from payloads where configpoint = ?)", [point, point])
+        else:
+            self.cur.execute("update configpoints set usecount=usecount+1 where configpoint = ?", [point])
+        self.sync()
 
 
 
@@ -789,6 +1164,11 @@ class configpoints:
 
     def update_usecount_by_myid(self,myid):
         self.cur.execute("update configpoints set usecount=usecount+1 where myid = ?", [str(myid)])
+        # a used line is no ghost result any more
+        if self.ghostlines is not None:
+            self.cur.execute("select origin_point from configpoints where myid = ?", [str(myid)])
+            for row in self.cur.fetchall():
+                self.drop_ghost_line(str(row[0]), str(myid))
 
     def return_origin_ids(self,ilambda,success=1):
         self.cur.execute('select origin_point from configpoints where lambda = ? and deactivated = 0 and success = ?', [ilambda,success])
@@ -852,85 +1232,42 @@ class configpoints:
         return newids
 
     def return_id(self,point):
-        self.cur.execute('select myid from configpoints where configpoint = ?', [str(point)])
+        self.cur.execute('select myid from ' + self.full_table + ' where configpoint = ?', [point_codec.encode(point, self.point_format)])
         retval = ''
         for row in self.cur:
             retval = str(row[0])
         return retval
 
 
-    # ghost point helper function. Selects efficiently (hopefully) a good starting point for a ghost
-    def ghost_point_helper(self, allpoints, mode='default'):
-        candidates = allpoints[:]
-        countdict = {}
-
-        # "Obtaining number of runs from", len(candidates), "points"
-        for candidate in candidates[::-1]:
-            # check if point is beeing calculated at the moment
-            if candidate in self.server.ghost_clients.values():
-                # candidate, "is calculated at the moment"
-                candidates.remove(candidate)
-                continue
-
-            if mode == 'default' and candidate in self.ghostcache:
-                # candidate, "is in ghost cache"
-                candidates.remove(candidate)
-                continue
-
-            rop = self.server.ghostpoints.runs_on_point(candidate)
-             #print candidate, rop
-            # break if point with 0 runs is obtained. Then this point can be used in any case
-            countdict[str(candidate)] = rop
-            # this is at a count of 0 for the first runs... then the point is taken immediately
-            if rop <= self.ghostlastcount:
-                # "Found", candidate, "with", rop, "runs on point"
-                break
-
-            self.ghostcache.append(candidate)
-
-        if len(candidates) == 0 and not mode == 'retry':
-            self.ghostcache = []
-            self.ghostlastcount += 1
-            # "retrying with emptied ghost cache and new count number", self.ghostlastcount
-            candidates, countdict = self.ghost_point_helper(allpoints, 'retry')
-
-        return candidates, countdict
-
-
-    # Select ghost point for calculation
+    # Select ghost point for calculation: the point of the interface with the
+    # fewest ghost runs which no ghost client is calculating at the moment
     def select_ghost_point(self, interface):
 
-        # helper variables which are reset for each interface
-        if self.ghostlastlam != interface:
-            # "Resetting ghost variables for new interface"
-            self.ghostcache = []
-            self.ghostlastcount = 0
-            self.ghostlastlam = interface
-
-        # get configpoints on current interface
-        allpoints = self.return_configpoints_ids(interface)
+        # ghost run counts, built once per interface and kept up to date by
+        # add_point and count_ghost_run
+        if self.ghostheap is None or self.ghostheap.the_lambda != interface:
+            self.ghostheap = point_cache.run_count_heap(interface)
+            # ghost runs from this interface are stored on the next one
+            counts = self.server.ghostpoints.return_runs_on_points(interface + 1)
+            for point_id in self.return_configpoints_ids(interface):
+                self.ghostheap.add(point_id, counts.get(point_id, 0))
 
-        candidates, countdict = self.ghost_point_helper(allpoints, 'default')
+        point_id = self.ghostheap.least(self.server.is_ghost_point)
 
-        # "Got", len(candidates), "ghost candidates."
+        # last resort, if every point is calculated at the moment
+        if point_id is None:
+            point_id = self.ghostheap.random_point()
 
-        # last resort, if every point was sorted out before
-        if len(candidates) == 0:
-            gimmepoint = allpoints[random.randint(0,len(allpoints)-1)]
-            #print("No candidates left, using", gimmepoint)
-            gimmepoint_data = self.return_point_by_id(gimmepoint)
-            return gimmepoint_data, gimmepoint
+        return self.return_point_by_id(point_id), point_id
 
-        # "getting (one) point with lowest number"
-        point_id = min(countdict,key = lambda a: countdict.get(a))
-        #print point_id, "has the lowest number of points"
-        point_meta = self.return_point_by_id(point_id)
-        # "returning point meta information", point_meta
-        return point_meta, point_id
+    # a ghost run from origin_point was stored in the ghost database
+    def count_ghost_run(self, origin_point):
+        if self.ghostheap is not None:
+            self.ghostheap.increment(str(origin_point))
 
     # Return all entries corresponding to one interface
     def return_interface(self, interface):
-        self.cur.execute('select * from configpoints where lambda = ? and deactivated = 0', [interface])
+        self.cur.execute('select * from ' + self.full_table + ' where lambda = ? and deactivated = 0', [interface])
         retval = []
         for row in self.cur:
             retval.append(list(row))
@@ -938,7 +1275,7 @@ class configpoints:
 
     # Return all successful entries corresponding to one interface
     def return_interface_success(self, interface):
-        self.cur.execute('select * from configpoints where lambda = ? and deactivated = 0 and success = 1', [interface])
+        self.cur.execute('select * from ' + self.full_table + ' where lambda = ? and deactivated = 0 and success = 1', [interface])
         retval = []
         for row in self.cur:
             retval.append(list(row))
@@ -946,7 +1283,7 @@ class configpoints:
 
     # Return all entries corresponding to one interface including deactivated points
     def return_interface_all(self, interface):
-        self.cur.execute('select * from configpoints where lambda = ?', [interface])
+        self.cur.execute('select * from ' + self.full_table + ' where lambda = ?', [interface])
         retval = []
         for row in self.cur:
             retval.append(list(row))
@@ -957,7 +1294,7 @@ class configpoints:
         if len(self.usecountqueue) > 0:
             self.commit()
         retval = []
-        self.cur.execute('select * from configpoints where deactivated = 0 and success = 1 and usecount = 0')
+        self.cur.execute('select * from ' + self.full_table + ' where deactivated = 0 and success = 1 and usecount = 0')
         for row in self.cur:
             retval.append(list(row))
         return retval
@@ -1015,14 +1352,14 @@ class configpoints:
 
     def return_origin_point(self, the_point):
         origin_point = []
-        self.cur.execute('select * from configpoints where configpoint = ?', [str(the_point)])
+        self.cur.execute('select * from ' + self.full_table + ' where configpoint = ?', [point_codec.encode(the_point, self.point_format)])
         for row in self.cur:
             origin_point = row[:]
         return origin_point
 
     def return_origin_point_by_id(self, the_id):
         origin_point = []
-        self.cur.execute('select * from configpoints where myid = ?', [str(the_id)])
+        self.cur.execute('select * from ' + self.full_table + ' where myid = ?', [str(the_id)])
         for row in self.cur:
             origin_point = row[:]
         return origin_point
@@ -1036,28 +1373,28 @@ class configpoints:
 
     def return_dest_points_by_id(self, the_id):
         dest_points = []
-        self.cur.execute('select * from configpoints where origin_point = ?', [str(the_id)])
+        self.cur.execute('select * from ' + self.full_table + ' where origin_point = ?', [str(the_id)])
         for row in self.cur:
             dest_points.append(row[:])
         return dest_points
 
     def return_points_on_interface(self,interface):
         the_points = []
-        self.cur.execute('select * from configpoints where lambda = ? and deactivated = 0', [interface])
+        self.cur.execute('select * from ' + self.full_table + ' where lambda = ? and deactivated = 0', [interface])
         for row in self.cur:
             the_points.append(row)
         return the_points
 
     def return_points_on_last_interface(self):
         the_points = []
-        self.cur.execute('select * from configpoints where lambda = ? and deactivated = 0 and success = 1', [str(self.biggest_lambda())])
+        self.cur.execute('select * from ' + self.full_table + ' where lambda = ? and deactivated = 0 and success = 1', [str(self.biggest_lambda())])
         for row in self.cur:
             the_points.append(row)
         return the_points
 
     def return_points_on_last_interface_all(self):
         the_points = []
-        self.cur.execute('select * from configpoints where lambda = ? and deactivated = 0', [str(self.biggest_lambda())])
+        self.cur.execute('select * from ' + self.full_table + ' where lambda = ? and deactivated = 0', [str(self.biggest_lambda())])
         for row in self.cur:
             the_points.append(row)
         return the_points
@@ -1105,14 +1442,14 @@ class configpoints:
 
     def return_customdata(self,interface):
         cud = []
-        self.cur.execute('select customdata from configpoints where lambda = ? and deactivated = 0', [str(interface)])
+        self.cur.execute('select customdata from ' + self.full_table + ' where lambda = ? and deactivated = 0', [str(interface)])
         for row in self.cur:
             cud.append(row[0])
         return cud
 
     def return_customdata_by_id(self,ptid):
         cud = []
-        self.cur.execute('select customdata from configpoints where myid = ?', [ptid])
+        self.cur.execute('select customdata from ' + self.full_table + ' where myid = ?', [ptid])
         for row in self.cur:
             cud.append(row[0])
         return cud
@@ -1131,12 +1468,12 @@ class configpoints:
 
     # Show contents of table
     def show_table(self):
-        self.cur.execute('select * from configpoints')
+        self.cur.execute('select * from ' + self.full_table)
         for row in self.cur:
             print(row)
 
     def show_summary(self):
-        self.cur.execute('select * from configpoints')
+        self.cur.execute('select * from ' + self.full_table)
         tmp = -1
         countdict = {}
         for row in self.cur:
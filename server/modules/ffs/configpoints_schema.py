@@ -0,0 +1,70 @@
+# Schema versions of the configpoints databases. The version of a database is
+# kept in 'PRAGMA user_version', version 0 is the configpoints table with the
+# index on calcsteps only. When the server opens its own databases (also on
+# restart with -r timestamp), the missing steps are applied in order. Other
+# databases, e.g. of the analysis scripts or the forward run of a reverse
+# simulation, are opened as they are.
+
+SCHEMA_VERSION = 2
+
+MIGRATIONS = [
+    # 0 -> 1: indexes for the frequent queries
+    [
+        # return_nop, return_random_point, return_configpoints_ids, ...
+        'create index if not exists lambdaindex on configpoints ( lambda, deactivated, success )',
+        # return_point_by_id, update_usecount_by_myid, ...
+        'create index if not exists myidindex on configpoints ( myid )',
+        # origin_point_in_database_and_active, runs_on_point, id_in_origin, ...
+        'create index if not exists originindex on configpoints ( origin_point, deactivated, usecount )',
+    ],
+    # 1 -> 2: open traces of the parallel escape run, for resuming
+    [
+        'create table if not exists escape_trace (myid text primary key, calcsteps int)',
+    ],
+]
+
+def schema_version(con):
+    cur = con.cursor()
+    cur.execute('PRAGMA user_version')
+    return int(cur.fetchone()[0])
+
+# apply the missing migration steps, returns the version the database had before
+def migrate(con):
+    version = schema_version(con)
+    cur = con.cursor()
+    for step in range(version, SCHEMA_VERSION):
+        for statement in MIGRATIONS[step]:
+            cur.execute(statement)
+        cur.execute('PRAGMA user_version = %d' % (step + 1))
+        con.commit()
+
+    return version
+
+
+# Optional split layout (payload_table = yes in the server config). The
+# configpoint and customdata of new points go to the payloads table, their
+# line in configpoints only holds the metadata, with both columns empty. So
+# counting and metadata queries do not read the large payloads. The view
+# configpoints_full shows complete lines of both layouts.
+PAYLOAD_TABLES = [
+    'create table if not exists payloads (myid text primary key, configpoint blob, customdata text)',
+    '''create view if not exists configpoints_full as select
+         c.lambda as lambda, coalesce(p.configpoint, c.configpoint) as configpoint, c.origin_point as origin_point,
+         c.calcsteps as calcsteps, c.ctime as ctime, c.runtime as runtime, c.success as success,
+         c.runcount as runcount, c.myid as myid, c.seed as seed, c.lambda_old as lambda_old,
+         c.weight as weight, c.rcval as rcval, c.lpos as lpos, c.usecount as usecount,
+         c.deactivated as deactivated, c.uuid as uuid, coalesce(p.customdata, c.customdata) as customdata
+       from configpoints c left join payloads p on p.myid = c.myid''',
+]
+
+def has_payloads(con):
+    cur = con.cursor()
+    cur.execute("select count(*) from sqlite_master where type = 'table' and name = 'payloads'")
+    return int(cur.fetchone()[0]) > 0
+
+# switch to the split layout, lines written so far stay complete
+def create_payloads(con):
+    cur = con.cursor()
+    for statement in PAYLOAD_TABLES:
+        cur.execute(statement)
+    con.commit()
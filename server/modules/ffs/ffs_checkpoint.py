@@ -0,0 +1,33 @@
+# Checkpoint of the FFS scheduler state, for a fast resume with -r timestamp.
+#
+# The state is pickled to a temporary file which is then renamed, so the file
+# on disk is always a complete checkpoint. A checkpoint also records the last
+# rowids of the configpoints and ghost databases. On resume it is used only if
+# the databases still end at these rows, otherwise the state is derived from
+# the databases as before.
+
+import os
+import cPickle as pickle
+
+CHECKPOINT_VERSION = 1
+
+def write(filename, state):
+    state = dict(state)
+    state['version'] = CHECKPOINT_VERSION
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmpname, filename)
+
+# None if there is no readable checkpoint of this version
+def read(filename):
+    try:
+        with open(filename, 'rb') as f:
+            state = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+        return None
+    return state
@@ -34,6 +34,13 @@ import math
 import random
 
 import configpoints
+import ffs_checkpoint
+
+# state of the auto interface placement which is kept in the checkpoint
+AUTO_INTERFACE_STATE = ['exmode', 'arrived_in_B', 'restarts', 'loffset', 'ex_act_lambda', 'auto_mindist',
+                        'ex_launched', 'ex_success', 'ex_ctime', 'ex_returned', 'isset_lhigh', 'isset_llow',
+                        'last_placed', 'ex_deactivated', 'ex_priority', 'ex_ghost_cand', 'max_lams',
+                        'ex_lambdas', 'ex_lambda', 'ex_placed_index']
 
 
 # -------------------------------------------------------------------------------------------------
@@ -63,6 +70,7 @@ class ffs_sampling_control():
         self.escape_exclude = []
         # for keeping the current trace in cache
         self.escape_trace = {}
+        self.escape_trace_loaded = False
 
         # If there's no point in the escape trace, save the ctime and store it with the next point
         self.ctime_pending = 0.0
@@ -78,6 +86,8 @@ class ffs_sampling_control():
         # dict for counting the escape skip per client
         self.escape_skip_count = {}
 
+        self.last_checkpoint = time.time()
+
 # -------------------------------------------------------------------------------------------------
 
     def option_in_configile(self,option):
@@ -123,6 +133,11 @@ class ffs_sampling_control():
             self.min_success = ss.configfile.getint('ffs_control', 'min_success')
         else:
             self.min_success = 2
+        # number of jobs a client gets in advance, 1 = no prefetching
+        if self.option_in_configile('prefetch_jobs'):
+            self.prefetch_jobs = ss.configfile.getint('ffs_control', 'prefetch_jobs')
+        else:
+            self.prefetch_jobs = 1
         if self.option_in_configile('continue_simulation'):
             self.continue_simulation = ss.configfile.getint('ffs_control', 'continue_simulation')
         else:
@@ -178,6 +193,10 @@ class ffs_sampling_control():
             self.min_origin_increase_count = ss.configfile.getint('ffs_control', 'min_origin_increase_count')
         else:
             self.min_origin_increase_count = 2
+        if self.option_in_configile('checkpoint_interval'):
+            self.checkpoint_interval = ss.configfile.getint('ffs_control', 'checkpoint_interval')
+        else:
+            self.checkpoint_interval = 300
 
 
 
@@ -320,12 +339,6 @@ class ffs_sampling_control():
             if ss.storepoints.return_nop(ss.act_lambda) >= ss.M_0_runs[ss.act_lambda]:
                 self.change_interface()
 
-            try:
-                pts = ss.storepoints.return_configpoints_ids(ss.act_lambda-1)
-                ss.ghostpoints.build_ghost_exclude_cache(ss.act_lambda,pts)
-            except Exception as e:
-                ss.logger_freshs.error(cc.c_red + __name__ + 'Error!: '+str(e) + cc.reset)
-
             ss.logger_freshs.info(cc.c_green + 'Current interface index: ' + str(ss.act_lambda) + cc.reset)
 
         #if self.parallel_escape and ss.act_lambda == 0:
@@ -334,6 +347,147 @@ class ffs_sampling_control():
         #    exclude_num = len(self.escape_exclude)
         #    ss.logger_freshs.info(cc.c_green + 'Populating escape candidate exclude list done. ' + str(points_left) + ' points have residual steps. ' + str(exclude_num) + ' points are ready.' + cc.reset)
 
+# -------------------------------------------------------------------------------------------------
+
+    def checkpoint_file(self):
+        ss = self.server
+        return ss.folder_db + ss.timestamp + '_checkpoint.pickle'
+
+    # Save the scheduler state. Runs in flight are not counted, as if their
+    # clients had disconnected, because their results are lost on a restart.
+    def write_checkpoint(self):
+        ss = self.server
+
+        if self.checkpoint_interval <= 0:
+            return
+
+        # the recorded rowids have to match the committed points
+        ss.storepoints.commit()
+        ss.ghostpoints.commit()
+        ss.storepoints.sync()
+        ss.ghostpoints.sync()
+
+        run_count = ss.run_count[:]
+        M_0 = ss.M_0[:]
+        ai_state = {}
+        for name in AUTO_INTERFACE_STATE:
+            if hasattr(ss.ai, name):
+                ai_state[name] = getattr(ss.ai, name)
+        if 'ex_launched' in ai_state:
+            ai_state['ex_launched'] = ai_state['ex_launched'][:]
+
+        for client in ss.clients:
+            if client in ss.explorer_clients:
+                if ss.ai.auto_histo:
+                    ai_state['ex_launched'][0] -= 1
+                else:
+                    ex_ind = ss.ai.cemlti( ss.explorer_clients[client] )
+                    if ex_ind < len(ai_state['ex_launched']) and ai_state['ex_launched'][ex_ind] > 0:
+                        ai_state['ex_launched'][ex_ind] -= 1
+            elif ss.is_active(client):
+                ss.refund_unfinished_jobs(client, run_count, M_0)
+
+        state = {
+            'rowids':            [ss.storepoints.return_last_rowid(), ss.ghostpoints.return_last_rowid()],
+            'act_lambda':        ss.act_lambda,
+            'lambdas':           ss.lambdas,
+            'noi':               ss.noi,
+            'run_count':         run_count,
+            'M_0':               M_0,
+            'M_0_runs':          ss.M_0_runs,
+            'ctime':             ss.ctime,
+            'k_AB_part1':        ss.k_AB_part1,
+            'ghosttimesave':     ss.ghosttimesave,
+            'ghostcalcsave':     ss.ghostcalcsave,
+            'mean_of_calcsteps': ss.ghosts.mean_of_calcsteps,
+            'escape_trace':      self.escape_trace,
+            'ctime_pending':     self.ctime_pending,
+            'calcsteps_pending': self.calcsteps_pending,
+            'last_added_point':  self.last_added_point,
+            'dorigins':          [self.dorigins, self.dorigins_last, self.dorigins_count],
+            'auto_interfaces':   ai_state,
+            'rng':               random.getstate(),
+        }
+
+        try:
+            ffs_checkpoint.write(self.checkpoint_file(), state)
+        except Exception as e:
+            ss.logger_freshs.warn(cc.c_red + 'Could not write checkpoint: ' + str(e) + cc.reset)
+        self.last_checkpoint = time.time()
+
+    def checkpoint_if_due(self):
+        if self.checkpoint_interval > 0 and time.time() - self.last_checkpoint >= self.checkpoint_interval:
+            self.write_checkpoint()
+
+    # Restore the scheduler state from the checkpoint. Returns False if there
+    # is none, if points were stored after it was written or if its interfaces
+    # do not fit the database and the configuration.
+    def load_checkpoint(self):
+        ss = self.server
+
+        state = ffs_checkpoint.read(self.checkpoint_file())
+        if state is None:
+            ss.logger_freshs.info(cc.c_magenta + 'No checkpoint found, reading state from database.' + cc.reset)
+            return False
+
+        rowids = [ss.storepoints.return_last_rowid(), ss.ghostpoints.return_last_rowid()]
+        if state['rowids'] != rowids:
+            ss.logger_freshs.info(cc.c_magenta + 'Checkpoint is older than the database, reading state from database.' + cc.reset)
+            return False
+
+        # the interfaces of the checkpoint have to fit the database and the configuration
+        lambdas = state['lambdas']
+        fits = len(state['run_count']) == len(lambdas) and len(state['M_0']) == len(lambdas) and \
+               state['act_lambda'] < len(lambdas) and ss.storepoints.biggest_lambda() <= state['act_lambda']
+        if fits and ss.auto_interfaces:
+            lamlist = ss.storepoints.return_lamlist()
+            fits = lambdas[:len(lamlist)] == lamlist
+        elif fits:
+            keep = ss.lambdas
+            ss.lambdas = keep[:]
+            self.fill_lambdas()
+            fits = ss.lambdas == lambdas
+            ss.lambdas = keep
+        if not fits:
+            ss.logger_freshs.warn(cc.c_red + 'Interfaces of the checkpoint do not fit the database or the configuration, ' + \
+                                  'reading state from database.' + cc.reset)
+            return False
+
+        ss.act_lambda    = state['act_lambda']
+        ss.lambdas       = state['lambdas']
+        ss.noi           = state['noi']
+        ss.run_count     = state['run_count']
+        ss.M_0           = state['M_0']
+        ss.M_0_runs      = state['M_0_runs']
+        ss.ctime         = state['ctime']
+        ss.k_AB_part1    = state['k_AB_part1']
+        ss.ghosttimesave = state['ghosttimesave']
+        ss.ghostcalcsave = state['ghostcalcsave']
+        ss.ghosts.mean_of_calcsteps = state['mean_of_calcsteps']
+
+        self.escape_trace        = state['escape_trace']
+        self.escape_trace_loaded = True
+        self.ctime_pending       = state['ctime_pending']
+        self.calcsteps_pending   = state['calcsteps_pending']
+        self.last_added_point    = state['last_added_point']
+        self.dorigins, self.dorigins_last, self.dorigins_count = state['dorigins']
+
+        for name in state['auto_interfaces']:
+            setattr(ss.ai, name, state['auto_interfaces'][name])
+
+        random.setstate(state['rng'])
+
+        ss.logger_freshs.info(cc.c_magenta + 'Resumed from checkpoint at interface ' + str(ss.act_lambda) + \
+                              ', lambdas are ' + str(ss.lambdas) + cc.reset)
+        ss.logger_freshs.debug(cc.c_magenta + 'Runcount: ' + str(ss.run_count) + cc.reset)
+        ss.logger_freshs.debug(cc.c_magenta + 'M_0: ' + str(ss.M_0) + cc.reset)
+
+        # check if calculation is ready
+        if ss.lambdas[ss.act_lambda] >= ss.B and ss.run_count[ss.act_lambda] >= ss.M_0_runs[ss.act_lambda]:
+            ss.end_simulation()
+
+        return True
+
 # -------------------------------------------------------------------------------------------------
 
     def launch_jobs(self):
@@ -373,7 +527,8 @@ class ffs_sampling_control():
                 ss.ai.exmode_on()
 
         elif ss.dbload:
-            self.load_from_db()
+            if not self.load_checkpoint():
+                self.load_from_db()
         else:
             ss.run_count.append(0)
             ss.M_0.append(0)
@@ -448,13 +603,6 @@ class ffs_sampling_control():
         ss.logger_freshs.info(cc.c_magenta + __name__ +" "+\
                                str(used_points) + " shots attempted from interface "+ str(ss.act_lambda-1) + cc.reset)
         
-
-        try:
-            ss.ghostpoints.noghostonpoint = []
-            pts = ss.storepoints.return_configpoints_ids(ss.act_lambda-1)
-            ss.ghostpoints.build_ghost_exclude_cache(ss.act_lambda,pts)
-        except Exception as e:
-            ss.logger_freshs.error(cc.c_red + __name__ + 'Error!: '+str(e) + cc.reset)
         self.print_lambar('AB')
         ss.M_0.append(0)
         ss.run_count.append(0)
@@ -477,20 +625,18 @@ class ffs_sampling_control():
         cand_pts = []
         max_steps_pts = []
 
-        # get list of escape point rp_ids
-        if ss.dbload and len(self.escape_trace) == 0:
-            ss.logger_freshs.debug(cc.c_magenta + 'Retrieving point IDs.' + cc.reset)
-            esc_pts_ids = ss.storepoints.return_configpoints_ids(0)
-            ss.logger_freshs.debug(cc.c_magenta + 'Removing points already in a trace' + cc.reset)
-            for pt in esc_pts_ids[::-1]:
-                # remove points which are origins from other points
-                if ss.storepoints.id_in_origin(pt):
-                    ss.logger_freshs.debug(cc.c_magenta + "Point " + pt + " is origin of another point, found existing trace! Removing." + cc.reset)
-                    esc_pts_ids.remove(pt)
-                    #self.escape_exclude.append(pt)
+        # get the open traces from the database once on resume
+        if ss.dbload and not self.escape_trace_loaded:
+            self.escape_trace_loaded = True
+            trace = ss.storepoints.load_escape_trace()
+            if trace is None or len(trace) == 0:
+                ss.logger_freshs.info(cc.c_green + 'Tracking back escape runs in database.' + cc.reset)
+                trace = ss.storepoints.return_escape_traces()
+            else:
+                ss.logger_freshs.info(cc.c_green + 'Using saved escape traces.' + cc.reset)
+            self.escape_trace.update(trace)
 
-        else:
-            esc_pts_ids = self.escape_trace.keys()
+        esc_pts_ids = self.escape_trace.keys()
 
         ss.logger_freshs.debug(cc.c_magenta + "Candidate points for escape resume: " + str(esc_pts_ids) + cc.reset)
 
@@ -569,7 +715,7 @@ class ffs_sampling_control():
         if self.require_runs:
             ncheck = ss.storepoints.return_nop(ilam)
         else:
-            ncheck = ss.run_count[ilam] - ss.active_clients() + 1
+            ncheck = ss.run_count[ilam] - ss.active_jobs() + 1
 
         ss.logger_freshs.debug(cc.c_magenta + 'run_count: ' + str(ss.run_count) + cc.reset)
         ss.logger_freshs.debug(cc.c_magenta + 'M_0_runs: ' + str(ss.M_0_runs) + cc.reset)
@@ -799,6 +945,8 @@ class ffs_sampling_control():
                 if self.escape_trace.has_key(origin_point):
                     self.escape_trace.pop(origin_point)
 
+            ss.storepoints.save_escape_trace(self.escape_trace)
+
             ss.logger_freshs.info(cc.c_magenta + 'Escape trace overview:' + str(self.escape_trace) + cc.reset)
         except Exception as e:
             ss.logger_freshs.warn(cc.c_red + 'Building escape trace cache failed: ' + str(e) + cc.reset)
@@ -813,17 +961,19 @@ class ffs_sampling_control():
 
         ss.logger_freshs.debug(cc.c_magenta + __name__ + ': parse_message' + cc.reset)
 
-        if "\"success\": True" in data:
+        if ddata.get('success') == True:
             ss.logger_freshs.debug(cc.c_blue + client.name + ' was successful.' + cc.reset)
             self.analyze_job_success(client, ddata, runid)
 
-        elif "\"success\": False" in data:
+        elif ddata.get('success') == False:
             ss.logger_freshs.debug(cc.c_blue + client.name + ' was not successful.' + cc.reset)
             self.analyze_job_nosuccess(client, ddata, runid)
 
-        elif "\"omit\": True" in data:
+        elif ddata.get('omit') == True:
             ss.logger_freshs.info(cc.c_magenta + client.name + ' requested to omit data.' + cc.reset)
 
+        self.checkpoint_if_due()
+
 
 # -------------------------------------------------------------------------------------------------
 # Analyze job success
@@ -1132,6 +1282,9 @@ class ffs_sampling_control():
         # commit data in database
         ss.storepoints.commit()
         ss.ghostpoints.commit()
+        # with a writer thread, wait until the data is visible
+        ss.storepoints.sync()
+        ss.ghostpoints.sync()
 
         # get values from database
         lambda_max = ss.storepoints.biggest_lambda()
@@ -0,0 +1,109 @@
+# Caches for drawing job and ghost job points of an interface.
+
+import array
+import heapq
+import random
+from collections import OrderedDict
+
+
+#### POINTS OF ONE INTERFACE ####
+# ids and rowids of the points in parallel arrays, so a point is drawn by its
+# index in O(1). The points themselves are loaded from the database when drawn.
+class interface_cache():
+    def __init__(self, the_lambda):
+        self.the_lambda = the_lambda
+        self.ids        = []
+        self.rowids     = array.array('l')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, myid, rowid):
+        self.ids.append(myid)
+        self.rowids.append(rowid)
+
+
+#### LEAST RECENTLY USED CACHE OF LIMITED SIZE ####
+class lru_cache():
+    def __init__(self, size):
+        self.size  = size
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    # None if not cached
+    def get(self, key):
+        value = self.items.pop(key, None)
+        if value is not None:
+            self.items[key] = value
+        return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        self.items.pop(key, None)
+        self.items[key] = value
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+
+#### NUMBER OF GHOST RUNS ON THE POINTS OF ONE INTERFACE ####
+# Min-heap of (runs, -index, point). A point whose count changed is pushed
+# again, the outdated entry is dropped when it comes to the top. Among points
+# with the same count, the newest comes first.
+class run_count_heap():
+    def __init__(self, the_lambda):
+        self.the_lambda = the_lambda
+        self.counts     = {}
+        self.index      = {}
+        self.points     = []
+        self.heap       = []
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, point, count=0):
+        if point in self.counts:
+            return
+        self.counts[point] = count
+        self.index[point]  = len(self.points)
+        self.points.append(point)
+        self.push(point)
+
+    # points which are not on this interface are ignored
+    def increment(self, point):
+        if point not in self.counts:
+            return
+        self.counts[point] += 1
+        self.push(point)
+
+    def push(self, point):
+        heapq.heappush(self.heap, (self.counts[point], -self.index[point], point))
+        # drop outdated entries when there are too many
+        if len(self.heap) > 2 * len(self.points) + 1000:
+            self.heap = [ (self.counts[p], -i, p) for i, p in enumerate(self.points) ]
+            heapq.heapify(self.heap)
+
+    # point with the fewest runs for which busy(point) is false, None if there is none
+    def least(self, busy):
+        aside = []
+        found = None
+        while len(self.heap) > 0:
+            entry = heapq.heappop(self.heap)
+            count, index, point = entry
+            if count != self.counts[point]:
+                continue
+            aside.append(entry)
+            if not busy(point):
+                found = point
+                break
+        for entry in aside:
+            heapq.heappush(self.heap, entry)
+        return found
+
+    def random_point(self):
+        return self.points[random.randrange(len(self.points))]
@@ -0,0 +1,109 @@
+# Storage formats of configuration points in the configpoint column.
+#
+#   text:     python literal of the point, str(point)
+#   float64,
+#   float32:  BLOB of a header and the raw little endian data. The header is
+#             'FPT1', the array type code ('d' or 'f'), the number of
+#             dimensions (1 byte) and the shape (4 bytes each, network order).
+#
+# Only rectangular (nested) lists of floats are stored binary, everything else
+# is stored as text. Rows are read in every format, so databases with text rows
+# can be continued with a binary format.
+
+import os
+import array
+import struct
+import sys
+import ast
+import sqlite3
+
+# the nested list helpers are shared with the wire protocol
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/..')
+from wire_protocol import array_shape, _flatten, _unflatten
+
+FORMATS = ['text', 'float64', 'float32']
+
+TYPECODES = {'float64': 'd', 'float32': 'f'}
+
+MAGIC  = 'FPT1'
+HEADER = struct.Struct('!4scB')
+DIM    = struct.Struct('!I')
+
+_swap = sys.byteorder != 'little'
+
+
+# value for the configpoint column, strings are taken as text points
+def encode(point, fmt='text'):
+    if isinstance(point, basestring):
+        return point
+    if fmt in TYPECODES:
+        shape = array_shape(point)
+        if shape is not None:
+            flat = array.array(TYPECODES[fmt])
+            try:
+                _flatten(point, shape, 0, flat)
+            except ValueError:
+                return str(point)
+            if _swap:
+                flat.byteswap()
+            header = HEADER.pack(MAGIC, TYPECODES[fmt], len(shape)) + \
+                     ''.join([DIM.pack(s) for s in shape])
+            return sqlite3.Binary(header + flat.tostring())
+    return str(point)
+
+def is_binary(value):
+    return isinstance(value, (buffer, bytearray)) and str(value[:len(MAGIC)]) == MAGIC
+
+# point as read from the database: a packed_point for binary rows, text otherwise
+def stored(value):
+    if is_binary(value):
+        return packed_point(str(value))
+    return str(value)
+
+# point as python list
+def decode(value):
+    if isinstance(value, packed_point):
+        return value.tolist()
+    if is_binary(value):
+        return packed_point(str(value)).tolist()
+    return ast.literal_eval(str(value))
+
+
+#### POINT STORED IN A BINARY FORMAT ####
+# Kept packed until needed. str() gives the text format, so it can be put
+# into job strings like a text point.
+class packed_point():
+    def __init__(self, blob):
+        magic, typecode, ndim = HEADER.unpack_from(blob, 0)
+        self.blob     = blob
+        self.typecode = typecode
+        self.shape    = [ DIM.unpack_from(blob, HEADER.size + DIM.size * i)[0] for i in range(ndim) ]
+        self.offset   = HEADER.size + DIM.size * ndim
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def values(self):
+        flat = array.array(self.typecode)
+        flat.fromstring(self.blob[self.offset:])
+        if _swap:
+            flat.byteswap()
+        return flat
+
+    def tolist(self):
+        return _unflatten(self.values().tolist(), self.shape, 0, 0)
+
+    # raw little endian float64 data, float64 points are returned as stored
+    def float64(self):
+        if self.typecode == 'd':
+            return self.blob[self.offset:]
+        flat = array.array('d', self.values())
+        if _swap:
+            flat.byteswap()
+        return flat.tostring()
@@ -0,0 +1,203 @@
+# Storage interface of the FFS server: the methods the server, the client
+# handler, ghosting and the auto interface placement call on storepoints and
+# ghostpoints. configpoints (sqlite, the default) and segment_points
+# (append-only segment files, storage_backend = segments) implement it, a
+# backend which misses one of them cannot be instantiated.
+#
+# Lines have the columns of the configpoints table, points are returned as
+# stored (see point_codec.stored) unless noted otherwise.
+
+import abc
+
+BACKENDS = ['sqlite', 'segments']
+
+# open the storage of the configured backend, dbfile is the sqlite file name.
+# For the databases of the server, which are migrated to the current schema.
+def open_storage(server, dbfile):
+    try:
+        backend = server.storage_backend
+    except AttributeError:
+        backend = 'sqlite'
+    if backend == 'segments':
+        import segment_points
+        return segment_points.segment_points(server, segment_points.segment_dir(dbfile))
+    import configpoints
+    return configpoints.configpoints(server, dbfile, migrate=True)
+
+
+class point_storage(object):
+    __metaclass__ = abc.ABCMeta
+
+## Writing ##
+    # store a line, newpoint is '' for runs without success
+    @abc.abstractmethod
+    def add_point(self, interface, newpoint, originpoint, calcsteps, ctime, runtime, runcount, pointid=0, seed=0,
+                  rcval=0.0, lpos=0.0, usecount=0, deactivated=0, uuid='', customdata=''):
+        pass
+
+    # make everything written durable. The queued usecounts are added, with
+    # renorm_weights the PERM weights of lambda_current are computed.
+    @abc.abstractmethod
+    def commit(self, renorm_weights=False, lambda_current=None):
+        pass
+
+    # wait until everything written is visible to the queries
+    @abc.abstractmethod
+    def sync(self):
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    # usecount of a line is increased with the next commit
+    @abc.abstractmethod
+    def queue_usecount_by_myid(self, myid):
+        pass
+
+    @abc.abstractmethod
+    def update_usecount_by_myid(self, myid):
+        pass
+
+    # add time and steps of a continued escape run to its last point
+    @abc.abstractmethod
+    def add_ctime_steps(self, point_id, ctime, calcsteps):
+        pass
+
+## Counting ##
+    # successful active points on an interface
+    @abc.abstractmethod
+    def return_nop(self, interface):
+        pass
+
+    # active lines on an interface, with and without success
+    @abc.abstractmethod
+    def return_runcount(self, interface):
+        pass
+
+    @abc.abstractmethod
+    def return_nop_used_from_interface(self, interface, success=-1):
+        pass
+
+    # origin point -> number of lines on an interface
+    @abc.abstractmethod
+    def return_runs_on_points(self, ilambda):
+        pass
+
+    # number of lines ever stored, grows with every line
+    @abc.abstractmethod
+    def return_last_rowid(self):
+        pass
+
+    @abc.abstractmethod
+    def biggest_lambda(self):
+        pass
+
+    # sorted interface positions
+    @abc.abstractmethod
+    def return_lamlist(self):
+        pass
+
+    @abc.abstractmethod
+    def return_ctime(self):
+        pass
+
+    @abc.abstractmethod
+    def return_mean_steps(self, interface):
+        pass
+
+    @abc.abstractmethod
+    def return_sum_calcsteps(self, interface=-1):
+        pass
+
+    @abc.abstractmethod
+    def return_max_rc(self, ilam):
+        pass
+
+    @abc.abstractmethod
+    def return_customdata(self, interface):
+        pass
+
+    # ids of the first interface points which the points on lam go back to
+    @abc.abstractmethod
+    def interface_statistics_backtrace(self, lam):
+        pass
+
+## Points for new jobs ##
+    # (point, id) of a random successful active point
+    @abc.abstractmethod
+    def return_random_point(self, the_lambda, mode='default'):
+        pass
+
+    # (point, id) drawn by PERM weight
+    @abc.abstractmethod
+    def return_perm_point(self, the_lambda, mode='default'):
+        pass
+
+    @abc.abstractmethod
+    def return_point_by_id(self, rp_id):
+        pass
+
+    # (point as list, id, rcval), ('None', 'escape', 0) if there is none
+    @abc.abstractmethod
+    def return_most_recent_escape_point(self):
+        pass
+
+    # (point as list, id, rcval)
+    @abc.abstractmethod
+    def return_escape_point_by_id(self, pt_id):
+        pass
+
+## Ghosts ##
+    # (point, id) of the point on interface with the fewest ghost runs
+    @abc.abstractmethod
+    def select_ghost_point(self, interface):
+        pass
+
+    @abc.abstractmethod
+    def count_ghost_run(self, origin_point):
+        pass
+
+    # an unused line was started from the_point
+    @abc.abstractmethod
+    def origin_point_in_database_and_active(self, the_point, no_ghosts_running=False):
+        pass
+
+    # complete unused line started from point, () if there is none. It is offered
+    # again until update_usecount_by_myid marks it as used.
+    @abc.abstractmethod
+    def get_line_origin_point(self, point):
+        pass
+
+## Escape traces ##
+    # open traces of the parallel escape run, myid -> calcsteps
+    @abc.abstractmethod
+    def return_escape_traces(self):
+        pass
+
+    @abc.abstractmethod
+    def traceback_escape_point(self, pt_id):
+        pass
+
+    @abc.abstractmethod
+    def save_escape_trace(self, trace):
+        pass
+
+    # saved traces, None if they do not match the stored lines
+    @abc.abstractmethod
+    def load_escape_trace(self):
+        pass
+
+## Client names ##
+    @abc.abstractmethod
+    def return_last_received_count(self, clname):
+        pass
+
+    # client name -> highest received count
+    @abc.abstractmethod
+    def return_received_counts(self):
+        pass
+
+    @abc.abstractmethod
+    def store_received_counts(self, counts):
+        pass
@@ -0,0 +1,932 @@
+# Append-only storage of configuration points (storage_backend = segments).
+#
+# The lines of a database are kept in the directory <name>.segments:
+#
+#   segment-NNNNNN.log  records, appended in order. A new segment is started
+#                       when the current one reaches segment_size. Everything
+#                       else in the directory is derived from the segments.
+#   lines.tbl           one entry per line (the rowid is its position): the
+#                       columns the queries need, the rowid of its origin line
+#                       and segment and offset of its record.
+#   ids.tbl             hash table myid -> rowid.
+#   rows-N.tbl          rowids of all lines on interface N.
+#   sampled-N.tbl       rowids of the successful, active lines on interface N,
+#                       random points are drawn by position without a scan.
+#   state               sizes of the tables, counters of the interfaces,
+#                       received counts and escape traces at the last commit.
+#
+# A record is a header (kind, length of the metadata, length of the payload),
+# the marshalled metadata and, for points, the marshalled payload (configpoint
+# and customdata). Changes of stored lines (usecounts, weights, escape time)
+# are appended as records too and applied to lines.tbl in place.
+#
+# The tables are memory mapped, python only keeps the counters of every
+# interface and what a query loads. Queries on one interface read the rowids
+# of that interface, myids, origins, points and customdata are read from the
+# records when needed.
+#
+# commit() fsyncs the segment and the tables and then writes the state, which
+# records where the log ended. The state is removed before the first change
+# after a commit. If it is missing or does not match the end of the log when
+# opening, the tables are rebuilt from the metadata of all records, a record
+# cut off by a crash is dropped. export_sqlite() writes everything in the
+# configpoints layout, for the analysis scripts.
+
+import os
+import re
+import mmap
+import time
+import random
+import marshal
+import struct
+import hashlib
+import cPickle as pickle
+from collections import deque
+
+try:
+    # Formatting
+    import modules.concolors as cc
+except:
+    print("Not using console colors.")
+
+import point_storage
+import point_codec
+import point_cache
+import alias_table
+
+STATE_VERSION = 1
+
+# record kinds
+REC_POINT    = 0    # metadata of a line, payload
+REC_USECOUNT = 1    # [(rowid, added usecount)]
+REC_STEPS    = 2    # (rowid, added ctime, added calcsteps)
+REC_WEIGHTS  = 3    # [(rowid, weight)]
+REC_META     = 4    # (key, changes), see apply_meta
+
+HEADER = struct.Struct('<BII')
+
+# metadata of a point record: the configpoints columns without configpoint and customdata
+LAMBDA, ORIGIN, CALCSTEPS, CTIME, RUNTIME, SUCCESS, RUNCOUNT, MYID, SEED, LAMBDA_OLD, \
+    WEIGHT, RCVAL, LPOS, USECOUNT, DEACTIVATED, UUID = range(16)
+
+# entry of lines.tbl
+LINE = struct.Struct('<IBBIIqddddqIQ')
+T_LAMBDA, T_SUCCESS, T_DEACTIVATED, T_USECOUNT, T_CHILDREN, T_CALCSTEPS, T_CTIME, T_WEIGHT, \
+    T_RCVAL, T_LPOS, T_ORIGIN, T_SEGMENT, T_OFFSET = range(13)
+
+# counters of an interface: lines, sampled lines, active lines, usecounts of
+# active lines without and with success, calcsteps of all and of active lines,
+# ctime and largest rcval of sampled lines
+C_LINES, C_SAMPLED, C_ACTIVE, C_USED, C_USED_SUCCESS, C_STEPS, C_STEPS_ACTIVE, C_CTIME, C_MAXRC = range(9)
+
+ROWID = struct.Struct('<Q')
+SLOT  = struct.Struct('<QQ')
+
+# directory of the segments belonging to a sqlite database name
+def segment_dir(dbfile):
+    return re.sub('\.sqlite$', '', dbfile) + '.segments'
+
+def id_hash(myid):
+    return struct.unpack('<Q', hashlib.md5(myid).digest()[:8])[0]
+
+
+#### MEMORY MAPPED TABLE OF FIXED SIZE ENTRIES ####
+# The first count entries are valid, the file grows in steps.
+class mapped_table():
+    def __init__(self, filename, entry, count=0):
+        self.filename = filename
+        self.entry    = entry
+        self.count    = count
+        self.map      = None
+        if not os.path.exists(filename):
+            open(filename, 'wb').close()
+        self.file = open(filename, 'r+b')
+        self.capacity = os.path.getsize(filename) // entry.size
+        if self.capacity < max(count, 1024):
+            self.resize(max(count, 1024))
+        else:
+            self.map = mmap.mmap(self.file.fileno(), self.capacity * entry.size)
+
+    def __len__(self):
+        return self.count
+
+    def resize(self, capacity):
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(capacity * self.entry.size)
+        self.capacity = capacity
+        self.map = mmap.mmap(self.file.fileno(), capacity * self.entry.size)
+
+    def get(self, i):
+        return self.entry.unpack_from(self.map, i * self.entry.size)
+
+    def set(self, i, values):
+        self.entry.pack_into(self.map, i * self.entry.size, *values)
+
+    def append(self, values):
+        if self.count >= self.capacity:
+            self.resize(2 * self.capacity)
+        self.set(self.count, values)
+        self.count += 1
+
+    # all values of a table of single numbers
+    def values(self):
+        if self.count == 0:
+            return ()
+        return struct.unpack_from('<%d%s' % (self.count, self.entry.format[-1]), self.map, 0)
+
+    def flush(self):
+        self.map.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+#### HASH TABLE MYID -> ROWID ####
+# Open addressing on a mapped_table of (hash of myid, rowid + 1) slots, an
+# empty slot is 0. The table is kept at most half full, the caller compares
+# the myids of the rowids found.
+class id_table():
+    def __init__(self, filename, count=0):
+        self.filename = filename
+        self.count    = count
+        self.slots    = mapped_table(filename, SLOT)
+        self.slots.count = self.slots.capacity
+
+    def __len__(self):
+        return self.count
+
+    # rowids stored under hash h
+    def candidates(self, h):
+        rowids = []
+        mask = self.slots.capacity - 1
+        i = h & mask
+        while True:
+            slot_h, slot_row = self.slots.get(i)
+            if slot_row == 0:
+                return rowids
+            if slot_h == h:
+                rowids.append(slot_row - 1)
+            i = (i + 1) & mask
+
+    def insert(self, h, rowid):
+        if 2 * (self.count + 1) > self.slots.capacity:
+            self.grow()
+        self.put(h, rowid + 1)
+        self.count += 1
+
+    def put(self, h, slot_row):
+        mask = self.slots.capacity - 1
+        i = h & mask
+        while self.slots.get(i)[1] != 0:
+            i = (i + 1) & mask
+        self.slots.set(i, (h, slot_row))
+
+    # rehash into a table of twice the size, which then replaces the file
+    def grow(self):
+        old     = self.slots
+        tmpname = self.filename + '.tmp'
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        self.slots = mapped_table(tmpname, SLOT)
+        self.slots.resize(2 * old.capacity)
+        self.slots.count = self.slots.capacity
+        for i in xrange(old.capacity):
+            h, slot_row = old.get(i)
+            if slot_row != 0:
+                self.put(h, slot_row)
+        old.close()
+        os.rename(tmpname, self.filename)
+
+    def flush(self):
+        self.slots.flush()
+
+    def close(self):
+        self.slots.close()
+
+
+#### CLASS FOR HANDLING CONFIG POINTS IN SEGMENT FILES ####
+class segment_points(point_storage.point_storage):
+    def __init__(self, server, dirname):
+
+        self.server  = server
+        self.dirname = dirname
+        self.dbfile  = dirname
+
+        self.haveLog = False
+        try:
+            self.server.logger_freshs.info(cc.c_green + 'Opening segments: ' + self.dirname + cc.reset)
+            self.haveLog = True
+        except:
+            print('Opening segments: ' + self.dirname)
+
+        # group commit and formats as for configpoints, see server config
+        try:
+            self.commit_every    = server.db_commit_every
+            self.commit_interval = server.db_commit_interval
+        except AttributeError:
+            self.commit_every    = 1
+            self.commit_interval = 0.0
+        try:
+            self.point_format = server.point_format
+        except AttributeError:
+            self.point_format = 'text'
+        try:
+            self.segment_size = server.segment_size
+        except AttributeError:
+            self.segment_size = 256 * 1024 * 1024
+        try:
+            point_cache_size = server.point_cache_size
+        except AttributeError:
+            point_cache_size = 1000
+
+        self.uncommitted = 0
+        self.last_commit = time.time()
+
+        self.usecountqueue = {}
+        self.interfaces    = {}
+        self.readers       = {}
+        self.pointlru      = point_cache.lru_cache(point_cache_size)
+        self.rowlru        = point_cache.lru_cache(point_cache_size)
+        self.aliascache    = None
+        self.aliasrows     = None
+        self.aliaslambda   = None
+        self.ghostheap     = None
+        self.ghostlines    = None
+        self.out           = None
+        self.out_segment   = -1
+
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+
+        self.segments = sorted([ int(name[8:14]) for name in os.listdir(self.dirname) \
+                                 if re.match('segment-[0-9]{6}\.log$', name) ])
+
+        state = self.read_state()
+        if state is not None and state['end'] == self.log_end():
+            self.clean = True
+            self.open_tables(state)
+        else:
+            self.clean = False
+            self.rebuild()
+
+        if len(self.segments) == 0:
+            self.segments.append(0)
+        self.out_segment = self.segments[-1]
+        self.out         = open(self.segment_file(self.out_segment), 'ab')
+        self.out_size    = os.path.getsize(self.segment_file(self.out_segment))
+        if not self.clean:
+            self.commit_points()
+
+    def segment_file(self, segment):
+        return os.path.join(self.dirname, 'segment-%06d.log' % segment)
+
+    def table_file(self, name):
+        return os.path.join(self.dirname, name)
+
+    def log(self, msg):
+        if self.haveLog:
+            self.server.logger_freshs.info(cc.c_green + msg + cc.reset)
+        else:
+            print(msg)
+
+## State ##
+    # segments and size of the last one
+    def log_end(self):
+        if len(self.segments) == 0:
+            return [], 0
+        return self.segments[:], os.path.getsize(self.segment_file(self.segments[-1]))
+
+    # None if there is no state of this version
+    def read_state(self):
+        try:
+            with open(self.table_file('state'), 'rb') as f:
+                state = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+            return None
+        return state
+
+    # written to a temporary file which is then renamed, as the FFS checkpoint
+    def write_state(self):
+        state = {
+            'version':         STATE_VERSION,
+            'end':             (self.segments[:], self.out_size),
+            'lines':           len(self.lines),
+            'ids':             len(self.ids),
+            'counters':        self.counters,
+            'lamset':          self.lamset,
+            'received':        self.received,
+            'stored_received': self.stored_received,
+            'escape_trace':    self.escape_trace,
+        }
+        tmpname = self.table_file('state.tmp')
+        with open(tmpname, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmpname, self.table_file('state'))
+        self.clean = True
+
+    # the tables are about to change, they do not match the state anymore
+    def touch(self):
+        if self.clean:
+            os.remove(self.table_file('state'))
+            self.clean = False
+
+    def open_tables(self, state):
+        self.lines           = mapped_table(self.table_file('lines.tbl'), LINE, state['lines'])
+        self.ids             = id_table(self.table_file('ids.tbl'), state['ids'])
+        self.counters        = state['counters']
+        self.lamset          = state['lamset']
+        self.received        = state['received']
+        self.stored_received = state['stored_received']
+        self.escape_trace    = state['escape_trace']
+
+    # derive the tables from the segments
+    def rebuild(self):
+        if len(self.segments) > 0:
+            self.log(self.dirname + ': rebuilding tables from the segments.')
+        for name in os.listdir(self.dirname):
+            if name == 'state' or name.endswith('.tbl') or name.endswith('.tmp'):
+                os.remove(self.table_file(name))
+        self.open_tables({'lines': 0, 'ids': 0, 'counters': {}, 'lamset': set(), 'received': {},
+                          'stored_received': {}, 'escape_trace': {}})
+        self.replay()
+
+    # apply the metadata of all records, a record cut off at the end is dropped
+    def replay(self):
+        for segment in self.segments:
+            filename = self.segment_file(segment)
+            size     = os.path.getsize(filename)
+            offset   = 0
+            with open(filename, 'rb') as f:
+                while offset + HEADER.size <= size:
+                    kind, metalen, payloadlen = HEADER.unpack(f.read(HEADER.size))
+                    end = offset + HEADER.size + metalen + payloadlen
+                    if end > size:
+                        break
+                    self.apply(kind, marshal.loads(f.read(metalen)), segment, offset)
+                    f.seek(payloadlen, 1)
+                    offset = end
+            if offset < size:
+                self.log('%s: dropping %d bytes of an incomplete record.' % (filename, size - offset))
+                with open(filename, 'r+b') as f:
+                    f.truncate(offset)
+
+    # rowid tables of an interface: all lines, sampled lines
+    def interface(self, interface):
+        if interface not in self.interfaces:
+            counters = self.counters.get(interface, [0] * 9)
+            self.interfaces[interface] = (
+                mapped_table(self.table_file('rows-%d.tbl' % interface), ROWID, counters[C_LINES]),
+                mapped_table(self.table_file('sampled-%d.tbl' % interface), ROWID, counters[C_SAMPLED]))
+        return self.interfaces[interface]
+
+    def interface_rows(self, interface):
+        if interface not in self.counters:
+            return ()
+        return self.interface(interface)[0].values()
+
+    def sampled_rows(self, interface):
+        if interface not in self.counters:
+            return ()
+        return self.interface(interface)[1].values()
+
+    # lines which can be drawn for new jobs
+    def sampled(self, line):
+        return line[T_SUCCESS] == 1 and line[T_DEACTIVATED] == 0
+
+    def apply(self, kind, meta, segment, offset):
+        if kind == REC_POINT:
+            self.apply_point(meta, segment, offset)
+        elif kind == REC_USECOUNT:
+            for rowid, count in meta:
+                line = list(self.lines.get(rowid))
+                line[T_USECOUNT] += count
+                self.lines.set(rowid, line)
+                if line[T_DEACTIVATED] == 0:
+                    self.counters[line[T_LAMBDA]][C_USED + line[T_SUCCESS]] += count
+        elif kind == REC_STEPS:
+            rowid, ctime, calcsteps = meta
+            line = list(self.lines.get(rowid))
+            line[T_CTIME]     += ctime
+            line[T_CALCSTEPS] += calcsteps
+            self.lines.set(rowid, line)
+            counters = self.counters[line[T_LAMBDA]]
+            counters[C_STEPS] += calcsteps
+            if line[T_DEACTIVATED] == 0:
+                counters[C_STEPS_ACTIVE] += calcsteps
+            if self.sampled(line):
+                counters[C_CTIME] += ctime
+        elif kind == REC_WEIGHTS:
+            for rowid, weight in meta:
+                line = list(self.lines.get(rowid))
+                line[T_WEIGHT] = weight
+                self.lines.set(rowid, line)
+        elif kind == REC_META:
+            self.apply_meta(meta)
+
+    def apply_point(self, meta, segment, offset):
+        rowid  = len(self.lines)
+        origin = self.find(meta[ORIGIN])
+        line   = (meta[LAMBDA], meta[SUCCESS], meta[DEACTIVATED], meta[USECOUNT], 0, meta[CALCSTEPS], meta[CTIME], \
+                  meta[WEIGHT], meta[RCVAL], meta[LPOS], origin, segment, offset)
+        self.lines.append(line)
+        self.ids.insert(id_hash(meta[MYID]), rowid)
+        if origin >= 0:
+            parent = list(self.lines.get(origin))
+            parent[T_CHILDREN] += 1
+            self.lines.set(origin, parent)
+
+        interface = meta[LAMBDA]
+        if interface not in self.counters:
+            self.counters[interface] = [0] * 8 + [0.0]
+        counters = self.counters[interface]
+        rows, sampled = self.interface(interface)
+        rows.append((rowid,))
+        counters[C_LINES] += 1
+        counters[C_STEPS] += line[T_CALCSTEPS]
+        if line[T_DEACTIVATED] == 0:
+            counters[C_ACTIVE]       += 1
+            counters[C_USED + line[T_SUCCESS]] += line[T_USECOUNT]
+            counters[C_STEPS_ACTIVE] += line[T_CALCSTEPS]
+        if self.sampled(line):
+            sampled.append((rowid,))
+            counters[C_SAMPLED] += 1
+            counters[C_CTIME]   += line[T_CTIME]
+            counters[C_MAXRC]    = max(counters[C_MAXRC], line[T_RCVAL])
+
+        self.lamset.add(line[T_LPOS])
+
+        [clname, sep, count] = meta[MYID].rpartition('_')
+        try:
+            if len(sep) > 0 and int(count) > self.received.get(clname, 0):
+                self.received[clname] = int(count)
+        except ValueError:
+            pass
+
+    # received_counts: {client name: count}, escape_trace: ({myid: calcsteps}, [removed myids])
+    def apply_meta(self, meta):
+        key, changes = meta
+        if key == 'received_counts':
+            self.stored_received.update(changes)
+        elif key == 'escape_trace':
+            traces, removed = changes
+            for pt in removed:
+                self.escape_trace.pop(pt, None)
+            self.escape_trace.update(traces)
+
+## Writing ##
+    def append_record(self, kind, meta, payload=''):
+        self.touch()
+        metadata = marshal.dumps(meta)
+        if self.out_size >= self.segment_size:
+            self.out.close()
+            self.out_segment += 1
+            self.segments.append(self.out_segment)
+            self.out      = open(self.segment_file(self.out_segment), 'ab')
+            self.out_size = 0
+        offset = self.out_size
+        self.out.write(HEADER.pack(kind, len(metadata), len(payload)) + metadata + payload)
+        self.out_size += HEADER.size + len(metadata) + len(payload)
+        return self.out_segment, offset
+
+    def add_point(self, interface, newpoint, originpoint, calcsteps, ctime, runtime, runcount, pointid=0, seed=0,
+                  rcval=0.0, lpos=0.0, usecount=0, deactivated=0, uuid='', customdata=''):
+        success = 0
+        if newpoint != '':
+            success = 1
+
+        point   = point_codec.encode(newpoint, self.point_format)
+        payload = marshal.dumps((point_codec.is_binary(point), str(point), str(customdata)))
+        meta    = (int(interface), str(originpoint), int(calcsteps), float(ctime), float(runtime), success, int(runcount), \
+                   str(pointid), int(seed), 0, 0., float(rcval), float(lpos), int(usecount), int(deactivated), str(uuid))
+
+        segment, offset = self.append_record(REC_POINT, meta, payload)
+        self.apply(REC_POINT, meta, segment, offset)
+        rowid = len(self.lines) - 1
+        line  = self.lines.get(rowid)
+
+        if self.sampled(line) and self.ghostheap is not None and self.ghostheap.the_lambda == line[T_LAMBDA]:
+            self.ghostheap.add(meta[MYID])
+
+        # new unused ghost line
+        if line[T_USECOUNT] == 0 and line[T_DEACTIVATED] == 0 and self.ghostlines is not None:
+            self.ghostlines.setdefault(id_hash(meta[ORIGIN]), deque()).append(rowid)
+
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every or time.time() - self.last_commit >= self.commit_interval:
+            self.commit_points()
+
+    def commit(self, renorm_weights=False, lambda_current=None):
+
+        ##initialise the weights at A.
+        if renorm_weights == True and lambda_current == 0:
+            rows = self.interface_rows(0)
+            self.set_weights([ (rowid, 1. / len(rows)) for rowid in rows ])
+            print("set all weights at A to 1/%i=%f" % (len(rows), 1. / len(rows)))
+
+        if len(self.usecountqueue) > 0:
+            counts = [ (self.find(myid), count) for myid, count in self.usecountqueue.iteritems() ]
+            counts = [ (rowid, count) for rowid, count in counts if rowid >= 0 ]
+            self.usecountqueue = {}
+            if len(counts) > 0:
+                self.append_record(REC_USECOUNT, counts)
+                self.apply(REC_USECOUNT, counts, None, None)
+
+        ##renorm weights once and once only per IF, when interface is definitely done.
+        if renorm_weights == True and lambda_current >= 1:
+            self.update_childpoint_weights(lambda_current)
+
+        self.commit_points()
+
+    # make the records and the tables durable, then record the state
+    def commit_points(self):
+        self.out.flush()
+        os.fsync(self.out.fileno())
+        if not self.clean:
+            self.lines.flush()
+            self.ids.flush()
+            for interface in self.interfaces:
+                for table in self.interfaces[interface]:
+                    table.flush()
+            self.write_state()
+        self.uncommitted = 0
+        self.last_commit = time.time()
+
+    # everything is visible at once, the segment is flushed for reading payloads
+    def sync(self):
+        self.out.flush()
+
+    def close(self):
+        self.commit_points()
+        self.out.close()
+        self.lines.close()
+        self.ids.close()
+        for interface in self.interfaces:
+            for table in self.interfaces[interface]:
+                table.close()
+        for segment in self.readers:
+            self.readers[segment].close()
+        self.interfaces = {}
+        self.readers    = {}
+
+    def set_weights(self, weights):
+        self.append_record(REC_WEIGHTS, weights)
+        self.apply(REC_WEIGHTS, weights, None, None)
+
+    ##(PERM) update the weights of the childpoints on lambda_current from their parents,
+    ##       enrich and renormalise them s.t. total weight is P(lambda | lambda_prev).
+    def update_childpoint_weights(self, lambda_current):
+        parents  = [ (rowid, self.lines.get(rowid)) for rowid in self.interface_rows(lambda_current - 1) ]
+        children = [ (rowid, self.lines.get(rowid)) for rowid in self.interface_rows(lambda_current) ]
+        if len(parents) == 0 or len(children) == 0:
+            return
+
+        used_weight_prev  = sum([ line[T_WEIGHT] for rowid, line in parents if line[T_USECOUNT] != 0 ])
+        total_weight_prev = sum([ line[T_WEIGHT] for rowid, line in parents if line[T_SUCCESS] == 1 ])
+        if used_weight_prev <= 0.:
+            print("No weight on used points at lambda = %i, weights not updated." % (lambda_current-1))
+            return
+        E = total_weight_prev / used_weight_prev
+
+        ##weight of a parent is shared by its children, children of unused parents keep their weight
+        parent_weight = dict([ (rowid, line[T_WEIGHT] / line[T_USECOUNT]) for rowid, line in parents if line[T_USECOUNT] != 0 ])
+        weights = [ (rowid, parent_weight.get(line[T_ORIGIN], line[T_WEIGHT]) * E / total_weight_prev) for rowid, line in children ]
+        self.set_weights(weights)
+
+        print("enriched and renormed weights, E was: %f total P(lambda = %i| lambda = %i) = %e" %\
+                       (E, lambda_current, lambda_current-1, sum([ w for rowid, w in weights ])))
+
+    def queue_usecount_by_myid(self, myid):
+        self.usecountqueue[str(myid)] = self.usecountqueue.get(str(myid), 0) + 1
+
+    def update_usecount_by_myid(self, myid):
+        rowid = self.find(myid)
+        if rowid < 0:
+            return
+        counts = [(rowid, 1)]
+        self.append_record(REC_USECOUNT, counts)
+        self.apply(REC_USECOUNT, counts, None, None)
+        if self.ghostlines is not None:
+            self.drop_ghost_line(id_hash(self.read_meta(rowid)[ORIGIN]), rowid)
+
+    def add_ctime_steps(self, point_id, ctime, calcsteps):
+        rowid = self.find(point_id)
+        if rowid < 0:
+            return
+        steps = (rowid, float(ctime), int(calcsteps))
+        self.append_record(REC_STEPS, steps)
+        self.apply(REC_STEPS, steps, None, None)
+
+## Reading records ##
+    # metadata and, with payload, (configpoint as stored, customdata) of the record at segment, offset
+    def read_record(self, segment, offset, payload=False):
+        if segment == self.out_segment:
+            self.out.flush()
+        if segment not in self.readers:
+            self.readers[segment] = open(self.segment_file(segment), 'rb')
+        f = self.readers[segment]
+        f.seek(offset)
+        kind, metalen, payloadlen = HEADER.unpack(f.read(HEADER.size))
+        meta = marshal.loads(f.read(metalen))
+        if not payload:
+            return meta, None
+        binary, point, customdata = marshal.loads(f.read(payloadlen))
+        if binary:
+            point = point_codec.stored(buffer(point))
+        return meta, (point, customdata)
+
+    def read_meta(self, rowid):
+        line = self.lines.get(rowid)
+        return self.read_record(line[T_SEGMENT], line[T_OFFSET])[0]
+
+    def read_payload(self, rowid):
+        line = self.lines.get(rowid)
+        return self.read_record(line[T_SEGMENT], line[T_OFFSET], True)[1]
+
+    # rowid of a myid, -1 if there is none
+    def find(self, myid):
+        myid  = str(myid)
+        rowid = self.rowlru.get(myid)
+        if rowid is not None:
+            return rowid
+        for rowid in self.ids.candidates(id_hash(myid)):
+            if self.read_meta(rowid)[MYID] == myid:
+                self.rowlru.put(myid, rowid)
+                return rowid
+        return -1
+
+    # point of a line, through the LRU cache
+    def load_point(self, rowid):
+        point = self.pointlru.get(rowid)
+        if point is None:
+            point = self.read_payload(rowid)[0]
+            self.pointlru.put(rowid, point)
+        return point
+
+    # line as a row of the configpoints table, with the current usecount, weight and escape time
+    def full_row(self, rowid):
+        line = self.lines.get(rowid)
+        meta, (point, customdata) = self.read_record(line[T_SEGMENT], line[T_OFFSET], True)
+        if isinstance(point, point_codec.packed_point):
+            point = buffer(point.blob)
+        meta = list(meta)
+        meta[CALCSTEPS] = line[T_CALCSTEPS]
+        meta[CTIME]     = line[T_CTIME]
+        meta[WEIGHT]    = line[T_WEIGHT]
+        meta[USECOUNT]  = line[T_USECOUNT]
+        return tuple(meta[:ORIGIN]) + (point,) + tuple(meta[ORIGIN:]) + (customdata,)
+
+## Counting ##
+    def return_nop(self, interface):
+        if interface not in self.counters:
+            return 0
+        return self.counters[interface][C_SAMPLED]
+
+    def return_runcount(self, interface):
+        if interface not in self.counters:
+            return 0
+        return self.counters[interface][C_ACTIVE]
+
+    def return_nop_used_from_interface(self, interface, success=-1):
+        if len(self.usecountqueue) > 0:
+            self.commit()
+        if interface not in self.counters:
+            return 0
+        counters = self.counters[interface]
+        if success < 0:
+            return counters[C_USED] + counters[C_USED_SUCCESS]
+        return counters[C_USED + success]
+
+    def return_runs_on_points(self, ilambda):
+        retval = {}
+        for rowid in self.interface_rows(ilambda):
+            origin = self.read_meta(rowid)[ORIGIN]
+            retval[origin] = retval.get(origin, 0) + 1
+        return retval
+
+    def return_last_rowid(self):
+        return len(self.lines)
+
+    def biggest_lambda(self):
+        if len(self.counters) == 0:
+            return 0
+        return max(self.counters)
+
+    def return_lamlist(self):
+        return sorted(self.lamset)
+
+    def return_ctime(self):
+        if 0 not in self.counters:
+            return 0.0
+        return self.counters[0][C_CTIME]
+
+    def return_mean_steps(self, interface):
+        if interface not in self.counters:
+            return 0
+        counters = self.counters[interface]
+        return int(counters[C_STEPS] / float(counters[C_LINES]))
+
+    def return_sum_calcsteps(self, interface=-1):
+        if interface < 0:
+            return sum([ counters[C_STEPS_ACTIVE] for counters in self.counters.values() ])
+        if interface not in self.counters:
+            return 0
+        return self.counters[interface][C_STEPS_ACTIVE]
+
+    def return_max_rc(self, ilam):
+        if ilam not in self.counters:
+            return 0.0
+        return self.counters[ilam][C_MAXRC]
+
+    def return_customdata(self, interface):
+        return [ self.read_payload(rowid)[1] for rowid in self.interface_rows(interface) \
+                 if self.lines.get(rowid)[T_DEACTIVATED] == 0 ]
+
+    def return_configpoints_ids(self, interface):
+        return [ self.read_meta(rowid)[MYID] for rowid in self.sampled_rows(interface) ]
+
+    def interface_statistics_backtrace(self, lam):
+        rowids = set(self.sampled_rows(lam))
+        for i in range(lam - 1):
+            rowids = set([ self.lines.get(rowid)[T_ORIGIN] for rowid in rowids ])
+            rowids.discard(-1)
+        return list(set([ self.read_meta(rowid)[ORIGIN] for rowid in rowids ]))
+
+## Points for new jobs ##
+    # random point from the sampled table, no scan of the interface
+    def return_random_point(self, the_lambda, mode='default'):
+        sampled = self.interface(the_lambda)[1]
+        rowid   = sampled.get(random.randrange(len(sampled)))[0]
+        return self.load_point(rowid), self.read_meta(rowid)[MYID]
+
+    def return_perm_point(self, the_lambda, mode='default'):
+        # the alias table is kept for a complete interface, by default weights are read every time
+        if mode != 'last_interface_complete' or self.aliaslambda != the_lambda:
+            self.aliasrows   = self.sampled_rows(the_lambda)
+            self.aliascache  = alias_table.alias_table([ self.lines.get(rowid)[T_WEIGHT] for rowid in self.aliasrows ])
+            self.aliaslambda = the_lambda
+        rowid = self.aliasrows[self.aliascache.draw()]
+        return self.load_point(rowid), self.read_meta(rowid)[MYID]
+
+    def return_point_by_id(self, rp_id):
+        if isinstance(rp_id, tuple):
+            print("Warn in segment_points: received tuple instead of plain id, converting...")
+            rp_id = rp_id[0]
+        rowid = self.find(rp_id)
+        if rowid < 0:
+            raise KeyError(str(rp_id))
+        return self.load_point(rowid)
+
+    def return_most_recent_escape_point(self):
+        for rowid in reversed(self.interface_rows(0)):
+            line = self.lines.get(rowid)
+            if line[T_SUCCESS] == 1:
+                return point_codec.decode(self.load_point(rowid)), self.read_meta(rowid)[MYID], line[T_RCVAL]
+        return 'None', 'escape', 0
+
+    def return_escape_point_by_id(self, pt_id):
+        rowid = self.find(pt_id)
+        if rowid < 0:
+            print("No point found for pt_id", pt_id)
+            return '', '', 0.0
+        return point_codec.decode(self.load_point(rowid)), str(pt_id), self.lines.get(rowid)[T_RCVAL]
+
+## Ghosts ##
+    def select_ghost_point(self, interface):
+        if self.ghostheap is None or self.ghostheap.the_lambda != interface:
+            self.ghostheap = point_cache.run_count_heap(interface)
+            counts = self.server.ghostpoints.return_runs_on_points(interface + 1)
+            for point_id in self.return_configpoints_ids(interface):
+                self.ghostheap.add(point_id, counts.get(point_id, 0))
+
+        point_id = self.ghostheap.least(self.server.is_ghost_point)
+        if point_id is None:
+            point_id = self.ghostheap.random_point()
+
+        return self.return_point_by_id(point_id), point_id
+
+    def count_ghost_run(self, origin_point):
+        if self.ghostheap is not None:
+            self.ghostheap.increment(str(origin_point))
+
+    # unused lines (usecount 0, active) by the 64 bit hash of the origin point, in order of arrival
+    def ghost_index(self):
+        if self.ghostlines is None:
+            self.ghostlines = {}
+            for rowid in xrange(len(self.lines)):
+                line = self.lines.get(rowid)
+                if line[T_DEACTIVATED] == 0 and line[T_USECOUNT] == 0:
+                    self.ghostlines.setdefault(id_hash(self.read_meta(rowid)[ORIGIN]), deque()).append(rowid)
+        return self.ghostlines
+
+    def drop_ghost_line(self, key, rowid):
+        queue = self.ghostlines.get(key)
+        if queue and rowid in queue:
+            queue.remove(rowid)
+            if len(queue) == 0:
+                del self.ghostlines[key]
+
+    def origin_point_in_database_and_active(self, the_point, no_ghosts_running=False):
+        return len(self.ghost_index().get(id_hash(str(the_point)), ())) > 0
+
+    # the line stays in the ghost index until it is used, see update_usecount_by_myid
+    def get_line_origin_point(self, point):
+        queue = self.ghost_index().get(id_hash(str(point)))
+        if not queue:
+            return ()
+        return self.full_row(queue[0])
+
+## Escape traces ##
+    def return_escape_traces(self):
+        total  = {}
+        traces = {}
+        for pt in self.interface_rows(0):
+            if not self.sampled(self.lines.get(pt)) or self.lines.get(pt)[T_CHILDREN] > 0:
+                continue
+            chain = []
+            seen  = set()
+            rowid = pt
+            while rowid >= 0 and rowid not in total and rowid not in seen:
+                chain.append(rowid)
+                seen.add(rowid)
+                rowid = self.lines.get(rowid)[T_ORIGIN]
+            steps = total.get(rowid, 0)
+            for rowid in reversed(chain):
+                steps += self.lines.get(rowid)[T_CALCSTEPS]
+                total[rowid] = steps
+            traces[self.read_meta(pt)[MYID]] = total[pt]
+        return traces
+
+    def traceback_escape_point(self, pt_id):
+        tracesteps = 0
+        visited = set()
+        rowid = self.find(pt_id)
+        while rowid >= 0 and rowid not in visited:
+            visited.add(rowid)
+            line = self.lines.get(rowid)
+            tracesteps += line[T_CALCSTEPS]
+            rowid = line[T_ORIGIN]
+        return tracesteps
+
+    # only the traces which changed are appended
+    def save_escape_trace(self, trace):
+        trace   = dict([ (str(pt), int(steps)) for pt, steps in trace.iteritems() ])
+        changed = dict([ (pt, steps) for pt, steps in trace.iteritems() if self.escape_trace.get(pt) != steps ])
+        removed = [ pt for pt in self.escape_trace if pt not in trace ]
+        if len(changed) == 0 and len(removed) == 0:
+            return
+        meta = ('escape_trace', (changed, removed))
+        self.append_record(REC_META, meta)
+        self.apply(REC_META, meta, None, None)
+
+    def load_escape_trace(self):
+        for pt in self.escape_trace:
+            rowid = self.find(pt)
+            if rowid < 0 or self.lines.get(rowid)[T_CHILDREN] > 0:
+                return None
+        return dict(self.escape_trace)
+
+## Client names ##
+    def return_last_received_count(self, clname):
+        return self.received.get(str(clname), 0)
+
+    def return_received_counts(self):
+        counts = dict(self.stored_received)
+        for clname in self.received:
+            if self.received[clname] > counts.get(clname, 0):
+                counts[clname] = self.received[clname]
+        return counts
+
+    # only the counts which changed are appended
+    def store_received_counts(self, counts):
+        changed = dict([ (str(clname), int(count)) for clname, count in counts.iteritems() \
+                         if self.stored_received.get(str(clname)) != int(count) ])
+        if len(changed) == 0:
+            return
+        self.append_record(REC_META, ('received_counts', changed))
+        self.apply(REC_META, ('received_counts', changed), None, None)
+
+## Export ##
+    # write all lines in the configpoints layout, for the analysis scripts
+    def export_sqlite(self, dbfile):
+        import configpoints
+        # a new database, it gets the tables of the current schema
+        db = configpoints.configpoints(None, dbfile, migrate=True)
+        self.sync()
+        rows = []
+        for rowid in xrange(len(self.lines)):
+            rows.append(self.full_row(rowid))
+            if len(rows) >= 10000:
+                db.cur.executemany('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', rows)
+                rows = []
+        db.cur.executemany('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', rows)
+        db.store_received_counts(self.return_received_counts())
+        db.save_escape_trace(self.escape_trace)
+        db.commit()
+        db.close()
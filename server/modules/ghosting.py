@@ -77,17 +77,16 @@ class ghosting():
 
         ss.logger_freshs.debug(cc.c_magenta + __name__ + ': parse_message' + cc.reset)
 
-        if "\"omit\": True" in data:
+        if ddata.get('omit') == True:
             ss.logger_freshs.info(cc.c_magenta + client.name + ' requested to omit data.' + cc.reset)
             return
 
-        ss.ghost_clients.pop(client)
-        ss.ghostnames.remove(client.name)
+        client.remove_from_ghost()
 
-        if "\"success\": True" in data:
+        if ddata.get('success') == True:
             self.analyze_job_success(client, ddata, runid)
 
-        elif "\"success\": False" in data:
+        elif ddata.get('success') == False:
             self.analyze_job_nosuccess(client, ddata, runid)
 
 
@@ -160,6 +159,7 @@ class ghosting():
                                      uuid, \
                                      customdata \
                                      )
+            ss.storepoints.count_ghost_run(origin_point)
 
         ss.check_for_job(client)
 
@@ -225,6 +225,7 @@ class ghosting():
                                              uuid, \
                                              customdata \
                                              )
+                ss.storepoints.count_ghost_run(ddata['origin_points'])
 
             except:
                 ss.logger_freshs.warn(cc.c_red + \
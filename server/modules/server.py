@@ -26,6 +26,7 @@ import socket
 
 # Calculation
 import random
+import heapq
 
 # Date and Time
 import datetime as dt
@@ -41,6 +42,7 @@ import os
 import sys
 import shutil
 import threading
+from collections import OrderedDict
 
 reldir = os.path.dirname(__file__)
 
@@ -60,6 +62,8 @@ import concolors as cc
 
 # FRESHS
 import clienthandler
+import client_state
+import wire_protocol
 import auto_interfaces
 import ghosting
 import sampling_algorithm_enum as sampling_algorithm
@@ -97,14 +101,19 @@ class server(asyncore.dispatcher):
 
         # global variables which can be used in all algorithms
 
-        self.clients = []               # array for handling clients
-        self.clientnames = []           # array for handling client names
-        self.ghost_clients = {}         # dict for handling pre-runs (ghosts)
-        self.ghostnames = []            # array for storing ghost names
-        self.explorer_clients = {}      # dict for clients which are currently exploring the phase space
-        self.idle_clients = []          # array for idle clients
-        self.idlenames = []             # array for storing the names of idle clients
+        self.clients = client_state.ClientRegistry()    # registered clients and their states
+        self.clientnames = set()        # set of names given to connected clients
+        self.free_client_ids = []       # heap of released client numbers, the lowest is given first
+        self.next_client_id = 0         # lowest client number never given
+        self.received_counts = None     # dict of received counts per client name, loaded on first connect
+        # read-only views of the registry, change states with self.clients.set_state
+        self.ghost_clients = self.clients.in_state(client_state.GHOST)          # client -> ghost point of pre-runs
+        self.explorer_clients = self.clients.in_state(client_state.EXPLORER)    # client -> lambda of exploring runs
+        self.idle_clients = self.clients.in_state(client_state.IDLE)            # idle clients, in order of waiting
+        self.prefetched_jobs = 0        # jobs queued on clients in addition to the running one
         self.console_clients = []       # array to handle management console clients
+        self.registration_queue = OrderedDict()     # clients which said hello, registered a few per loop iteration
+        self.registration_scheduled = False         # asyncio: registration of queued clients is scheduled
         self.client_runtime = {}        # dict for saving the clients' runtimes
         self.last_seen = {}             # dict for saving the timestamp when client was last seen
 
@@ -116,6 +125,7 @@ class server(asyncore.dispatcher):
         self.disable_runs = False
 
         self.idle_start_in_progress = False
+        self.prefetch_in_progress   = False
 
         # Seed the RNG
         self.set_seed()
@@ -219,6 +229,18 @@ class server(asyncore.dispatcher):
 
     # create listening socket
     def open_socket(self):
+        if self.network_backend == 'asyncio':
+            # the asyncio module is only needed for this backend
+            import aio_server
+            self.aio = aio_server.aio_server(self)
+            try:
+                self.aio.listen(self.port)
+            except:
+                self.logger_freshs.info(cc.c_red + 'Error! Could not open/bind to socket on port: ' + str(self.port) + cc.reset)
+                self.logger_freshs.info(cc.c_red + 'Error! Port in use? ' + str(self.port) + cc.reset)
+                raise SystemExit(1)
+            return
+
         asyncore.dispatcher.__init__(self)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.set_reuse_addr()
@@ -229,7 +251,45 @@ class server(asyncore.dispatcher):
             self.logger_freshs.info(cc.c_red + 'Error! Port in use? ' + str(self.port) + cc.reset)
             raise SystemExit(1)
 
-        self.listen(1)
+        self.listen(self.listen_backlog)
+
+# -------------------------------------------------------------------------------------------------
+
+    # close listening socket
+    def close_socket(self):
+        if self.network_backend == 'asyncio':
+            self.aio.close()
+        else:
+            self.handle_close()
+            asyncore.dispatcher.close(self)
+
+# -------------------------------------------------------------------------------------------------
+
+    # run the event loop of the selected network backend
+    def loop(self):
+        try:
+            if self.network_backend == 'asyncio':
+                self.aio.run()
+            else:
+                while asyncore.socket_map:
+                    # do not wait for network events while clients are waiting for registration
+                    if len(self.registration_queue) > 0:
+                        timeout = 0.0
+                    else:
+                        timeout = 30.0
+                    asyncore.loop(timeout=timeout, count=1)
+                    self.register_queued_clients()
+        except KeyboardInterrupt:
+            # SIGINT: keep the results and the scheduler state for a restart
+            self.logger_freshs.info(cc.c_magenta + 'Interrupted. Please wait while the database is updated.' + cc.reset)
+            if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
+                self.ffs_control.write_checkpoint()
+                self.storepoints.commit()
+                self.ghostpoints.commit()
+                # waits for a writer thread
+                self.storepoints.close()
+                self.ghostpoints.close()
+            raise SystemExit(0)
 
 # -------------------------------------------------------------------------------------------------
 
@@ -280,15 +340,15 @@ class server(asyncore.dispatcher):
         try:
             if self.algo_name == 'ffs' or self.algo_name == 'perm_ffs':
 
-                import configpoints
+                import point_storage
 
                 # create instance of DB for configpoint-handling / open existing DB
                 confdbfile = self.timestamp + '_configpoints.sqlite'
-                self.storepoints=configpoints.configpoints(self, self.folder_db + confdbfile)
+                self.storepoints=point_storage.open_storage(self, self.folder_db + confdbfile)
 
                 # create instance of DB for pre-runs:
                 ghostdbfile = self.timestamp + '_ghost.sqlite'
-                self.ghostpoints=configpoints.configpoints(self, self.folder_db + ghostdbfile)
+                self.ghostpoints=point_storage.open_storage(self, self.folder_db + ghostdbfile)
 
                 # Symlink DBs
                 try:
@@ -329,7 +389,7 @@ class server(asyncore.dispatcher):
 
                 # create instance of DB for configpoint-handling / open existing DB
                 confdbfile = self.timestamp + '_configpoints.sqlite'
-                self.storepoints=configpoints.configpoints(self, self.folder_db + confdbfile)
+                self.storepoints=configpoints.configpoints(self, self.folder_db + confdbfile, migrate=True)
         except Exception as e:
             self.logger_freshs.debug(cc.c_red + __name__ + 'Error!:' + str(e) + cc.reset)
             raise SystemExit(1)
@@ -470,6 +530,117 @@ class server(asyncore.dispatcher):
 
         self.port = self.configfile.getint('general', 'listenport')
 
+        # network backend: asyncore (default) or asyncio
+        if self.configfile.has_option('general', 'network_backend'):
+            self.network_backend = self.configfile.get('general', 'network_backend').strip().lower()
+        else:
+            self.network_backend = 'asyncore'
+
+        if self.network_backend not in ['asyncore', 'asyncio']:
+            self.logger_freshs.warn(cc.c_red + 'Unknown network_backend ' + self.network_backend + \
+                                    ', using asyncore.' + cc.reset)
+            self.network_backend = 'asyncore'
+
+        # fail at startup, not when the socket is opened
+        if self.network_backend == 'asyncio':
+            try:
+                import aio_server
+            except ImportError as e:
+                self.logger_freshs.error(cc.c_red + 'Error! ' + str(e) + cc.reset)
+                raise SystemExit(1)
+
+        # stop reading from a client if more than this many bytes wait to be sent to it
+        if self.configfile.has_option('general', 'send_highwater'):
+            self.send_highwater = self.configfile.getint('general', 'send_highwater')
+        else:
+            self.send_highwater = 16777216
+
+        # number of connections the OS queues until they are accepted
+        if self.configfile.has_option('general', 'listen_backlog'):
+            self.listen_backlog = self.configfile.getint('general', 'listen_backlog')
+        else:
+            self.listen_backlog = 128
+
+        # clients registered (and given a first job) per loop iteration, 0 registers at once
+        if self.configfile.has_option('general', 'registrations_per_tick'):
+            self.registrations_per_tick = self.configfile.getint('general', 'registrations_per_tick')
+        else:
+            self.registrations_per_tick = 10
+
+        # group commit of new points: commit after this many points or seconds, whichever
+        # comes first. A crash loses at most these. 1 commits every point.
+        if self.configfile.has_option('general', 'db_commit_every'):
+            self.db_commit_every = self.configfile.getint('general', 'db_commit_every')
+        else:
+            self.db_commit_every = 100
+        if self.configfile.has_option('general', 'db_commit_interval'):
+            self.db_commit_interval = self.configfile.getfloat('general', 'db_commit_interval')
+        else:
+            self.db_commit_interval = 2.0
+
+        # database mode: default, or writer (WAL mode, writes in a separate thread)
+        if self.configfile.has_option('general', 'db_mode'):
+            self.db_mode = self.configfile.get('general', 'db_mode').strip().lower()
+        else:
+            self.db_mode = 'default'
+
+        if self.db_mode not in ['default', 'writer']:
+            self.logger_freshs.warn(cc.c_red + 'Unknown db_mode ' + self.db_mode + \
+                                    ', using default.' + cc.reset)
+            self.db_mode = 'default'
+
+        # storage format of new points: text, float64 or float32 (binary)
+        if self.configfile.has_option('general', 'point_format'):
+            self.point_format = self.configfile.get('general', 'point_format').strip().lower()
+        else:
+            self.point_format = 'text'
+
+        if self.point_format not in ['text', 'float64', 'float32']:
+            self.logger_freshs.warn(cc.c_red + 'Unknown point_format ' + self.point_format + \
+                                    ', using text.' + cc.reset)
+            self.point_format = 'text'
+
+        # keep points and customdata in a separate table, for new and existing databases
+        if self.configfile.has_option('general', 'payload_table'):
+            self.payload_table = self.configfile.getboolean('general', 'payload_table')
+        else:
+            self.payload_table = False
+
+        # number of points of the last interface kept in memory for new jobs
+        if self.configfile.has_option('general', 'point_cache_size'):
+            self.point_cache_size = self.configfile.getint('general', 'point_cache_size')
+        else:
+            self.point_cache_size = 1000
+
+        # storage of the FFS points: sqlite, or segments (append-only files, see segment_points)
+        if self.configfile.has_option('general', 'storage_backend'):
+            self.storage_backend = self.configfile.get('general', 'storage_backend').strip().lower()
+        else:
+            self.storage_backend = 'sqlite'
+
+        if self.storage_backend not in ['sqlite', 'segments']:
+            self.logger_freshs.warn(cc.c_red + 'Unknown storage_backend ' + self.storage_backend + \
+                                    ', using sqlite.' + cc.reset)
+            self.storage_backend = 'sqlite'
+
+        # size in MB at which the segments backend starts a new segment file
+        if self.configfile.has_option('general', 'segment_size'):
+            self.segment_size = self.configfile.getint('general', 'segment_size') * 1024 * 1024
+        else:
+            self.segment_size = 256 * 1024 * 1024
+
+        # codecs clients may use for compression, in order of preference, 'none' disables it
+        if self.configfile.has_option('general', 'compression'):
+            self.compression = [ c.strip() for c in self.configfile.get('general', 'compression').split(',') ]
+        else:
+            self.compression = wire_protocol.codecs_available()
+
+        # payloads smaller than this are sent uncompressed
+        if self.configfile.has_option('general', 'compression_threshold'):
+            self.compression_threshold = self.configfile.getint('general', 'compression_threshold')
+        else:
+            self.compression_threshold = 4096
+
         # user-defined message string
         if self.configfile.has_option('general', 'user_msg'):
             self.user_msg = str(self.configfile.get('general', 'user_msg'))
@@ -584,7 +755,7 @@ class server(asyncore.dispatcher):
         # WARN: DO NOT USE THE DATABASE IN THIS THREADED FUNCTION
         self.print_status()
         self.logger_freshs.debug(cc.c_magenta + 'Runcount: ' + str(self.run_count) + cc.reset)
-        self.logger_freshs.debug(cc.c_magenta + 'Clients: ' + str(self.clientnames) + cc.reset)
+        self.logger_freshs.debug(cc.c_magenta + 'Clients: ' + str(sorted(self.clientnames)) + cc.reset)
         if self.check_alive > 0:
             # Check if clients are alive (one after another)
             # if not, send new job, if not ok, disconnect
@@ -603,9 +774,13 @@ class server(asyncore.dispatcher):
 
         if len(self.clients) > 0 and (len(self.ghost_clients) + len(self.idle_clients)) == len(self.clients):
            self.logger_freshs.warn(cc.c_red + 'ALL CLIENTS ARE GHOSTS OR IDLE: at best, this indicates inefficient use of the system.' + cc.reset)
-        self.periodic = threading.Timer(self.t_infocheck, self.periodic_check)
-        self.periodic.daemon=True
-        self.periodic.start()
+        if self.network_backend == 'asyncio':
+            # run in the event loop, no extra thread needed
+            self.periodic = self.aio.call_later(self.t_infocheck, self.periodic_check)
+        else:
+            self.periodic = threading.Timer(self.t_infocheck, self.periodic_check)
+            self.periodic.daemon=True
+            self.periodic.start()
 
 # -------------------------------------------------------------------------------------------------
 
@@ -631,31 +806,83 @@ class server(asyncore.dispatcher):
 
     # Accept connection from client
     def handle_accept(self):
-        sock, addr = self.accept()
-        # index client
-        ready = 0
-        i = 0
-        name = ''
-        while not ready:
-            name_tmp = "client%04d" % i
-            if name_tmp not in self.clientnames and not ready:
-                self.clientnames.append(name_tmp)
-                name = name_tmp
-                ready = 1
-            i += 1
-        if name == '':
-            self.logger_freshs.warn(cc.c_red + 'Failed giving name to client! Client not accepted.' + cc.reset)
-        else:
-            if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
-                last_received_count = max([self.storepoints.return_last_received_count(name), self.ghostpoints.return_last_received_count(name)])
-            else:
-                last_received_count = self.storepoints.return_last_received_count(name)
-            self.logger_freshs.debug(cc.c_magenta + 'Last received count of ' + name + ' is ' + str(last_received_count) + cc.reset)
-            clienthandler.ClientHandler(self,sock,addr,name,last_received_count)
+        # take all waiting connections, up to the backlog
+        for i in range(max(1, self.listen_backlog)):
+            pair = self.accept()
+            if pair is None:
+                # no more connections waiting
+                break
+            sock, addr = pair
+            name = self.new_client_name()
+            clienthandler.ClientHandler(self,sock,addr,name,self.return_received_count(name))
             self.logger_freshs.info(cc.c_blue + name + ' connected.' + cc.reset)
 
         return
 
+# -------------------------------------------------------------------------------------------------
+
+    # index client with the lowest free number
+    def new_client_name(self):
+        if len(self.free_client_ids) > 0:
+            i = heapq.heappop(self.free_client_ids)
+        else:
+            i = self.next_client_id
+            self.next_client_id += 1
+
+        name = "client%04d" % i
+        self.clientnames.add(name)
+
+        return name
+
+    # give the number of a disconnected client free again
+    def release_client_name(self, name):
+        if name in self.clientnames:
+            self.clientnames.remove(name)
+            heapq.heappush(self.free_client_ids, int(name[len('client'):]))
+
+# -------------------------------------------------------------------------------------------------
+
+    # number of results already stored for a client name, used to continue the run ids
+    def return_received_count(self, name):
+        if self.received_counts is None:
+            self.load_received_counts()
+
+        if name in self.received_counts:
+            last_received_count = self.received_counts[name]
+        elif self.algorithm == sampling_algorithm.SPRES:
+            # the SPRES databases keep no received counts, ask once per name
+            last_received_count = self.storepoints.return_last_received_count(name)
+            self.received_counts[name] = last_received_count
+        else:
+            last_received_count = 0
+        self.logger_freshs.debug(cc.c_magenta + 'Last received count of ' + name + ' is ' + str(last_received_count) + cc.reset)
+
+        return last_received_count
+
+    # read the received counts of all client names at once
+    def load_received_counts(self):
+        self.received_counts = {}
+        if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
+            for db in [self.storepoints, self.ghostpoints]:
+                counts = db.return_received_counts()
+                for name in counts:
+                    self.received_counts[name] = max(counts[name], self.received_counts.get(name, 0))
+        elif self.algorithm == sampling_algorithm.NSFFS:
+            self.received_counts = self.storepoints.return_received_counts()
+        self.logger_freshs.debug(cc.c_magenta + 'Loaded received counts of ' + str(len(self.received_counts)) + \
+                                 ' client names.' + cc.reset)
+
+    # keep the received count of a disconnecting client for the next client with this name
+    def remember_received_count(self, client):
+        if self.received_counts is None:
+            return
+        self.received_counts[client.name] = client.received_count
+        if self.algorithm != sampling_algorithm.SPRES:
+            try:
+                self.storepoints.store_received_counts({client.name: client.received_count})
+            except:
+                self.logger_freshs.info(cc.c_green + 'Notice: Could not store received count of ' + client.name + '.' + cc.reset )
+
 # -------------------------------------------------------------------------------------------------
 
     # close handle
@@ -687,16 +914,23 @@ class server(asyncore.dispatcher):
                     + cc.reset)
 
             elif self.algorithm == sampling_algorithm.SPRES:
-                self.logger_freshs.info(cc.c_magenta + 'Clients (' + str(len(self.clientnames))+ '): ' + str(self.clientnames) \
-                + ', idle (' + str(len(self.idlenames))+ '): ' + str(self.idlenames) \
+                self.logger_freshs.info(cc.c_magenta + 'Clients (' + str(len(self.clientnames))+ '): ' + str(sorted(self.clientnames)) \
+                + ', idle (' + str(len(self.idle_clients))+ '): ' + str([ c.name for c in self.idle_clients ]) \
                 + cc.reset)
 
             elif self.algorithm == sampling_algorithm.NSFFS:
-                self.logger_freshs.info(cc.c_magenta + 'Clients (' + str(len(self.clientnames))+ '): ' + str(self.clientnames) \
-                + ', ghosts (' + str(len(self.ghostnames)) + '): ' + str(self.ghostnames) \
-                + ', idle (' + str(len(self.idlenames))+ '): ' + str(self.idlenames) \
+                self.logger_freshs.info(cc.c_magenta + 'Clients (' + str(len(self.clientnames))+ '): ' + str(sorted(self.clientnames)) \
+                + ', ghosts (' + str(len(self.ghost_clients)) + '): ' + str([ c.name for c in self.ghost_clients ]) \
+                + ', idle (' + str(len(self.idle_clients))+ '): ' + str([ c.name for c in self.idle_clients ]) \
                 + ', ghostruns_in_db: ' + str(self.ghostpoints.return_nop(self.act_lambda)) \
                 + cc.reset)
+
+            # compression ratio and time spent (de)compressing per connection
+            compressed = [ c for c in self.clients if c.compressor.codec is not None ]
+            if len(compressed) > 0:
+                self.logger_freshs.info(cc.c_magenta + 'Compression: ' \
+                + ', '.join([ c.name + ' ' + c.compressor.status() for c in compressed ]) \
+                + cc.reset)
         except:
             self.logger_freshs.warn(cc.c_red + 'Could not print status information.' + cc.reset)
 
@@ -711,12 +945,17 @@ class server(asyncore.dispatcher):
             if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
                 fsc = self.ffs_control
 
+                # client is still busy with jobs sent in advance, only refill its queue
+                if len(client.pending_jobs) > 0:
+                    self.prefetch_jobs(client)
+                    return
+
                 client.remove_from_ghost()
                 client.remove_from_explorer()
 
                 if fsc.start_job(client):
-                    # starting real run was successful
-                    pass
+                    # starting real run was successful, send further jobs in advance
+                    self.prefetch_jobs(client)
                 elif self.act_lambda == 0 and fsc.exit_after_escape > 0:
                     if client not in self.idle_clients:
                         client.start_job_wait()
@@ -760,6 +999,93 @@ class server(asyncore.dispatcher):
                 self.logger_freshs.error(cc.c_red + 'Error, sampling algorithm not recognised: ' + str(self.algorithm) + cc.reset)
 
 
+# -------------------------------------------------------------------------------------------------
+
+    # Send real jobs in advance until the client has prefetch_jobs jobs queued.
+    # Escape runs are not prefetched, because a client can only continue one escape trace.
+    def prefetch_jobs(self, client):
+        fsc = self.ffs_control
+
+        if fsc.prefetch_jobs < 2 or self.act_lambda < 1 or self.prefetch_in_progress:
+            return
+
+        self.prefetch_in_progress = True
+        try:
+            while len(client.pending_jobs) < fsc.prefetch_jobs and client in self.clients:
+                njobs = len(client.pending_jobs)
+                if not fsc.start_job(client):
+                    break
+                # no job was sent, e.g. the result was taken from the ghost database
+                if len(client.pending_jobs) <= njobs:
+                    break
+        finally:
+            self.prefetch_in_progress = False
+
+# -------------------------------------------------------------------------------------------------
+
+    # A client offering "compress=<codec>,..." in its hello gets the first codec we accept
+    def negotiate_compression(self, client, hello):
+        match = re.search('compress=([\w,]+)', hello)
+        if not match:
+            return
+
+        codec = wire_protocol.choose_codec(match.group(1).split(','), self.compression)
+        if codec is None:
+            self.logger_freshs.info(cc.c_blue + str(client.name) + ' offered compression ' + match.group(1) + \
+                                    ', none accepted.' + cc.reset)
+            return
+
+        client.compressor.codec = codec
+        client.send_packet('compression: ' + codec)
+        self.logger_freshs.info(cc.c_blue + str(client.name) + ' uses ' + codec + ' compression.' + cc.reset)
+
+# -------------------------------------------------------------------------------------------------
+
+    # A client announcing "slots=N" in its hello runs N jobs in parallel. The connection
+    # itself is slot 0, every further slot is registered as a separate client.
+    def register_slots(self, client, hello):
+        match = re.search('slots=(\d+)', hello)
+        if not match:
+            return
+
+        for slot in range(1, int(match.group(1))):
+            name = self.new_client_name()
+            slot_client = clienthandler.SlotHandler(client, slot, name, self.return_received_count(name))
+            client.slots.append(slot_client)
+            self.logger_freshs.info(cc.c_blue + name + ' connected as slot ' + str(slot) + ' of ' + \
+                                    client.name + '.' + cc.reset)
+            self.queue_registration(slot_client)
+
+# -------------------------------------------------------------------------------------------------
+
+    # Clients saying hello are registered (and get their first job) only a few per loop
+    # iteration, so that many clients starting at once do not block the server.
+    def queue_registration(self, client):
+        if self.registrations_per_tick <= 0:
+            self.registerClient(client)
+            return
+
+        self.registration_queue[client] = time.time()
+        if self.network_backend == 'asyncio' and not self.registration_scheduled:
+            self.registration_scheduled = True
+            self.aio.call_soon(self.register_queued_clients)
+
+    # called after each iteration of the event loop
+    def register_queued_clients(self):
+        self.registration_scheduled = False
+
+        count = 0
+        while len(self.registration_queue) > 0 and count < self.registrations_per_tick:
+            client, t_queued = self.registration_queue.popitem(last=False)
+            self.logger_freshs.debug(cc.c_blue + 'Registering ' + str(client.name) + ' after ' + \
+                                     str(time.time() - t_queued) + ' seconds in queue.' + cc.reset)
+            self.registerClient(client)
+            count += 1
+
+        if len(self.registration_queue) > 0 and self.network_backend == 'asyncio':
+            self.registration_scheduled = True
+            self.aio.call_soon(self.register_queued_clients)
+
 # -------------------------------------------------------------------------------------------------
 
     # register client and add to client array, send timestamp, check for job
@@ -767,10 +1093,10 @@ class server(asyncore.dispatcher):
 
         self.logger_freshs.debug(cc.c_magenta + __name__ + ': register_client' + cc.reset)
 
-        self.clients.append(client)
+        self.clients.add(client)
 
         # Send server's timestamp to client
-        client.long_send('timestamp: ' + self.timestamp + 'PKT_SEP\n')
+        client.send_packet('timestamp: ' + self.timestamp)
 
         self.print_status()
 
@@ -783,24 +1109,20 @@ class server(asyncore.dispatcher):
 
         self.logger_freshs.debug(cc.c_magenta + __name__ + ': cleanup_client' + cc.reset)
 
-        if client.name in self.clientnames:
-            self.clientnames.remove(client.name)
-        if client.name in self.ghostnames:
-            self.ghostnames.remove(client.name)
-        if client.name in self.idlenames:
-            self.idlenames.remove(client.name)
-        if client in self.clients:
-            self.clients.remove(client)
+        self.remember_received_count(client)
+        self.release_client_name(client.name)
+        self.clients.remove(client)
         if client in self.last_seen:
             self.last_seen.pop(client)
-        if client in self.ghost_clients:
-            self.ghost_clients.pop(client)
-        if client in self.idle_clients:
-            self.idle_clients.remove(client)
         if client in self.console_clients:
             self.console_clients.remove(client)
-        if client in self.explorer_clients:
-            self.explorer_clients.pop(client)
+        if client in self.registration_queue:
+            self.registration_queue.pop(client)
+
+        # jobs queued on this client are not expected anymore
+        if len(client.pending_jobs) > 1:
+            self.prefetched_jobs -= len(client.pending_jobs) - 1
+        client.pending_jobs.clear()
 
         # algorithm specific cleanup
         if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
@@ -848,12 +1170,10 @@ class server(asyncore.dispatcher):
                     except:
                         self.logger_freshs.info(cc.c_green + 'Notice: Could not commit last state of ghostpoint DB during client disconnect.' + cc.reset )
                     if client not in self.explorer_clients:
-                        # client was active. Need another client to resume this job
-                        was_active2 = 1
+                        # client was active. Need another client to resume this job,
+                        # one for each job it had queued
                         try:
-                            if self.run_count[self.act_lambda] > 0:
-                                client.decr_runcount(self.act_lambda)
-                                self.M_0[self.act_lambda] -= 1
+                            was_active2 = self.refund_unfinished_jobs(client, self.run_count, self.M_0)
                             #if self.storepoints.return_nop(self.act_lambda) > 0:
                             #    self.storepoints.update_M_0(-1)
 
@@ -882,62 +1202,65 @@ class server(asyncore.dispatcher):
 
 
 
-        # job2: start idle client replacing the disconnected client
+        # job2: start idle clients replacing the disconnected client
         if was_active2 and not self.disable_runs:
-            done = 0
-            for client in self.clients:
-                if (self.is_idle(client)) and (not done):
-                    done = 1
-                    self.check_for_job(client)
-                else:
-                    pass
+            for client in list(self.idle_clients)[:was_active2]:
+                self.check_for_job(client)
+
+# -------------------------------------------------------------------------------------------------
+
+    # Take the unfinished jobs of a client back from run_count and M_0 (or copies of
+    # them), each at the interface it was sent for. Returns the number of jobs.
+    def refund_unfinished_jobs(self, client, run_count, M_0):
+        lams = client.unfinished_job_lambdas()
+        for lam in lams:
+            if lam < len(run_count) and run_count[lam] > 0:
+                run_count[lam] -= 1
+                M_0[lam] -= 1
+        self.logger_freshs.debug(cc.c_magenta + client.name + ': Refunded jobs on lambdas ' + str(lams) + \
+                                 '. Runcount: ' + str(run_count) + cc.reset)
+        return len(lams)
 
 # -------------------------------------------------------------------------------------------------
 
     def is_active(self,client):
-        # if client is in self.clients, a job is running and runcount must be observed!
-        if (client not in self.idle_clients) and (client not in self.ghost_clients) and \
-           (client not in self.explorer_clients) and (client in self.clients):
-            return True
-        else:
-            return False
+        # if client is registered and active, a job is running and runcount must be observed!
+        return self.clients.state_of(client) == client_state.ACTIVE
 
 # -------------------------------------------------------------------------------------------------
 
     def is_idle(self,client):
-        if (client in self.idle_clients) and (client not in self.ghost_clients) and \
-           (client not in self.explorer_clients) and (client in self.clients):
-            return True
-        else:
-            return False
+        return self.clients.state_of(client) == client_state.IDLE
 
 # -------------------------------------------------------------------------------------------------
 
     def is_ghost(self,client):
-        if (client not in self.idle_clients) and (client not in self.explorer_clients) and \
-           (client in self.ghost_clients) and (client in self.clients):
-            return True
-        else:
-            return False
+        return self.clients.state_of(client) == client_state.GHOST
 
 # -------------------------------------------------------------------------------------------------
 
     def is_explorer(self,client):
-        if (client not in self.idle_clients) and (client in self.explorer_clients) and \
-           (client not in self.ghost_clients) and (client in self.clients):
-            return True
-        else:
-            return False
+        return self.clients.state_of(client) == client_state.EXPLORER
+
+# -------------------------------------------------------------------------------------------------
+
+    # check if a ghost client calculates on this point at the moment
+    def is_ghost_point(self, point):
+        return self.clients.has_data(client_state.GHOST, point)
 
 # -------------------------------------------------------------------------------------------------
 
     def active_clients(self):
-        return len(self.clients) - len(self.idle_clients) - len(self.ghost_clients) - len(self.explorer_clients)
+        return self.clients.count(client_state.ACTIVE)
+
+    # number of running real jobs, prefetched jobs count separately
+    def active_jobs(self):
+        return self.active_clients() + self.prefetched_jobs
 
 # -------------------------------------------------------------------------------------------------
 
-    # Analyze the data received from a client
-    def analyze_recv(self, data, client, runid):
+    # Analyze the data received from a client, ddata is already set for typed (v2) frames
+    def analyze_recv(self, data, client, runid, ddata=None):
 
         self.logger_freshs.debug(cc.c_magenta + __name__ + ': analyze_recv' + cc.reset)
 
@@ -945,9 +1268,20 @@ class server(asyncore.dispatcher):
         data = data.strip()
 
         if (client not in self.clients) and (client not in self.console_clients):
+            if client in self.registration_queue:
+                self.logger_freshs.debug(cc.c_blue + str(client.name) + ' is not registered yet, ignoring data.' + cc.reset)
             # check if client says 'hello'
-            if "ffs client v1" in data:
-                self.registerClient(client)
+            elif "ffs client v1" in data:
+                self.negotiate_compression(client, data)
+                self.queue_registration(client)
+                self.register_slots(client, data)
+            elif "ffs client v2" in data:
+                # all following packets are framed
+                client.protocol = 2
+                self.logger_freshs.debug(cc.c_blue + str(client.name) + ' uses protocol version 2.' + cc.reset)
+                self.negotiate_compression(client, data)
+                self.queue_registration(client)
+                self.register_slots(client, data)
             elif "management client v1" in data:
                 self.console_clients.append(client)
                 self.logger_freshs.info(cc.c_blue + str(client.name) + ' identified as management client.' + cc.reset)
@@ -966,7 +1300,7 @@ class server(asyncore.dispatcher):
             return
 
         # Check if client sent result
-        if "\"jobtype\":" in data:
+        if ddata is None and "\"jobtype\":" in data:
             try:
                 ddata = ast.literal_eval(data)
             except:
@@ -975,12 +1309,19 @@ class server(asyncore.dispatcher):
                 self.logger_freshs.info(cc.c_red + 'Server: Warning! Dropping packet.' + cc.reset)
                 return
 
+        if ddata is not None and 'jobtype' in ddata:
+
             self.logger_freshs.debug(cc.c_blue + 'Server: Analysing received job, giving id:' + str(runid) + cc.reset)
 
             # Analyze results
             if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
+                # results of real jobs are identified by their uuid, the client could have
+                # further jobs queued
+                if client.finish_pending_job(ddata.get('uuid')):
+                    self.logger_freshs.debug(cc.c_blue + 'Sending results to ffs module.' + cc.reset)
+                    self.ffs_control.parse_message(data, ddata, client, runid)
                 # if auto_interfaces is on, pass results to this module.
-                if client in self.explorer_clients:
+                elif client in self.explorer_clients:
                     self.logger_freshs.debug(cc.c_blue + 'Sending results to explorer module.' + cc.reset)
                     self.ai.parse_message(data, ddata, client, runid)
                 elif client in self.ghost_clients:
@@ -990,6 +1331,14 @@ class server(asyncore.dispatcher):
                     self.logger_freshs.debug(cc.c_blue + 'Sending results to ffs module.' + cc.reset)
                     self.ffs_control.parse_message(data, ddata, client, runid)
 
+                # A slot of a client with several slots sent its last result. The client does
+                # not run the jobs queued for it, they are refunded by deregisterClient. The
+                # other slots go on until the client closes the connection.
+                if client.timeout_warned and client in self.clients and \
+                   (isinstance(client, clienthandler.SlotHandler) or len(client.slots) > 0):
+                    self.logger_freshs.info(cc.c_red + client.name + ' has announced that it is retiring.' + cc.reset)
+                    self.deregisterClient(client)
+
             else:
                 ## Result 3: Fixed tau
                 if ddata['jobtype'] == 3:
@@ -1037,8 +1386,8 @@ class server(asyncore.dispatcher):
 
         self.logger_freshs.debug(cc.c_magenta + __name__ + ': start_idle_clients' + cc.reset)
 
-        # loop backwards over a list if you are deleting values
-        for idle_client in self.idle_clients[::-1]:
+        # loop backwards over a copy, started clients leave the idle state
+        for idle_client in list(self.idle_clients)[::-1]:
 
             if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
 
@@ -1071,6 +1420,7 @@ class server(asyncore.dispatcher):
         self.ghostpoints.commit()
 
         if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
+            self.ffs_control.write_checkpoint()
             self.ffs_control.arrived_in_B()
 
         # Disable timer
@@ -1082,9 +1432,12 @@ class server(asyncore.dispatcher):
         for client in self.clients:
             client.handle_close()
         # Quit server
-        self.handle_close()
-        asyncore.dispatcher.close(self)
+        self.close_socket()
         self.print_status()
+        if self.algorithm == sampling_algorithm.FFS or self.algorithm == sampling_algorithm.PERM_FFS:
+            # commits what was written after the last commit, no journal is left behind
+            self.storepoints.close()
+            self.ghostpoints.close()
         raise SystemExit(0)
 
 # -------------------------------------------------------------------------------------------------
@@ -60,6 +60,10 @@ class configpoints:
             pass
         con = sqlite3.connect(self.dbfile)
         cur = con.cursor()
+        # WAL mode only, the epochs count points right after inserting them
+        if getattr(self.server, 'db_mode', 'default') == 'writer':
+            import db_writer
+            db_writer.enable_wal(con)
         return con, cur
 
     # Close database connection
@@ -0,0 +1,339 @@
+# Wire protocol version 2, shared by server and client.
+#
+# Version 1 sends python literals terminated by 'PKT_SEP'. Version 2 is
+# negotiated by the hello string "ffs client v2" (still sent v1 style, as is
+# the client name the server sends on connect). Everything after the hello
+# is sent in frames:
+#
+#   header:  kind (1 byte), flags (1 byte), payload length (4 bytes, network order)
+#   payload: FRAME_TEXT:  a v1 style message without separator
+#            FRAME_TYPED: length of the json header (4 bytes), json header,
+#                         raw little endian float64 data of the arrays
+#
+# In typed frames, top-level entries which are rectangular (nested) lists of
+# floats are packed as raw arrays. The json header lists them in
+# '__arrays__' as [key, shape] pairs in the order of the data. Arrays which
+# are packed already (RawArray) are sent as they are.
+#
+# Compression is negotiated by appending " compress=<codec>[,<codec>...]" to
+# the hello, the server answers "compression: <codec>" with the codec it
+# chose. From then on, both sides compress payloads above a size threshold.
+# Compressed frames have FLAG_COMPRESSED set, compressed version 1 packets
+# are sent as 'COMPRESSED:<codec>:' followed by the base64 encoded data.
+
+import struct
+import json
+import array
+import sys
+import zlib
+import base64
+import time
+
+# lz4 is optional
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+PROTOCOL_VERSION = 2
+
+# frame kinds
+FRAME_TEXT  = 0
+FRAME_TYPED = 1
+
+# frame flags
+FLAG_TIMEOUT    = 1
+FLAG_COMPRESSED = 2
+
+# packet separator of version 1
+PKT_SEP = 'PKT_SEP'
+
+HEADER       = struct.Struct('!BBI')
+TYPED_HEADER = struct.Struct('!I')
+
+ARRAY_KEY = '__arrays__'
+
+# prefix of compressed version 1 packets
+COMPRESSED = 'COMPRESSED:'
+
+_swap = sys.byteorder != 'little'
+
+
+# -------------------------------------------------------------------------------------------------
+# Frames
+# -------------------------------------------------------------------------------------------------
+
+def frame(kind, payload, flags=0):
+    return HEADER.pack(kind, flags, len(payload)) + payload
+
+def frame_text(text, flags=0):
+    return frame(FRAME_TEXT, text, flags)
+
+def frame_typed(ddata, flags=0):
+    return frame(FRAME_TYPED, encode_typed(ddata), flags)
+
+
+# -------------------------------------------------------------------------------------------------
+# Typed encoding
+# -------------------------------------------------------------------------------------------------
+
+# shape of a rectangular nested list of floats, None otherwise
+def array_shape(value):
+    shape = []
+    el = value
+    while isinstance(el, list):
+        if len(el) == 0:
+            return None
+        shape.append(len(el))
+        el = el[0]
+    if len(shape) == 0 or type(el) is not float:
+        return None
+    return shape
+
+def _flatten(value, shape, depth, out):
+    if not isinstance(value, list) or len(value) != shape[depth]:
+        raise ValueError('not rectangular')
+    if depth == len(shape) - 1:
+        for el in value:
+            if type(el) is not float:
+                raise ValueError('not a float')
+        out.extend(value)
+    else:
+        for el in value:
+            _flatten(el, shape, depth + 1, out)
+
+def _unflatten(flat, shape, depth, start):
+    n = shape[depth]
+    if depth == len(shape) - 1:
+        return flat[start:start + n]
+    stride = 1
+    for s in shape[depth + 1:]:
+        stride *= s
+    return [_unflatten(flat, shape, depth + 1, start + i * stride) for i in range(n)]
+
+# memoryviews have to be copied for json and array
+def to_bytes(data):
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+def _to_str(obj):
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    elif isinstance(obj, list):
+        return [_to_str(el) for el in obj]
+    elif isinstance(obj, dict):
+        return dict([(_to_str(k), _to_str(v)) for k, v in obj.items()])
+    return obj
+
+# float64 array which is packed already, data is little endian
+class RawArray():
+    def __init__(self, shape, data):
+        self.shape = shape
+        self.data  = data
+
+def encode_typed(ddata):
+    header = {}
+    arrays = []
+    data   = []
+    for key in ddata:
+        value = ddata[key]
+        if isinstance(value, RawArray):
+            arrays.append([key, value.shape])
+            data.append(value.data)
+            continue
+        shape = array_shape(value)
+        if shape is not None:
+            flat = array.array('d')
+            try:
+                _flatten(value, shape, 0, flat)
+            except ValueError:
+                header[key] = value
+                continue
+            if _swap:
+                flat.byteswap()
+            arrays.append([key, shape])
+            data.append(flat.tostring())
+        else:
+            header[key] = value
+    header[ARRAY_KEY] = arrays
+    jheader = json.dumps(header, separators=(',', ':'))
+
+    return TYPED_HEADER.pack(len(jheader)) + jheader + ''.join(data)
+
+# payload can be a string or a memoryview
+def decode_typed(payload):
+    hlen = TYPED_HEADER.unpack_from(payload, 0)[0]
+    pos  = TYPED_HEADER.size + hlen
+    jheader = to_bytes(payload[TYPED_HEADER.size:pos])
+    ddata = _to_str(json.loads(jheader))
+
+    for key, shape in ddata.pop(ARRAY_KEY, []):
+        n = 1
+        for s in shape:
+            n *= s
+        flat = array.array('d')
+        flat.fromstring(to_bytes(payload[pos:pos + 8 * n]))
+        if _swap:
+            flat.byteswap()
+        pos += 8 * n
+        ddata[key] = _unflatten(flat.tolist(), shape, 0, 0)
+
+    return ddata
+
+
+# -------------------------------------------------------------------------------------------------
+# Compression
+# -------------------------------------------------------------------------------------------------
+
+# codecs which can be used here, fastest first
+def codecs_available():
+    if lz4frame is not None:
+        return ['lz4', 'zlib']
+    return ['zlib']
+
+# first codec offered by the peer which we accept, None if there is none
+def choose_codec(offered, accepted):
+    for codec in offered:
+        if codec in accepted and codec in codecs_available():
+            return codec
+    return None
+
+def compress(codec, data):
+    if codec == 'lz4':
+        return lz4frame.compress(to_bytes(data))
+    return zlib.compress(to_bytes(data), 6)
+
+def decompress(codec, data):
+    if codec == 'lz4':
+        return lz4frame.decompress(to_bytes(data))
+    elif codec == 'zlib':
+        return zlib.decompress(to_bytes(data))
+    raise ValueError('unknown codec: ' + str(codec))
+
+# Compression state of one connection. Without a codec, everything passes
+# unchanged. Keeps statistics for the status output.
+class Compressor():
+    def __init__(self, codec=None, threshold=4096):
+        self.codec     = codec
+        self.threshold = threshold
+        # bytes before and after compression, sent and received
+        self.raw_bytes    = 0
+        self.packed_bytes = 0
+        # seconds spent compressing and decompressing
+        self.time         = 0.0
+
+    # returns the data to send and if it was compressed
+    def pack(self, data):
+        if self.codec is None or len(data) < self.threshold:
+            return data, False
+        t = time.time()
+        packed = compress(self.codec, data)
+        self.time += time.time() - t
+        if len(packed) >= len(data):
+            return data, False
+        self.raw_bytes    += len(data)
+        self.packed_bytes += len(packed)
+        return packed, True
+
+    def unpack(self, codec, data):
+        t = time.time()
+        raw = decompress(codec, data)
+        self.time         += time.time() - t
+        self.raw_bytes    += len(raw)
+        self.packed_bytes += len(data)
+        return raw
+
+    def ratio(self):
+        if self.packed_bytes == 0:
+            return 1.0
+        return float(self.raw_bytes) / self.packed_bytes
+
+    def frame_text(self, text, flags=0):
+        data, packed = self.pack(text)
+        if packed:
+            flags |= FLAG_COMPRESSED
+        return frame(FRAME_TEXT, data, flags)
+
+    def frame_typed(self, ddata, flags=0):
+        data, packed = self.pack(encode_typed(ddata))
+        if packed:
+            flags |= FLAG_COMPRESSED
+        return frame(FRAME_TYPED, data, flags)
+
+    # payload of a received frame
+    def read_frame(self, flags, payload):
+        if flags & FLAG_COMPRESSED:
+            return self.unpack(self.codec, payload)
+        return payload
+
+    # version 1 packet, without separator
+    def text_packet(self, text):
+        data, packed = self.pack(text)
+        if packed:
+            return COMPRESSED + self.codec + ':' + base64.b64encode(data)
+        return text
+
+    # text of a received version 1 packet
+    def read_text(self, packet):
+        if not packet.startswith(COMPRESSED):
+            return packet
+        codec, sep, data = packet[len(COMPRESSED):].partition(':')
+        return self.unpack(codec, base64.b64decode(data))
+
+    def status(self):
+        return self.codec + ' ' + ('%.2f' % self.ratio()) + 'x ' + ('%.3f' % self.time) + 's'
+
+
+# -------------------------------------------------------------------------------------------------
+# Receive buffer
+# -------------------------------------------------------------------------------------------------
+
+# Growable buffer for incoming data. Complete packets are returned as
+# memoryviews into the buffer, they are only valid until the next feed().
+# The position up to which a version 1 packet was searched for the
+# separator is remembered, so every byte is scanned only once.
+class ReceiveBuffer():
+    def __init__(self):
+        self.buf   = bytearray()
+        self.start = 0
+        self.scan  = 0
+
+    def __len__(self):
+        return len(self.buf) - self.start
+
+    def feed(self, data):
+        if self.start >= len(self.buf):
+            del self.buf[:]
+            self.start = 0
+            self.scan  = 0
+        elif self.start > 1048576 and self.start * 2 > len(self.buf):
+            # drop consumed data
+            del self.buf[:self.start]
+            self.scan -= self.start
+            self.start = 0
+        self.buf.extend(data)
+
+    # next version 1 packet without separator, None if not complete
+    def next_packet(self):
+        end = self.buf.find(PKT_SEP, max(self.scan, self.start))
+        if end < 0:
+            self.scan = max(self.start, len(self.buf) - len(PKT_SEP) + 1)
+            return None
+        packet = memoryview(self.buf)[self.start:end]
+        self.start = end + len(PKT_SEP)
+        self.scan  = self.start
+        return packet
+
+    # next version 2 frame as (kind, flags, payload), kind is None if not complete
+    def next_frame(self):
+        if len(self.buf) - self.start < HEADER.size:
+            return None, 0, None
+        kind, flags, length = HEADER.unpack_from(self.buf, self.start)
+        end = self.start + HEADER.size + length
+        if len(self.buf) < end:
+            return None, 0, None
+        payload = memoryview(self.buf)[self.start + HEADER.size:end]
+        self.start = end
+        self.scan  = end
+        return kind, flags, payload
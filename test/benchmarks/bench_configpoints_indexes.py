@@ -0,0 +1,119 @@
+# Build a synthetic configpoints database and time the frequent queries of
+# configpoints.py before and after the schema migration adding the indexes.
+#
+# usage: python bench_configpoints_indexes.py -n 5000000 -l 10 -r 20
+
+import sys
+import os
+import time
+import random
+import sqlite3
+import tempfile
+from optparse import OptionParser
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../../server/modules/ffs')
+
+import configpoints_schema
+
+parser = OptionParser(usage="usage: %prog [options]")
+parser.add_option("-n", "--rows", dest="rows", help="number of rows", type=int, default=5000000)
+parser.add_option("-l", "--lambdas", dest="lambdas", help="number of interfaces", type=int, default=10)
+parser.add_option("-r", "--repeat", dest="repeat", help="repetitions per query", type=int, default=20)
+parser.add_option("-f", "--file", dest="dbfile", help="database file, temporary if not given", type="string", default='')
+(options, args) = parser.parse_args()
+
+random.seed(42)
+
+if options.dbfile == '':
+    fd, dbfile = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+else:
+    dbfile = options.dbfile
+
+con = sqlite3.connect(dbfile)
+cur = con.cursor()
+
+# table as created by configpoints.init_table, schema version 0
+cur.execute('create table configpoints (lambda int, configpoint text, origin_point text, calcsteps int, ctime real, runtime real, success int, runcount int, myid text, seed int, lambda_old int, weight real, rcval real, lpos real, usecount int, deactivated int, uuid text, customdata text)')
+cur.execute('create index timeindex on configpoints ( calcsteps )')
+
+per_lambda = options.rows // options.lambdas
+
+def myid(i):
+    return 'client%04d_%d' % (i % 500, i)
+
+def rows():
+    for i in range(options.rows):
+        lam = i // per_lambda
+        if lam == 0:
+            origin = 'escape'
+        else:
+            origin = myid(random.randrange((lam - 1) * per_lambda, lam * per_lambda))
+        success = int(random.random() < 0.3)
+        point = '[[%.6f, %.6f, %.6f]]' % (random.random(), random.random(), random.random())
+        yield (lam, point, origin, 1000, 1.0, 1.0, success, 0, myid(i), i, lam, 1.0, 0.1, 0.0,
+               int(random.random() < 0.5), int(random.random() < 0.01), '', '')
+
+print("Building %d rows on %d interfaces in %s" % (options.rows, options.lambdas, dbfile))
+t0 = time.time()
+cur.executemany('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', rows())
+con.commit()
+print("built in %.1f s" % (time.time() - t0))
+
+# queries of configpoints.py with a generator for their parameters
+queries = [
+    ('return_nop',
+     'select count(*) from configpoints where lambda = ? and success = 1 and deactivated = 0',
+     lambda: [random.randrange(options.lambdas)]),
+    ('return_random_point',
+     'select myid,configpoint from configpoints where deactivated = 0 and success = 1 and lambda = ?',
+     lambda: [random.randrange(options.lambdas)]),
+    ('return_configpoints_ids',
+     'select myid from configpoints where lambda = ? and deactivated = 0 and success = 1',
+     lambda: [random.randrange(options.lambdas)]),
+    ('return_point_by_id',
+     'select configpoint from configpoints where myid = ?',
+     lambda: [myid(random.randrange(options.rows))]),
+    ('update_usecount_by_myid',
+     'update configpoints set usecount=usecount+1 where myid = ?',
+     lambda: [myid(random.randrange(options.rows))]),
+    ('origin_point_in_database_and_active',
+     'select count(origin_point) from configpoints where deactivated = 0 and usecount = 0 and origin_point = ?',
+     lambda: [myid(random.randrange(options.rows))]),
+    ('runs_on_point',
+     'select count(*) from configpoints where origin_point = ?',
+     lambda: [myid(random.randrange(options.rows))]),
+    ('id_in_origin',
+     'select count(*) from configpoints where origin_point = ?',
+     lambda: [myid(random.randrange(options.rows))]),
+]
+
+def bench():
+    timings = {}
+    for name, query, params in queries:
+        t0 = time.time()
+        for i in range(options.repeat):
+            cur.execute(query, params())
+            cur.fetchall()
+        timings[name] = (time.time() - t0) / options.repeat
+    con.rollback()
+    return timings
+
+before = bench()
+
+t0 = time.time()
+configpoints_schema.migrate(con)
+print("migrated to schema version %d in %.1f s" % (configpoints_schema.schema_version(con), time.time() - t0))
+
+after = bench()
+
+print("%-38s %12s %12s %10s" % ('query', 'before [ms]', 'after [ms]', 'speedup'))
+for name, query, params in queries:
+    print("%-38s %12.3f %12.3f %9.0fx" % (name, before[name] * 1e3, after[name] * 1e3, before[name] / max(after[name], 1e-9)))
+
+con.close()
+if options.dbfile == '':
+    os.remove(dbfile)
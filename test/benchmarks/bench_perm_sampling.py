@@ -0,0 +1,96 @@
+# Compare the alias table used for PERM point selection with the linear
+# weighted_choice it replaces: a chi-square test of both samplers against
+# the weights, then the time per draw on an interface with n points.
+#
+# usage: python bench_perm_sampling.py -n 100000 -d 100000
+
+import sys
+import os
+import time
+import math
+import random
+from optparse import OptionParser
+
+import numpy as np
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../../server')
+sys.path.append(reldir + '/../../server/modules/ffs')
+
+import configpoints
+import alias_table
+
+parser = OptionParser(usage="usage: %prog [options]")
+parser.add_option("-n", "--points", dest="points", help="number of points on the interface", type=int, default=100000)
+parser.add_option("-d", "--draws", dest="draws", help="number of draws for the timing", type=int, default=100000)
+parser.add_option("-k", "--bins", dest="bins", help="number of points for the chi-square test", type=int, default=50)
+parser.add_option("-s", "--samples", dest="samples", help="number of draws for the chi-square test", type=int, default=200000)
+(options, args) = parser.parse_args()
+
+random.seed(42)
+np.random.seed(42)
+
+# PERM weights spread over some orders of magnitude, a few points without weight
+def make_weights(n):
+    weights = np.random.lognormal(0., 2., n)
+    weights[np.random.random_sample(n) < 0.05] = 0.
+    return weights
+
+# chi-square of the counts and the p-value (Wilson-Hilferty approximation)
+def chi_square(counts, weights):
+    expected = weights / np.sum(weights) * np.sum(counts)
+    nonzero  = expected > 0
+    chi2 = np.sum((counts[nonzero] - expected[nonzero])**2 / expected[nonzero])
+    dof  = np.count_nonzero(nonzero) - 1
+    z = ((chi2 / dof)**(1. / 3.) - (1. - 2. / (9. * dof))) / math.sqrt(2. / (9. * dof))
+    return chi2, dof, 0.5 * math.erfc(z / math.sqrt(2.))
+
+weights = make_weights(options.bins)
+
+linear_counts = np.zeros(options.bins)
+for i in range(options.samples):
+    linear_counts[configpoints.weighted_choice(weights)] += 1
+
+table = alias_table.alias_table(weights)
+alias_counts = np.zeros(options.bins)
+for i in range(options.samples):
+    alias_counts[table.draw()] += 1
+
+print("chi-square test with %d points, %d draws" % (options.bins, options.samples))
+failed = False
+for name, counts in [('weighted_choice', linear_counts), ('alias_table', alias_counts)]:
+    chi2, dof, p = chi_square(counts, weights)
+    print("%-16s chi2 = %10.2f  dof = %4d  p = %.3f" % (name, chi2, dof, p))
+    if p < 0.001:
+        failed = True
+zero_drawn = np.sum(alias_counts[weights == 0.])
+print("draws of points without weight: %d" % zero_drawn)
+failed = failed or zero_drawn > 0
+
+weights = make_weights(options.points)
+
+t0 = time.time()
+table = alias_table.alias_table(weights)
+build = time.time() - t0
+
+# the linear scan is slow, time fewer draws
+linear_draws = max(1, min(options.draws, 100000000 // options.points))
+t0 = time.time()
+for i in range(linear_draws):
+    configpoints.weighted_choice(weights)
+linear = (time.time() - t0) / linear_draws
+
+t0 = time.time()
+for i in range(options.draws):
+    table.draw()
+alias = (time.time() - t0) / options.draws
+
+print("%d points: building the table %.1f ms" % (options.points, build * 1e3))
+print("%-16s %12.3f us per draw" % ('weighted_choice', linear * 1e6))
+print("%-16s %12.3f us per draw (%.0fx)" % ('alias_table', alias * 1e6, linear / alias))
+
+if failed:
+    print("FAILED: samples do not follow the weights")
+    sys.exit(1)
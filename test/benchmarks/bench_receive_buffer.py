@@ -0,0 +1,79 @@
+# Feed large packets in small chunks, as they come from the socket, and time
+# how long it takes to split them off the stream (no parsing):
+#   old:  string concatenation and partition, as done before ReceiveBuffer
+#   v1:   ReceiveBuffer.next_packet
+#   v2:   ReceiveBuffer.next_frame
+#
+# usage: python bench_receive_buffer.py -s 10 -c 4096 -n 2
+
+import sys
+import os
+import time
+from optparse import OptionParser
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../../server/modules')
+
+import wire_protocol
+
+parser = OptionParser(usage="usage: %prog [options]")
+parser.add_option("-s", "--size", dest="size", help="packet size in MB", type=float, default=10.0)
+parser.add_option("-c", "--chunk", dest="chunk", help="chunk size in bytes", type=int, default=4096)
+parser.add_option("-n", "--packets", dest="packets", help="number of packets", type=int, default=2)
+parser.add_option("--skip-old", dest="skip_old", help="do not time the old method", action="store_true", default=False)
+(options, args) = parser.parse_args()
+
+body = 'x' * int(options.size * 1.0e6)
+v1_stream = (body + 'PKT_SEP\n') * options.packets
+v2_stream = wire_protocol.frame_text(body) * options.packets
+
+def chunks(stream):
+    for i in range(0, len(stream), options.chunk):
+        yield stream[i:i + options.chunk]
+
+def split_old(stream):
+    save_bytes = ''
+    count = 0
+    for data in chunks(stream):
+        save_bytes = save_bytes + data
+        while len(save_bytes) != 0:
+            [line, sep, save_bytes] = save_bytes.partition('PKT_SEP')
+            if len(sep) != 0:
+                count += 1
+            else:
+                save_bytes = line
+                break
+    return count
+
+def split_v1(stream):
+    rb = wire_protocol.ReceiveBuffer()
+    count = 0
+    for data in chunks(stream):
+        rb.feed(data)
+        while rb.next_packet() is not None:
+            count += 1
+    return count
+
+def split_v2(stream):
+    rb = wire_protocol.ReceiveBuffer()
+    count = 0
+    for data in chunks(stream):
+        rb.feed(data)
+        while rb.next_frame()[0] is not None:
+            count += 1
+    return count
+
+def bench(name, split, stream):
+    t0 = time.time()
+    count = split(stream)
+    dt = time.time() - t0
+    assert count == options.packets
+    print("%-4s %8.3f s, %10.1f MB/s" % (name, dt, len(stream) / dt / 1.0e6))
+
+print("%d packets of %.1f MB in chunks of %d bytes" % (options.packets, options.size, options.chunk))
+if not options.skip_old:
+    bench("old", split_old, v1_stream)
+bench("v1", split_v1, v1_stream)
+bench("v2", split_v2, v2_stream)
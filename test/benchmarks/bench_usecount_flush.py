@@ -0,0 +1,107 @@
+# Time the flush of the usecount queue in configpoints.commit: the former
+# UPDATE with a CASE clause per id (10000 ids per statement) against
+# configpoints.flush_usecounts (temporary table and one joined UPDATE).
+#
+# usage: python bench_usecount_flush.py -q 10000,100000,1000000
+#
+# on a table of 2000000 rows:
+#     queued     CASE [s]   joined [s]    speedup
+#      10000         2.43         0.36       6.8x
+#     100000        25.14         2.64       9.5x
+#    1000000       198.04        22.31       8.9x
+
+import sys
+import os
+import time
+import random
+import sqlite3
+import tempfile
+from optparse import OptionParser
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../../server')
+sys.path.append(reldir + '/../../server/modules/ffs')
+
+import configpoints
+import configpoints_schema
+
+parser = OptionParser(usage="usage: %prog [options]")
+parser.add_option("-q", "--queued", dest="queued", help="comma separated numbers of queued ids", type="string", default='10000,100000,1000000')
+parser.add_option("-f", "--file", dest="dbfile", help="database file, temporary if not given", type="string", default='')
+(options, args) = parser.parse_args()
+
+sizes = [ int(n) for n in options.queued.split(',') ]
+rows  = 2 * max(sizes)
+
+random.seed(42)
+
+if options.dbfile == '':
+    fd, dbfile = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+else:
+    dbfile = options.dbfile
+
+con = sqlite3.connect(dbfile)
+cur = con.cursor()
+
+cur.execute('create table configpoints (lambda int, configpoint text, origin_point text, calcsteps int, ctime real, runtime real, success int, runcount int, myid text, seed int, lambda_old int, weight real, rcval real, lpos real, usecount int, deactivated int, uuid text, customdata text)')
+cur.execute('create index timeindex on configpoints ( calcsteps )')
+configpoints_schema.migrate(con)
+
+def myid(i):
+    return 'client%04d_%d' % (i % 500, i)
+
+print("Building %d rows in %s" % (rows, dbfile))
+cur.executemany('insert into configpoints values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+                ((i % 10, '[[0.0, 0.0, 0.0]]', 'escape', 1000, 1.0, 1.0, 1, 0, myid(i), i, 0, 1.0, 0.1, 0.0, 0, 0, '', '')
+                 for i in range(rows)))
+con.commit()
+
+# the flush as it was in configpoints.commit, without the progress output
+def case_flush(cur, queue):
+    count  = 0
+    tquery = "UPDATE configpoints SET usecount=usecount+ CASE myid "
+    processed_keys = []
+    for key in queue.keys():
+        processed_keys.append(key)
+        tquery += "WHEN '" + str(key) + "' THEN " + str(queue[key]) + " "
+        count += 1
+        if count % 10000 == 0:
+            tquery += "END WHERE myid IN " + str(tuple(processed_keys))
+            cur.execute(tquery)
+            processed_keys = []
+            tquery = "UPDATE configpoints SET usecount=usecount+ CASE myid "
+    if len(processed_keys) > 1:
+        tquery += "END WHERE myid IN " + str(tuple(processed_keys))
+        cur.execute(tquery)
+    elif len(processed_keys) == 1:
+        tquery += "END WHERE myid = '" + str(processed_keys[0]) + "'"
+        cur.execute(tquery)
+
+def run(flush, queue):
+    t0 = time.time()
+    flush(cur, queue)
+    elapsed = time.time() - t0
+    cur.execute('select sum(usecount) from configpoints')
+    total = cur.fetchone()[0]
+    con.rollback()
+    return elapsed, total
+
+print("%10s %12s %12s %10s" % ('queued', 'CASE [s]', 'joined [s]', 'speedup'))
+for n in sizes:
+    queue = {}
+    for i in random.sample(range(rows), n):
+        queue[myid(i)] = random.randint(1, 5)
+
+    case_time, case_total     = run(case_flush, queue)
+    joined_time, joined_total = run(configpoints.flush_usecounts, queue)
+    if case_total != joined_total or joined_total != sum(queue.values()):
+        print("usecounts differ: %s %s %d" % (case_total, joined_total, sum(queue.values())))
+        sys.exit(1)
+    print("%10d %12.2f %12.2f %9.1fx" % (n, case_time, joined_time, case_time / max(joined_time, 1e-9)))
+
+con.close()
+if options.dbfile == '':
+    os.remove(dbfile)
@@ -0,0 +1,67 @@
+# Compare the server side parse throughput of protocol version 1
+# (python literal + PKT_SEP) and version 2 (frames with raw float64 arrays)
+# for a job result carrying one configuration point.
+#
+# usage: python bench_wire_protocol.py -n 1000 -r 50
+
+import sys
+import os
+import ast
+import time
+import random
+from optparse import OptionParser
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../../server/modules')
+
+import wire_protocol
+
+parser = OptionParser(usage="usage: %prog [options]")
+parser.add_option("-n", "--particles", dest="particles", help="number of particles per point", type=int, default=1000)
+parser.add_option("-r", "--repeat", dest="repeat", help="number of packets to parse", type=int, default=50)
+(options, args) = parser.parse_args()
+
+# one configuration point: positions and velocities of n particles
+point = [[random.uniform(-10.0, 10.0) for k in range(6)] for i in range(options.particles)]
+
+result = {"jobtype": 2, "success": True, "points": point, "act_lambda": 3, "seed": 123456,
+          "origin_points": "client0001_17", "calcsteps": 4200, "ctime": 12.5, "rcval": 0.73,
+          "uuid": "4a6e1b4c-5d58-4bd2-9cd5-0f1b6d3c9a11"}
+
+# version 1, as built by the client
+v1_packet = "{\"jobtype\": 2, \"success\": True, \"points\": " + str(point) + \
+            ", \"act_lambda\": 3, \"seed\":  123456, \"origin_points\": \"client0001_17\"" + \
+            ", \"calcsteps\": 4200, \"ctime\": 12.5, \"rcval\": 0.73" + \
+            ", \"uuid\": \"4a6e1b4c-5d58-4bd2-9cd5-0f1b6d3c9a11\"}PKT_SEP\n"
+
+v2_packet = wire_protocol.frame_typed(result)
+
+def parse_v1(buf):
+    rb = wire_protocol.ReceiveBuffer()
+    rb.feed(buf)
+    return ast.literal_eval(rb.next_packet().tobytes().strip())
+
+def parse_v2(buf):
+    rb = wire_protocol.ReceiveBuffer()
+    rb.feed(buf)
+    [kind, flags, payload] = rb.next_frame()
+    return wire_protocol.decode_typed(payload)
+
+# sanity check
+assert parse_v1(v1_packet)['points'] == parse_v2(v2_packet)['points']
+
+def bench(name, parse, packet):
+    t0 = time.time()
+    for i in range(options.repeat):
+        parse(packet)
+    dt = time.time() - t0
+    print("%-4s packet size %10d bytes, %10.1f packets/s, %8.2f MB/s" % \
+          (name, len(packet), options.repeat / dt, len(packet) * options.repeat / dt / 1.0e6))
+    return dt
+
+print("particles per point: " + str(options.particles) + ", packets: " + str(options.repeat))
+t1 = bench("v1", parse_v1, v1_packet)
+t2 = bench("v2", parse_v2, v2_packet)
+print("speedup v2/v1: %.1f" % (t1 / t2))
@@ -0,0 +1,20 @@
+#!/bin/bash
+
+###runs the fake FFS test with a server config and checks that the simulation
+###arrived in B: the server writes the rates file only at the end.
+###usage: ./check_fake_ffs.bash [server config in test_ffs_fake]
+
+conf=${1:-server-fake-ffs.conf}
+
+cd test_ffs_fake
+rm -rf DB OUTPUT LOG USERCONF
+
+timeout 600 python main.py $conf
+pkill -f "main_server.py -c $conf"
+
+if ls OUTPUT/*_rates.dat > /dev/null 2>&1; then
+    echo "SUCCESS: fake FFS with $conf"
+else
+    echo "FAIL: fake FFS with $conf"
+    exit 1
+fi
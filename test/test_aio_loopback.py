@@ -0,0 +1,111 @@
+# Loopback test of the asyncio network backend: a client connects over a
+# local socket, gets its name, sends packets split over several writes and
+# closes. The server side must pass every packet on and deregister the client.
+#
+# needs the trollius package, the server runs on python 2
+# usage: python test_aio_loopback.py
+
+import sys
+import os
+import socket
+import threading
+import logging
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../server/modules')
+sys.path.append(reldir + '/../server/modules/ffs')
+
+try:
+    import aio_server
+except ImportError as e:
+    if 'trollius' not in str(e):
+        raise
+    print('SKIP: ' + str(e))
+    sys.exit(0)
+
+import client_state
+
+# the part of the server the network backend talks to. The clients are kept in
+# the registry of the server, which has the handlers as dict keys.
+class loopback_server():
+    def __init__(self):
+        self.logger_freshs         = logging.getLogger('aio_loopback')
+        self.compression_threshold = 4096
+        self.send_highwater        = 65536
+        self.listen_backlog        = 5
+        self.clients               = client_state.ClientRegistry()
+        self.received              = []
+        self.deregistered          = []
+        self.aio                   = None
+
+    def new_client_name(self):
+        return 'client0'
+
+    def return_received_count(self, name):
+        return 0
+
+    def analyze_recv(self, line, client, runid, ddata):
+        if client not in self.clients:
+            self.clients.add(client)
+        self.received.append([line, runid])
+
+    def deregisterClient(self, client):
+        self.clients.remove(client)
+        self.deregistered.append(client.name)
+        self.aio.loop.stop()
+
+def run_client(port, result):
+    sock = socket.create_connection(('127.0.0.1', port), 10.0)
+    name = ''
+    while not name.endswith('PKT_SEP\n'):
+        data = sock.recv(4096)
+        if not data:
+            break
+        name += data
+    result.append(name)
+    sock.sendall('{"msg": "first"}PKT_')
+    sock.sendall('SEP\n{"msg": ')
+    sock.sendall('"second"}PKT_SEP\n')
+    sock.close()
+
+logging.basicConfig(level=logging.WARN)
+
+ss = loopback_server()
+ss.aio = aio_server.aio_server(ss)
+ss.aio.listen(0)
+port = ss.aio.listener.sockets[0].getsockname()[1]
+
+# a protocol has no handler before the connection is made
+aio_server.ClientProtocol(ss).pause_writing()
+aio_server.ClientProtocol(ss).resume_writing()
+
+name = []
+client = threading.Thread(target=run_client, args=(port, name))
+client.daemon = True
+client.start()
+
+# do not hang if the client is never deregistered
+ss.aio.call_later(10.0, ss.aio.loop.stop)
+ss.aio.run()
+client.join(10.0)
+ss.aio.close()
+
+failed = False
+def check(ok, what):
+    global failed
+    if not ok:
+        failed = True
+    print(('ok:   ' if ok else 'FAIL: ') + what)
+
+check(name == ['client0PKT_SEP\n'], 'client got its name, ' + repr(name))
+check([r[0] for r in ss.received] == ['{"msg": "first"}', '{"msg": "second"}'], \
+      'split packets received, ' + repr(ss.received))
+check([r[1] for r in ss.received] == ['client0_1', 'client0_2'], 'packets counted')
+check(ss.deregistered == ['client0'], 'client deregistered once on close')
+
+if failed:
+    print('FAIL')
+    sys.exit(1)
+print('SUCCESS')
@@ -0,0 +1,74 @@
+# Test of the alias table used for PERM point selection: the probabilities
+# stored in the table must add up to the weights exactly, and with a fixed
+# seed the drawn frequencies must follow the weights.
+#
+# usage: python test_alias_table.py
+
+import sys
+import os
+import random
+
+import numpy as np
+
+reldir = os.path.dirname(__file__)
+if not reldir:
+    reldir = '.'
+sys.path.append(reldir + '/../server/modules/ffs')
+
+import alias_table
+
+# probability of each index as given by the buckets of the table
+def table_probabilities(table):
+    p = np.array(table.prob, dtype=float)
+    for i in range(table.n):
+        p[table.alias[i]] += 1. - table.prob[i]
+    return p / table.n
+
+def draw_frequencies(table, draws):
+    counts = np.zeros(table.n)
+    for i in range(draws):
+        counts[table.draw()] += 1
+    return counts / draws
+
+random.seed(42)
+np.random.seed(42)
+
+cases = [
+    [1.],
+    [1., 1., 1., 1.],
+    [0., 1., 2., 3., 4.],
+    [1.e-6, 1., 1.e3, 0., 5.],
+    np.random.lognormal(0., 2., 50).tolist(),
+]
+
+for weights in cases:
+    table    = alias_table.alias_table(weights)
+    expected = np.array(weights) / np.sum(weights)
+    assert len(table) == len(weights)
+    assert np.allclose(table_probabilities(table), expected, rtol=0., atol=1e-12), \
+        'table probabilities differ from the weights %s' % str(weights)
+
+# drawn frequencies, 200000 draws: the standard deviation is below 0.0012 per index
+draws = 200000
+for weights in cases[1:4]:
+    table    = alias_table.alias_table(weights)
+    expected = np.array(weights) / np.sum(weights)
+    freq     = draw_frequencies(table, draws)
+    assert np.all(np.abs(freq - expected) < 0.005), \
+        'frequencies %s differ from the weights %s' % (str(freq), str(weights))
+    assert np.all(freq[expected == 0.] == 0.), 'a point without weight was drawn'
+
+# the same seed gives the same draws
+random.seed(7)
+first = [table.draw() for i in range(100)]
+random.seed(7)
+assert [table.draw() for i in range(100)] == first
+
+# no weight at all is an error
+try:
+    alias_table.alias_table([0., 0.])
+    assert False, 'table without weight was built'
+except AssertionError as e:
+    assert str(e) == 'Problem in PERM weights.'
+
+print('SUCCESS')
@@ -22,6 +22,7 @@
 # This file is a fake test for the FFS algorithm.
 # It calculates the transition rate itself for the comparison against the FFS simulation
 import os
+import sys
 import time
 
 import asyncore
@@ -35,8 +36,10 @@ dt=0.01
 p_success = 0.7
 # delay for not flooding the server (a real simulation needs time to calculate, too...)
 report_delay = 0.0
-# Server config to check
+# Server config to check, e.g. a variant with other server options
 srv_conf = 'server-fake-ffs.conf'
+if len(sys.argv) > 1:
+    srv_conf = sys.argv[1]
 
 
 # start the server